@@ -1,28 +1,65 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, make_response, jsonify, Response, stream_with_context, g, abort
+from werkzeug.datastructures import MultiDict
 import sqlite3
-from datetime import datetime
+import click
+import csv
+import json
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.drawing.image import Image as OpenpyxlImage
+from openpyxl.cell import WriteOnlyCell
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib.units import inch, cm
 from reportlab.graphics.shapes import Drawing, Rect
+import base64
+import hashlib
 import io
 import os
+import re
+import zipfile
+from itertools import chain, islice
+from collections import Counter
+from contextlib import contextmanager
+from markupsafe import Markup, escape
+from urllib.parse import urlencode
+import autocomplete
+import availability
+import compression
+import database
+import duplicates
+import export_cache
+import export_jobs
+import import_pannes
+import init_db
+import pdf_render
+import static_assets
 
 app = Flask(__name__)
 app.secret_key = 'votre_cle_secrete_2025'
+app.config['DATABASE'] = 'gmao.db'
+app.config['EXPORT_RESULTS_DIR'] = 'exports'  # Fichiers produits par les exports en arrière-plan
+app.config['EXPORT_CACHE_DIR'] = os.path.join('exports', 'cache')  # Cache des exports Excel/PDF
+app.config['EXPORT_CACHE_MAX_BYTES'] = export_cache.MAX_BYTES
+app.config['PDF_HISTORY_MAX_ROWS'] = None     # Nombre maximal de pannes dans l'historique PDF (None = toutes)
+app.config['PDF_HISTORY_BY_MONTH'] = False    # Intertitre par mois dans l'historique PDF
+database.init_app(app)
+compression.init_app(app)
+static_assets.init_app(app)
 
 # Configuration du logo et thème dessalement
 LOGO_PATH = 'static/images/logo.png'  # Chemin vers votre logo
 COMPANY_NAME = "ONEE-BO"
 COMPANY_SUBTITLE = "Système de Gestion des pannes"
 
+# Logo décodé une fois au démarrage pour les exports PDF
+pdf_render.load_logo(LOGO_PATH)
+
 # Couleurs thème dessalement (bleu océan)
 THEME_COLORS = {
     'primary': '1E3A8A',      # Bleu foncé
@@ -35,10 +72,21 @@ THEME_COLORS = {
     'header': '0F172A'         # Bleu très foncé
 }
 
-def get_db_connection():
-    conn = sqlite3.connect('gmao.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_db_connection(readonly=None):
+    """Connexion issue du pool, rendue automatiquement en fin de requête"""
+    return database.get_db(readonly)
+
+@contextmanager
+def panne_actor(conn, user_id):
+    """Attribuer à user_id les changements d'état écrits dans le bloc (journal panne_events).
+    
+    La ligne panne_acteur est posée puis effacée dans la même transaction, avant le COMMIT.
+    """
+    conn.execute('INSERT OR REPLACE INTO panne_acteur (id, user_id) VALUES (1, ?)', (user_id,))
+    try:
+        yield conn
+    finally:
+        conn.execute('DELETE FROM panne_acteur')
 
 def login_required(f):
     @wraps(f)
@@ -416,147 +464,187 @@ def create_excel_export(pannes_data, single_panne=None):
     
     return wb
 
-def create_pdf_export(pannes_data, single_panne=None):
-    """Créer un fichier PDF simple avec logo à gauche et maximum 2 couleurs"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Deux couleurs principales seulement
-    PRIMARY_COLOR = colors.Color(0.12, 0.23, 0.54)  # Bleu foncé
-    SECONDARY_COLOR = colors.black                    # Noir
-    
-    # Styles simples avec seulement 2 couleurs
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=20,
-        alignment=0,  # Alignement à gauche
-        textColor=PRIMARY_COLOR,
-        fontName='Helvetica-Bold'
-    )
-    
-    company_style = ParagraphStyle(
-        'CompanyStyle',
-        parent=styles['Normal'],
-        fontSize=16,
-        spaceAfter=5,
-        alignment=0,  # Alignement à gauche
-        textColor=PRIMARY_COLOR,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'SubtitleStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=20,
-        alignment=0,  # Alignement à gauche
-        textColor=SECONDARY_COLOR
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionStyle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceBefore=15,
-        spaceAfter=8,
-        textColor=PRIMARY_COLOR,
-        fontName='Helvetica-Bold'
+PDF_HISTORY_HEADERS = ['ID', 'Équipement', 'Priorité', 'État', 'Date', 'Créé par']
+PDF_HISTORY_COL_WIDTHS = [0.6*inch, 2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch]
+PDF_HISTORY_ROW_HEIGHT = 15     # Hauteur fixe des lignes : pas de mesure du contenu
+PDF_TABLE_CHUNK_ROWS = 500      # Lignes par tableau (bloc) dans l'historique PDF
+
+MOIS = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 'Juillet',
+        'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
+
+def pdf_history_row(panne):
+    """Ligne du tableau de l'historique PDF"""
+    return [
+        f"#{panne['id']}",
+        panne['equipement'][:20] + '...' if len(panne['equipement']) > 20 else panne['equipement'],
+        panne['priorite'],
+        panne['etat'],
+        panne['date_creation'].split(' ')[0],
+        panne['username'][:10] + '...' if len(panne['username']) > 10 else panne['username']
+    ]
+
+def pdf_month_label(date_creation):
+    """Libellé du mois d'une date 'AAAA-MM-JJ ...' (ex. 'Mars 2024')"""
+    try:
+        date = datetime.strptime(date_creation[:7], '%Y-%m')
+    except (TypeError, ValueError):
+        return 'Date inconnue'
+    return f"{MOIS[date.month - 1]} {date.year}"
+
+PDF_HISTORY_TABLE_STYLE = TableStyle([
+    ('TEXTCOLOR', (0, 0), (-1, -1), pdf_render.SECONDARY_COLOR),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 4),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, pdf_render.PRIMARY_COLOR),
+    ('LINEBELOW', (0, 1), (-1, -1), 0.25, pdf_render.PRIMARY_COLOR),
+])
+
+def pdf_history_table(rows):
+    """Un bloc du tableau de l'historique, avec l'en-tête répété à chaque page"""
+    table = Table(
+        [PDF_HISTORY_HEADERS] + rows,
+        colWidths=PDF_HISTORY_COL_WIDTHS,
+        rowHeights=PDF_HISTORY_ROW_HEIGHT,
+        repeatRows=1
     )
-    
-    # Créer un tableau pour l'en-tête avec logo à gauche
-    header_data = []
-    
-    # Logo à gauche dans une cellule
-    logo_cell = ""
-    if os.path.exists(LOGO_PATH):
-        try:
-            logo = Image(LOGO_PATH, width=0.8*inch, height=0.8*inch)
-            # Créer une ligne avec logo à gauche et texte à droite
-            header_table_data = [[logo, Paragraph(f"{COMPANY_NAME}<br/>{COMPANY_SUBTITLE}", company_style)]]
-            header_table = Table(header_table_data, colWidths=[1*inch, 5*inch])
-            header_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-                ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 0),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-                ('TOPPADDING', (0, 0), (-1, -1), 0),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            story.append(header_table)
-        except Exception as e:
-            print(f"Erreur logo PDF: {e}")
-            # Si pas de logo, juste le texte à gauche
-            story.append(Paragraph(COMPANY_NAME, company_style))
-            story.append(Paragraph(COMPANY_SUBTITLE, subtitle_style))
+    table.setStyle(PDF_HISTORY_TABLE_STYLE)
+    return table
+
+def pdf_history_tables(pannes_data, max_rows=None, by_month=False, chunk_rows=None):
+    """Flowables du tableau de l'historique : blocs de chunk_rows lignes, éventuellement par mois"""
+    chunk_rows = chunk_rows or PDF_TABLE_CHUNK_ROWS
+    styles = pdf_render.STYLES
+    
+    flowables = []
+    rows = []
+    month = None
+    count = 0
+    truncated = False
+    
+    for panne in pannes_data:
+        if max_rows is not None and count >= max_rows:
+            truncated = True
+            break
+        if by_month:
+            panne_month = pdf_month_label(panne['date_creation'])
+            if panne_month != month:
+                if rows:
+                    flowables.append(pdf_history_table(rows))
+                    rows = []
+                month = panne_month
+                flowables.append(Paragraph(month, styles['month']))
+        rows.append(pdf_history_row(panne))
+        count += 1
+        if len(rows) >= chunk_rows:
+            flowables.append(pdf_history_table(rows))
+            rows = []
+    
+    if rows or not flowables:
+        flowables.append(pdf_history_table(rows))
+    
+    if truncated:
+        flowables.append(Spacer(1, 10))
+        flowables.append(Paragraph(
+            f"Export limité aux {max_rows} pannes les plus récentes. "
+            "Utilisez l'export Excel ou CSV pour l'historique complet.",
+            styles['subtitle']
+        ))
+    return flowables
+
+def pdf_panne_section(panne):
+    """Flowables du rapport détaillé d'une panne (export individuel ou lot de bons de travail)"""
+    styles = pdf_render.STYLES
+    title_style = styles['title']
+    subtitle_style = styles['subtitle']
+    section_style = styles['section']
+    section = []
+    
+    section.append(Paragraph(f"RAPPORT DÉTAILLÉ - PANNE #{panne['id']}", title_style))
+    section.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}", subtitle_style))
+    section.append(Spacer(1, 20))
+    
+    # Informations principales - tableau simple
+    section.append(Paragraph("INFORMATIONS GÉNÉRALES", section_style))
+    
+    main_data = [
+        ['Équipement:', panne['equipement']],
+        ['Priorité:', panne['priorite']],
+        ['État:', panne['etat']],
+        ['Date de création:', panne['date_creation']],
+        ['Créé par:', panne['username']],
+    ]
+    
+    main_table = Table(main_data, colWidths=[2*inch, 4*inch])
+    main_table.setStyle(TableStyle([
+        ('TEXTCOLOR', (0, 0), (-1, -1), pdf_render.SECONDARY_COLOR),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 5),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('LINEBELOW', (0, 0), (-1, -2), 0.5, pdf_render.PRIMARY_COLOR),
+    ]))
+    
+    section.append(main_table)
+    section.append(Spacer(1, 20))
+    
+    # Description
+    section.append(Paragraph("DESCRIPTION DU PROBLÈME", section_style))
+    section.append(Paragraph(panne['description'], styles['normal']))
+    section.append(Spacer(1, 15))
+    
+    # Cause
+    section.append(Paragraph("CAUSE IDENTIFIÉE", section_style))
+    section.append(Paragraph(panne['cause'] or 'Non renseignée', styles['normal']))
+    section.append(Spacer(1, 15))
+    
+    # Solution
+    section.append(Paragraph("SOLUTION APPLIQUÉE", section_style))
+    section.append(Paragraph(panne['solution'] or 'Non renseignée', styles['normal']))
+    section.append(Spacer(1, 15))
+    
+    # Observations
+    section.append(Paragraph("OBSERVATIONS", section_style))
+    section.append(Paragraph(panne['observation'] or 'Aucune observation', styles['normal']))
+    return section
+
+def create_pdf_export(pannes_data, single_panne=None, stats=None, max_rows=None, by_month=False, chunk_rows=None,
+                      output=None):
+    """Créer un fichier PDF simple avec logo à gauche et maximum 2 couleurs.
+    
+    L'en-tête (logo, entreprise) et le pied de page sont dessinés par le
+    modèle de page de pdf_render. Pour l'historique, max_rows limite le nombre
+    de pannes listées et by_month ajoute un intertitre par mois. Le document
+    est écrit dans output (fichier ouvert en binaire) ou dans un BytesIO.
+    """
+    buffer = output if output is not None else io.BytesIO()
+    if single_panne:
+        title = f"Panne #{single_panne['id']}"
     else:
-        # Si pas de logo, juste le texte à gauche
-        story.append(Paragraph(COMPANY_NAME, company_style))
-        story.append(Paragraph(COMPANY_SUBTITLE, subtitle_style))
+        title = "Historique des pannes"
+    doc = pdf_render.create_document(buffer, LOGO_PATH, COMPANY_NAME, COMPANY_SUBTITLE, title=title)
+    styles = pdf_render.STYLES
+    story = []
     
-    # Ligne de séparation simple
-    story.append(Spacer(1, 10))
-    line_drawing = Drawing(500, 2)
-    line_drawing.add(Rect(0, 0, 500, 2, fillColor=PRIMARY_COLOR, strokeColor=None))
-    story.append(line_drawing)
-    story.append(Spacer(1, 20))
+    PRIMARY_COLOR = pdf_render.PRIMARY_COLOR
+    SECONDARY_COLOR = pdf_render.SECONDARY_COLOR
+    title_style = styles['title']
+    subtitle_style = styles['subtitle']
+    section_style = styles['section']
     
     if single_panne:
         # Export détaillé d'une seule panne
-        story.append(Paragraph(f"RAPPORT DÉTAILLÉ - PANNE #{single_panne['id']}", title_style))
-        story.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}", subtitle_style))
-        story.append(Spacer(1, 20))
-        
-        # Informations principales - tableau simple
-        story.append(Paragraph("INFORMATIONS GÉNÉRALES", section_style))
-        
-        main_data = [
-            ['Équipement:', single_panne['equipement']],
-            ['Priorité:', single_panne['priorite']],
-            ['État:', single_panne['etat']],
-            ['Date de création:', single_panne['date_creation']],
-            ['Créé par:', single_panne['username']],
-        ]
-        
-        main_table = Table(main_data, colWidths=[2*inch, 4*inch])
-        main_table.setStyle(TableStyle([
-            ('TEXTCOLOR', (0, 0), (-1, -1), SECONDARY_COLOR),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('LINEBELOW', (0, 0), (-1, -2), 0.5, PRIMARY_COLOR),
-        ]))
-        
-        story.append(main_table)
-        story.append(Spacer(1, 20))
-        
-        # Description
-        story.append(Paragraph("DESCRIPTION DU PROBLÈME", section_style))
-        story.append(Paragraph(single_panne['description'], styles['Normal']))
-        story.append(Spacer(1, 15))
-        
-        # Cause
-        story.append(Paragraph("CAUSE IDENTIFIÉE", section_style))
-        story.append(Paragraph(single_panne['cause'] or 'Non renseignée', styles['Normal']))
-        story.append(Spacer(1, 15))
-        
-        # Solution
-        story.append(Paragraph("SOLUTION APPLIQUÉE", section_style))
-        story.append(Paragraph(single_panne['solution'] or 'Non renseignée', styles['Normal']))
-        story.append(Spacer(1, 15))
-        
-        # Observations
-        story.append(Paragraph("OBSERVATIONS", section_style))
-        story.append(Paragraph(single_panne['observation'] or 'Aucune observation', styles['Normal']))
+        story.extend(pdf_panne_section(single_panne))
         
     else:
         # Export de toutes les pannes
@@ -565,7 +653,8 @@ def create_pdf_export(pannes_data, single_panne=None):
         story.append(Spacer(1, 20))
         
         # Statistiques simples
-        stats = calculate_stats(pannes_data)
+        if stats is None:
+            stats = calculate_stats(pannes_data)
         
         story.append(Paragraph("STATISTIQUES", section_style))
         
@@ -593,54 +682,49 @@ def create_pdf_export(pannes_data, single_panne=None):
         story.append(stats_table)
         story.append(Spacer(1, 25))
         
-        # Tableau des pannes - simple
-        story.append(Paragraph("LISTE DES PANNES", section_style))
-        
-        table_data = [['ID', 'Équipement', 'Priorité', 'État', 'Date', 'Créé par']]
-        
-        for panne in pannes_data:
-            table_data.append([
-                f"#{panne['id']}",
-                panne['equipement'][:20] + '...' if len(panne['equipement']) > 20 else panne['equipement'],
-                panne['priorite'],
-                panne['etat'],
-                panne['date_creation'].split(' ')[0],
-                panne['username'][:10] + '...' if len(panne['username']) > 10 else panne['username']
-            ])
+        disponibilite = stats.get('disponibilite')
+        if disponibilite:
+            story.append(Paragraph(f"DISPONIBILITÉ DES ÉQUIPEMENTS ({availability.WINDOW_DAYS} DERNIERS JOURS)", section_style))
+            availability_data = [['Disponibilité moyenne', f"{disponibilite['moyenne']:.1f}%", disponibilite['appreciation']]]
+            for equipement in disponibilite['equipements']:
+                availability_data.append([equipement['equipement'][:40], f"{equipement['disponibilite']:.1f}%",
+                                          f"Arrêt : {format_duration(equipement['arret'])}"])
+            availability_table = Table(availability_data, colWidths=[2.5*inch, 1.2*inch, 2.3*inch])
+            availability_table.setStyle(TableStyle([
+                ('TEXTCOLOR', (0, 0), (-1, -1), SECONDARY_COLOR),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 9),
+                ('LEFTPADDING', (0, 0), (-1, -1), 5),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+                ('TOPPADDING', (0, 0), (-1, -1), 3),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+                ('LINEBELOW', (0, 0), (-1, -2), 0.5, PRIMARY_COLOR),
+            ]))
+            story.append(availability_table)
+            story.append(Spacer(1, 25))
         
-        table = Table(table_data, colWidths=[0.6*inch, 2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('TEXTCOLOR', (0, 0), (-1, -1), SECONDARY_COLOR),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, PRIMARY_COLOR),
-            ('LINEBELOW', (0, 1), (-1, -1), 0.25, PRIMARY_COLOR),
-        ]))
+        # Tableau des pannes, découpé en blocs de taille fixe : ReportLab
+        # mesure et découpe chaque bloc indépendamment (temps linéaire)
+        story.append(Paragraph("LISTE DES PANNES", section_style))
         
-        story.append(table)
-    
-    # Pied de page simple
-    story.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=1,  # Centré
-        textColor=SECONDARY_COLOR
-    )
-    story.append(Paragraph("ONEE-BO - Gestion des Pannes", footer_style))
+        story.extend(pdf_history_tables(pannes_data, max_rows, by_month, chunk_rows))
     
     doc.build(story)
     buffer.seek(0)
     return buffer
 
+def create_pdf_bundle(pannes, output):
+    """PDF unique regroupant les rapports détaillés de plusieurs pannes, une panne par section"""
+    doc = pdf_render.create_document(output, LOGO_PATH, COMPANY_NAME, COMPANY_SUBTITLE, title="Bons de travail")
+    story = []
+    for panne in pannes:
+        if story:
+            story.append(PageBreak())
+        story.extend(pdf_panne_section(panne))
+    doc.build(story)
+    return output
+
 def get_performance_text(percentage):
     """Retourner une évaluation textuelle selon le pourcentage"""
     if percentage >= 95:
@@ -694,23 +778,119 @@ def get_performance_emoji(percentage):
     else:
         return '🔴 Critique'
 
-def calculate_stats(pannes_data):
-    """Calculer les statistiques des pannes"""
-    total = len(pannes_data)
-    en_attente = len([p for p in pannes_data if p['etat'] == 'En attente'])
-    en_cours = len([p for p in pannes_data if p['etat'] == 'En cours'])
-    resolues = len([p for p in pannes_data if p['etat'] == 'Résolue'])
+def stats_from_counts(par_etat, par_priorite):
+    """Construire le dictionnaire de statistiques à partir des compteurs par état et priorité"""
+    total = sum(par_etat.values())
+    resolues = par_etat.get('Résolue', 0)
     
     taux_resolution = (resolues / total * 100) if total > 0 else 0
     
     return {
         'total': total,
-        'en_attente': en_attente,
-        'en_cours': en_cours,
+        'en_attente': par_etat.get('En attente', 0),
+        'en_cours': par_etat.get('En cours', 0),
         'resolues': resolues,
-        'taux_resolution': taux_resolution
+        'fermees': par_etat.get('Fermée', 0),
+        'taux_resolution': taux_resolution,
+        'par_etat': dict(par_etat),
+        'par_priorite': dict(par_priorite)
     }
 
+def calculate_stats(pannes_data):
+    """Calculer les statistiques des pannes en un seul passage sur les lignes"""
+    par_etat = Counter()
+    par_priorite = Counter()
+    for panne in pannes_data:
+        par_etat[panne['etat']] += 1
+        par_priorite[panne['priorite']] += 1
+    
+    return stats_from_counts(par_etat, par_priorite)
+
+def get_pannes_stats(conn):
+    """Lire les statistiques depuis les compteurs maintenus par triggers (table pannes_stats)"""
+    par_etat = Counter()
+    par_priorite = Counter()
+    for row in conn.execute('SELECT etat, priorite, total FROM pannes_stats'):
+        par_etat[row['etat']] += row['total']
+        par_priorite[row['priorite']] += row['total']
+    
+    return stats_from_counts(par_etat, par_priorite)
+
+# Équipements affichés au tableau de bord (les plus souvent réparés)
+DELAYS_TOP_EQUIPEMENTS = 10
+
+def get_pannes_delays(conn):
+    """MTTA et MTTR moyens (secondes) par priorité, équipement et technicien, lus dans les cumuls pannes_delais"""
+    delays = {}
+    for dimension in ('priorite', 'equipement', 'technicien'):
+        entries = {}
+        rows = conn.execute(
+            '''SELECT d.cle, d.mesure, d.nombre, d.total_secondes, COALESCE(u.username, q.nom) AS nom
+               FROM pannes_delais d
+               LEFT JOIN users u ON d.dimension = 'technicien' AND u.id = CAST(d.cle AS INTEGER)
+               LEFT JOIN equipements q ON d.dimension = 'equipement' AND q.id = CAST(d.cle AS INTEGER)
+               WHERE d.dimension = ?''',
+            (dimension,)
+        )
+        for row in rows:
+            entry = entries.setdefault(row['cle'], {
+                'nom': row['nom'] or row['cle'],
+                'mtta': None, 'mttr': None, 'nb_mtta': 0, 'nb_mttr': 0
+            })
+            entry['nb_' + row['mesure']] = row['nombre']
+            if row['nombre']:
+                entry[row['mesure']] = row['total_secondes'] / row['nombre']
+        delays[dimension] = entries
+    
+    ordre = {priorite: i for i, priorite in enumerate(reversed(init_db.PRIORITES))}
+    return {
+        'priorite': sorted(delays['priorite'].values(), key=lambda e: ordre.get(e['nom'], len(ordre))),
+        'technicien': sorted(delays['technicien'].values(), key=lambda e: e['nom']),
+        'equipement': sorted(delays['equipement'].values(),
+                             key=lambda e: (-e['nb_mttr'], -e['nb_mtta'], e['nom']))[:DELAYS_TOP_EQUIPEMENTS],
+    }
+
+# Disponibilité des équipements (voir availability.py)
+
+# Équipements listés au tableau de bord et dans les exports (les moins disponibles)
+AVAILABILITY_TOP = 10
+
+def get_availability(conn, start=None, end=None, noms=None):
+    """Disponibilité du parc (ou des équipements ``noms``) sur une fenêtre (par défaut les 30 derniers jours complets)"""
+    if start is None or end is None:
+        start, end = availability.default_window()
+    equipements = availability.fleet_availability(conn, start, end, noms)
+    moyenne = sum(e['disponibilite'] for e in equipements) / len(equipements) if equipements else 100.0
+    return {
+        'debut': start,
+        'fin': end,
+        'moyenne': moyenne,
+        'appreciation': get_performance_text(moyenne),
+        'nombre': len(equipements),
+        'equipements': [dict(e, appreciation=get_performance_emoji(e['disponibilite']))
+                        for e in equipements[:AVAILABILITY_TOP]],
+    }
+
+def get_export_stats(conn):
+    """Statistiques de l'historique complétées de la disponibilité des équipements (exports)"""
+    stats = get_pannes_stats(conn)
+    stats['disponibilite'] = get_availability(conn)
+    return stats
+
+@app.template_filter('duree')
+def format_duration(seconds):
+    """Durée lisible : « 45 min », « 3 h 05 », « 2 j 4 h »"""
+    if seconds is None:
+        return '—'
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} min"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} h {minutes:02d}"
+    days, hours = divmod(hours, 24)
+    return f"{days} j {hours} h"
+
 def get_priority_style(priority):
     """Retourner le style selon la priorité"""
     if priority == 'Haute':
@@ -748,7 +928,7 @@ def get_performance_emoji(percentage):
     else:
         return '🔴'
 
-def create_excel_export(pannes_data, single_panne=None):
+def create_excel_export(pannes_data, single_panne=None, stats=None):
     """Créer un fichier Excel avec design amélioré pour le dessalement"""
     wb = openpyxl.Workbook()
     wb = create_excel_styles(wb)
@@ -848,7 +1028,8 @@ def create_excel_export(pannes_data, single_panne=None):
         
         # Statistiques
         current_row = start_row + 1
-        stats = calculate_stats(pannes_data)
+        if stats is None:
+            stats = calculate_stats(pannes_data)
         
         ws[f'A{current_row}'] = "STATISTIQUES GÉNÉRALES"
         ws[f'A{current_row}'].style = "subheader_style"
@@ -926,6 +1107,1091 @@ def create_excel_export(pannes_data, single_panne=None):
     
     return wb
 
+# Export Excel en flux (mode write-only d'openpyxl)
+
+EXPORT_BATCH_SIZE = 1000       # Lignes lues par fetchmany()
+EXCEL_MAX_ROWS = 1048576       # Limite de lignes d'une feuille Excel
+
+HISTORY_HEADERS = ['ID', 'Équipement', 'Description', 'Priorité', 'État', 'Date', 'Créé par', 'Cause', 'Solution', 'Observations']
+
+def iter_cursor(cursor, size=EXPORT_BATCH_SIZE):
+    """Parcourir un curseur SQLite par lots, sans charger tout le résultat en mémoire"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield from rows
+
+def excel_history_values(panne):
+    """Valeurs d'une ligne du tableau historique"""
+    return [
+        f"#{panne['id']}",
+        panne['equipement'],
+        panne['description'][:50] + '...' if len(panne['description']) > 50 else panne['description'],
+        panne['priorite'],
+        panne['etat'],
+        panne['date_creation'],
+        panne['username'],
+        panne['cause'] or 'Non renseignée',
+        panne['solution'] or 'Non renseignée',
+        panne['observation'] or 'Aucune'
+    ]
+
+def create_excel_row_styles(wb):
+    """Un style nommé par couleur d'état, partagé par toutes les cellules du tableau"""
+    for status in ('Résolue', 'En cours', 'En attente', 'default'):
+        fill_color = get_status_color(status)
+        row_style = NamedStyle(name=f"row_{fill_color}")
+        row_style.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type='solid')
+        row_style.border = Border(
+            left=Side(style='thin'), right=Side(style='thin'),
+            top=Side(style='thin'), bottom=Side(style='thin')
+        )
+        try:
+            wb.add_named_style(row_style)
+        except ValueError:
+            pass
+    return wb
+
+def styled_cells(ws, values, style):
+    """Construire une ligne de cellules write-only portant un style nommé"""
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+def start_streaming_history_sheet(wb, sheet_number, widths, stats):
+    """Créer une feuille d'historique (en-tête complet sur la première) et retourner (feuille, lignes écrites)"""
+    ws = wb.create_sheet("Historique_Pannes" if sheet_number == 1 else f"Historique_Pannes_{sheet_number}")
+    
+    # En mode write-only, les largeurs doivent être fixées avant la première ligne
+    for col_idx, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(max(width + 2, 15), 50)
+    
+    rows_written = 0
+    if sheet_number == 1:
+        if os.path.exists(LOGO_PATH):
+            try:
+                logo = OpenpyxlImage(LOGO_PATH)
+                logo.height = 80
+                logo.width = 80
+                ws.add_image(logo, 'A1')
+            except Exception as e:
+                print(f"Erreur lors de l'ajout du logo: {e}")
+        
+        header_rows = [
+            [None, None, COMPANY_NAME],
+            [None, None, COMPANY_SUBTITLE],
+            [],
+            styled_cells(ws, ["HISTORIQUE COMPLET DES PANNES"], "header_style"),
+            [f"Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}"],
+            [],
+            styled_cells(ws, ["STATISTIQUES GÉNÉRALES"], "subheader_style"),
+            [],
+            ['Total des pannes:', stats['total']],
+            ['En attente:', stats['en_attente']],
+            ['En cours:', stats['en_cours']],
+            ['Résolues:', stats['resolues']],
+            ['Taux de résolution:', f"{stats['taux_resolution']:.1f}%"],
+            [],
+        ]
+        disponibilite = stats.get('disponibilite')
+        if disponibilite:
+            header_rows.append(styled_cells(ws, [f"DISPONIBILITÉ DES ÉQUIPEMENTS ({availability.WINDOW_DAYS} DERNIERS JOURS)"], "subheader_style"))
+            header_rows.append(['Disponibilité moyenne:', f"{disponibilite['moyenne']:.1f}%", disponibilite['appreciation']])
+            for equipement in disponibilite['equipements']:
+                header_rows.append([equipement['equipement'], f"{equipement['disponibilite']:.1f}%",
+                                    f"Arrêt : {format_duration(equipement['arret'])}"])
+            header_rows.append([])
+        header_rows += [
+            styled_cells(ws, ["DÉTAIL DES PANNES"], "subheader_style"),
+            [],
+        ]
+        for row in header_rows:
+            ws.append(row)
+        rows_written = len(header_rows)
+    
+    ws.append(styled_cells(ws, HISTORY_HEADERS, "header_style"))
+    return ws, rows_written + 1
+
+def write_streaming_excel_export(pannes, stats, output):
+    """Écrire l'historique dans un fichier xlsx en flux, à mémoire constante.
+    
+    Les largeurs de colonnes sont calculées au fil des lignes : la première feuille
+    utilise le premier lot, les feuilles suivantes le maximum observé jusque-là.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    create_excel_styles(wb)
+    create_excel_row_styles(wb)
+    
+    widths = [len(header) for header in HISTORY_HEADERS]
+    values_iter = (excel_history_values(panne) for panne in pannes)
+    first_batch = list(islice(values_iter, EXPORT_BATCH_SIZE))
+    for values in first_batch:
+        for col_idx, value in enumerate(values):
+            widths[col_idx] = max(widths[col_idx], len(str(value)))
+    
+    sheet_number = 1
+    ws, sheet_rows = start_streaming_history_sheet(wb, sheet_number, widths, stats)
+    
+    for values in chain(first_batch, values_iter):
+        if sheet_rows >= EXCEL_MAX_ROWS:
+            sheet_number += 1
+            ws, sheet_rows = start_streaming_history_sheet(wb, sheet_number, widths, stats)
+        
+        for col_idx, value in enumerate(values):
+            length = len(str(value))
+            if length > widths[col_idx]:
+                widths[col_idx] = length
+        
+        ws.append(styled_cells(ws, values, f"row_{get_status_color(values[4])}"))
+        sheet_rows += 1
+    
+    wb.save(output)
+    return output
+
+# Exports bruts en flux (CSV / NDJSON) avec filtres appliqués en SQL
+
+EXPORT_COLUMNS = {
+    'id': 'p.id',
+    'equipement': 'p.equipement',
+    'description': 'p.description',
+    'priorite': 'p.priorite',
+    'etat': 'p.etat',
+    'date_creation': 'p.date_creation',
+    'cause': 'p.cause',
+    'solution': 'p.solution',
+    'observation': 'p.observation',
+    'user_id': 'p.user_id',
+    'username': 'u.username'
+}
+
+def parse_date_filter(value, name):
+    """Valider une date de filtre au format AAAA-MM-JJ"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Date invalide pour {name} : {value} (format attendu AAAA-MM-JJ)")
+
+def search_index_available(conn):
+    """L'index plein texte (FTS5) existe-t-il sur cette base ?"""
+    return conn.execute('PRAGMA table_info(pannes_fts)').fetchone() is not None
+
+def build_pannes_clauses(args, conn=None):
+    """Traduire les filtres de la requête (état, priorité, équipement, auteur, période, texte) en conditions paramétrées.
+    
+    Avec ``conn``, un filtre texte sur une base sans FTS5 est refusé (ValueError) avant toute lecture.
+    """
+    clauses = []
+    params = []
+    
+    for name, column, allowed in (('etat', 'p.etat', init_db.ETATS), ('priorite', 'p.priorite', init_db.PRIORITES)):
+        values = [v for v in args.getlist(name) if v]
+        invalid = [v for v in values if v not in allowed]
+        if invalid:
+            raise ValueError(f"Valeur invalide pour {name} : {', '.join(invalid)}")
+        if len(values) == 1:
+            clauses.append(f'{column} = ?')
+        elif values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    
+    # Même clé que le registre : « pompe-c3 » retrouve « Pompe C3 ». pannes.equipement
+    # reprend le nom enregistré : l'index (equipement, date_creation) sert les tris par date et par équipement
+    equipement = args.get('equipement', '').strip()
+    if equipement:
+        clauses.append('p.equipement = (SELECT nom FROM equipements WHERE cle = ?)')
+        params.append(init_db.equipment_key(equipement))
+    
+    utilisateur = args.get('utilisateur', '').strip()
+    if utilisateur:
+        if not utilisateur.isdigit():
+            raise ValueError(f"Utilisateur invalide : {utilisateur}")
+        clauses.append('p.user_id = ?')
+        params.append(int(utilisateur))
+    
+    # date_creation est stockée en texte 'AAAA-MM-JJ HH:MM:SS' : comparaison lexicographique
+    if args.get('date_debut'):
+        clauses.append('p.date_creation >= ?')
+        params.append(parse_date_filter(args['date_debut'], 'date_debut').strftime('%Y-%m-%d'))
+    if args.get('date_fin'):
+        clauses.append('p.date_creation < ?')
+        params.append((parse_date_filter(args['date_fin'], 'date_fin') + timedelta(days=1)).strftime('%Y-%m-%d'))
+    
+    # Texte libre : pannes trouvées par l'index plein texte (mêmes règles que la recherche instantanée)
+    query = build_fts_query(args.get('q', ''))
+    if query:
+        if conn is not None and not search_index_available(conn):
+            raise ValueError('Recherche plein texte indisponible sur cette base')
+        clauses.append('p.id IN (SELECT rowid FROM pannes_fts WHERE pannes_fts MATCH ?)')
+        params.append(query)
+    
+    return clauses, params
+
+def build_pannes_filters(args, conn=None):
+    """Filtres de la requête sous forme de clause WHERE paramétrée"""
+    clauses, params = build_pannes_clauses(args, conn)
+    where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    return where, params
+
+# Filtres et tris de l'historique, repris tels quels par ses exports Excel, PDF, CSV et NDJSON
+HISTORIQUE_FILTRES = ('etat', 'priorite', 'equipement', 'utilisateur', 'date_debut', 'date_fin', 'q')
+
+# tri -> (colonne, valeurs dans l'ordre décroissant, ordre par défaut)
+# Les colonnes à valeurs fixes (priorité, état) ne sont pas triées par libellé :
+# elles sont parcourues valeur par valeur dans l'ordre métier, chaque valeur
+# étant lue dans l'ordre des dates par l'index (colonne, date_creation).
+# Le tri par équipement lit l'index (equipement, date_creation) dans l'ordre quand
+# aucun filtre ne s'applique ; sinon SQLite choisit l'index du filtre et ne trie
+# que les pannes retenues.
+HISTORIQUE_TRIS = {
+    'date': (None, None, 'desc'),
+    'equipement': ('p.equipement', None, 'asc'),
+    'priorite': ('p.priorite', tuple(reversed(init_db.PRIORITES)), 'desc'),
+    'etat': ('p.etat', init_db.ETATS, 'desc'),
+}
+
+def parse_history_sort(args):
+    """Tri demandé (tri=, ordre=asc|desc) : (nom du tri, décroissant ?)"""
+    tri = args.get('tri') or 'date'
+    if tri not in HISTORIQUE_TRIS:
+        raise ValueError(f"Tri invalide : {tri} (attendu : {', '.join(HISTORIQUE_TRIS)})")
+    ordre = args.get('ordre') or HISTORIQUE_TRIS[tri][2]
+    if ordre not in ('asc', 'desc'):
+        raise ValueError(f"Ordre invalide : {ordre} (attendu : asc ou desc)")
+    return tri, ordre == 'desc'
+
+def history_filter_args(args, sort=True):
+    """Filtres (et tri) présents dans la requête, {nom: [valeurs]} pour url_for"""
+    names = HISTORIQUE_FILTRES + (('tri', 'ordre') if sort else ())
+    filtres = {name: [v for v in args.getlist(name) if v] for name in names}
+    return {name: values for name, values in filtres.items() if values}
+
+def history_export_filters(args, conn=None):
+    """Filtres et tri validés d'un export de l'historique, en paires (nom, valeur) transmissibles à une tâche"""
+    filtres = [(name, value) for name, values in history_filter_args(args).items() for value in values]
+    build_pannes_clauses(MultiDict(filtres), conn)
+    parse_history_sort(MultiDict(filtres))
+    return filtres
+
+def history_queries(select, clauses, params, tri, descending, position=None):
+    """Requêtes (SQL, paramètres) dont les résultats mis bout à bout donnent l'historique filtré et trié.
+    
+    ``position`` (valeur de tri, date_creation, id) reprend la lecture après une panne.
+    """
+    column, values, _ = HISTORIQUE_TRIS[tri]
+    op, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    base = f'SELECT {select} FROM pannes p JOIN users u ON p.user_id = u.id'
+    
+    if values is None:
+        keys = ([column] if column else []) + ['p.date_creation', 'p.id']
+        clauses, params = list(clauses), list(params)
+        if position:
+            clauses.append(f"({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})")
+            params.extend(position[-len(keys):])
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        yield f"{base}{where} ORDER BY {', '.join(f'{key} {direction}' for key in keys)}", params
+        return
+    
+    ordered = values if descending else values[::-1]
+    if position:
+        if position[0] not in ordered:
+            return
+        ordered = ordered[ordered.index(position[0]):]
+    for value in ordered:
+        value_clauses, value_params = list(clauses) + [f'{column} = ?'], list(params) + [value]
+        if position and value == position[0]:
+            value_clauses.append(f'(p.date_creation, p.id) {op} (?, ?)')
+            value_params.extend(position[1:])
+        yield (f"{base} WHERE {' AND '.join(value_clauses)} "
+               f"ORDER BY p.date_creation {direction}, p.id {direction}", value_params)
+
+def iter_history(conn, select, clauses, params, tri, descending):
+    """Toutes les pannes filtrées et triées, lues par lots (exports)"""
+    return chain.from_iterable(
+        iter_cursor(conn.execute(sql, sql_params))
+        for sql, sql_params in history_queries(select, clauses, params, tri, descending)
+    )
+
+def get_history_stats(conn, clauses, params, equipement=''):
+    """Statistiques d'un historique filtré (compteurs par triggers s'il n'y a pas de filtre).
+    
+    Filtré, la disponibilité n'est donnée que pour l'équipement filtré : celle du parc
+    ne correspondrait pas aux compteurs affichés.
+    """
+    if not clauses:
+        return get_export_stats(conn)
+    # Une somme par état et par priorité en un seul parcours : pas de GROUP BY (tri en mémoire)
+    sums = ', '.join(['SUM(p.etat = ?)'] * len(init_db.ETATS) + ['SUM(p.priorite = ?)'] * len(init_db.PRIORITES))
+    row = conn.execute(
+        f"SELECT {sums} FROM pannes p WHERE {' AND '.join(clauses)}",
+        list(init_db.ETATS) + list(init_db.PRIORITES) + list(params)
+    ).fetchone()
+    totals = [total or 0 for total in row]
+    par_etat = Counter({etat: total for etat, total in zip(init_db.ETATS, totals) if total})
+    par_priorite = Counter({priorite: total for priorite, total in zip(init_db.PRIORITES, totals[len(init_db.ETATS):]) if total})
+    stats = stats_from_counts(par_etat, par_priorite)
+    if equipement:
+        row = conn.execute('SELECT nom FROM equipements WHERE cle = ?', (init_db.equipment_key(equipement),)).fetchone()
+        if row:
+            stats['disponibilite'] = get_availability(conn, noms=[row['nom']])
+    return stats
+
+def parse_export_columns(value):
+    """Colonnes demandées (paramètre colonnes=id,equipement,...), toutes par défaut"""
+    if not value:
+        return list(EXPORT_COLUMNS)
+    columns = [c.strip() for c in value.split(',') if c.strip()]
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {', '.join(unknown)}")
+    return columns
+
+def query_export_rows(conn, columns, clauses, params, tri='date', descending=True):
+    """Lignes de l'export (colonnes demandées), filtrées et triées comme l'historique, lues par lots"""
+    select = ', '.join(f'{EXPORT_COLUMNS[c]} AS {c}' for c in columns)
+    return iter_history(conn, select, clauses, params, tri, descending)
+
+def csv_chunks(rows, columns):
+    """Produire le CSV par blocs d'environ EXPORT_BATCH_SIZE lignes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(tuple(row))
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(rows, columns):
+    """Produire une ligne JSON par panne, par blocs"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+def streaming_export_response(export_format):
+    """Réponse d'export CSV/NDJSON envoyée au fil de la lecture du curseur"""
+    conn = get_db_connection()
+    try:
+        columns = parse_export_columns(request.args.get('colonnes'))
+        clauses, params = build_pannes_clauses(request.args, conn)
+        tri, descending = parse_history_sort(request.args)
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+    
+    rows = query_export_rows(conn, columns, clauses, params, tri, descending)
+    
+    if export_format == 'csv':
+        chunks = csv_chunks(rows, columns)
+        mimetype = 'text/csv'  # Werkzeug ajoute « ; charset=utf-8 » aux types text/*
+    else:
+        chunks = ndjson_chunks(rows, columns)
+        mimetype = 'application/x-ndjson; charset=utf-8'
+    filename = f'pannes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+    
+    if request.args.get('gzip') in ('1', 'true', 'oui'):
+        chunks = compression.gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    if mimetype == 'application/gzip':
+        compression.skip(response)
+    return response
+
+# Cache des exports (voir export_cache.py)
+
+# À incrémenter quand la mise en forme des exports change, pour invalider le cache
+EXPORT_FORMAT_VERSION = 5
+
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def get_data_version(conn):
+    """Jeton de version des données : époque de la base et compteur incrémenté par triggers"""
+    row = conn.execute('SELECT version, epoque FROM data_version WHERE id = 1').fetchone()
+    return f"{row['epoque']}.{row['version']}" if row else '0'
+
+def get_data_stamp(conn):
+    """Jeton de version des données et date (UTC) de la dernière écriture"""
+    row = conn.execute('SELECT version, epoque, modifie_le FROM data_version WHERE id = 1').fetchone()
+    if not row:
+        return '0', None
+    modifie_le = None
+    if row['modifie_le']:
+        modifie_le = datetime.strptime(row['modifie_le'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return f"{row['epoque']}.{row['version']}", modifie_le
+
+@contextmanager
+def read_transaction(conn):
+    """Lectures dans une même transaction : le jeton de version et les lignes viennent du même instantané"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+@contextmanager
+def write_transaction(conn):
+    """Lectures et écritures dans une même transaction, verrou d'écriture pris dès le début (BEGIN IMMEDIATE)"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def panne_fingerprint(panne):
+    """Empreinte du contenu d'une panne (avec son auteur) pour les exports individuels"""
+    return hashlib.sha256(repr(tuple(panne)).encode('utf-8')).hexdigest()
+
+def history_export_key(kind, version, options=None, filtres=()):
+    """Clé de cache d'un export de l'historique (complet ou filtré)"""
+    # La fenêtre de disponibilité des équipements avance chaque jour
+    window_end = availability.default_window()[1].strftime('%Y-%m-%d')
+    return export_cache.make_key(EXPORT_FORMAT_VERSION, kind, 'historique', version, window_end,
+                                 *sorted((options or {}).items()), *filtres)
+
+def pdf_history_options():
+    """Options de l'historique PDF : limite et découpage par mois (configuration, ou ?par_mois=1)"""
+    by_month = app.config['PDF_HISTORY_BY_MONTH']
+    if request.values.get('par_mois') is not None:
+        by_month = request.values.get('par_mois') in ('1', 'true', 'oui')
+    return {'max_rows': app.config['PDF_HISTORY_MAX_ROWS'], 'by_month': by_month}
+
+def cached_export(cache_dir, key, extension, build, max_bytes=export_cache.MAX_BYTES):
+    """Chemin de l'export en cache ; s'il est absent, build(chemin) le produit puis il est ajouté au cache"""
+    path = export_cache.lookup(cache_dir, key, extension)
+    if path:
+        return path
+    
+    tmp_path = export_cache.temporary_path(cache_dir, extension)
+    try:
+        build(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return export_cache.commit(cache_dir, tmp_path, key, extension, max_bytes)
+
+def panne_report_key(content, panne):
+    """Clé de cache du rapport détaillé d'une panne ('pdf' ou 'excel')"""
+    return export_cache.make_key(EXPORT_FORMAT_VERSION, content, 'panne', panne['id'], panne_fingerprint(panne))
+
+def write_panne_report(content, panne, path):
+    """Écrire le rapport détaillé d'une panne (PDF ou Excel) dans un fichier"""
+    if content == 'pdf':
+        with open(path, 'wb') as output:
+            create_pdf_export(None, panne, output=output)
+    else:
+        create_excel_export(None, panne).save(path)
+
+def send_export_file(path, mimetype, download_name, etag):
+    """Envoyer un export depuis le disque avec requêtes conditionnelles et Range (reprise des téléchargements).
+    
+    L'ETag est la clé de cache (ou l'identifiant de la tâche) : il ne change
+    pas tant que le contenu est le même, ce qui permet les reprises via If-Range.
+    """
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag
+    )
+    response.cache_control.private = True
+    return response
+
+def history_export_rows(conn, filtres):
+    """Statistiques et lignes (triées) d'un export de l'historique, d'après ses filtres"""
+    args = MultiDict(filtres)
+    clauses, params = build_pannes_clauses(args)
+    tri, descending = parse_history_sort(args)
+    return get_history_stats(conn, clauses, params, args.get('equipement', '').strip()), iter_history(conn, 'p.*, u.username', clauses, params, tri, descending)
+
+def write_excel_history(conn, path, filtres=()):
+    """Écrire l'export Excel de l'historique (complet ou filtré) dans un fichier"""
+    stats, rows = history_export_rows(conn, filtres)
+    with open(path, 'wb') as output:
+        write_streaming_excel_export(rows, stats, output)
+
+def write_pdf_history(conn, path, options, filtres=()):
+    """Écrire l'export PDF de l'historique (complet ou filtré) dans un fichier"""
+    stats, rows = history_export_rows(conn, filtres)
+    with open(path, 'wb') as output:
+        create_pdf_export(rows, stats=stats, output=output, **options)
+
+# Exports en arrière-plan (pool de processus, voir export_jobs.py)
+
+def build_excel_history_job(progress, output_path, database_path, cache_dir, max_bytes, options, filtres=()):
+    """Tâche de fond : export Excel de l'historique (resservi depuis le cache si les données n'ont pas changé)"""
+    conn = database.open_connection(database_path, readonly=True)
+    try:
+        with read_transaction(conn):
+            key = history_export_key('excel', get_data_version(conn), options, filtres)
+            cached = export_cache.lookup(cache_dir, key, '.xlsx')
+            if cached:
+                export_cache.copy_to(cached, output_path)
+                progress.update(phase='cache', force=True)
+                return
+            
+            stats, rows = history_export_rows(conn, filtres)
+            progress.update(rows=0, total=stats['total'], phase='lecture', force=True)
+            with open(output_path, 'wb') as output:
+                write_streaming_excel_export(progress.track(rows), stats, output)
+    finally:
+        conn.close()
+    export_cache.store(cache_dir, key, '.xlsx', output_path, max_bytes)
+
+def build_pdf_history_job(progress, output_path, database_path, cache_dir, max_bytes, options, filtres=()):
+    """Tâche de fond : export PDF de l'historique (resservi depuis le cache si les données n'ont pas changé)"""
+    conn = database.open_connection(database_path, readonly=True)
+    try:
+        with read_transaction(conn):
+            key = history_export_key('pdf', get_data_version(conn), options, filtres)
+            cached = export_cache.lookup(cache_dir, key, '.pdf')
+            if cached:
+                export_cache.copy_to(cached, output_path)
+                progress.update(phase='cache', force=True)
+                return
+            
+            stats, rows = history_export_rows(conn, filtres)
+            progress.update(rows=0, total=stats['total'], phase='lecture', force=True)
+            # Les lignes sont consommées pendant la construction des tableaux
+            with open(output_path, 'wb') as output:
+                create_pdf_export(progress.track(rows), stats=stats, output=output, **options)
+    finally:
+        conn.close()
+    export_cache.store(cache_dir, key, '.pdf', output_path, max_bytes)
+
+# type -> (fonction, type MIME, extension, préfixe du nom de fichier)
+EXPORT_JOB_TYPES = {
+    'excel': (build_excel_history_job, EXCEL_MIMETYPE, '.xlsx', 'Gestion_Pannes_ONEE-BO_Historique'),
+    'pdf': (build_pdf_history_job, 'application/pdf', '.pdf', 'historique_pannes'),
+}
+
+def export_job_payload(job):
+    """Représentation JSON de l'état d'une tâche d'export"""
+    progression = None
+    if job['total']:
+        progression = round(min(job['rows'] / job['total'], 1) * 100, 1)
+    elif job['status'] == 'termine':
+        progression = 100.0
+    
+    payload = {
+        'id': job['id'],
+        'type': job['kind'],
+        'statut': job['status'],
+        'phase': job['phase'],
+        'lignes': job['rows'],
+        'total': job['total'],
+        'progression': progression,
+        'erreur': job['error'],
+        'statut_url': url_for('statut_export', job_id=job['id'])
+    }
+    if job['status'] == 'termine':
+        payload['telechargement_url'] = url_for('telecharger_export', job_id=job['id'])
+    return payload
+
+# Lots de bons de travail : rapports détaillés de plusieurs pannes
+
+BULK_MAX_PANNES = 500
+
+# contenu -> (extension, type MIME) des rapports placés dans l'archive ZIP
+BULK_CONTENTS = {
+    'pdf': ('.pdf', 'application/pdf'),
+    'excel': ('.xlsx', EXCEL_MIMETYPE),
+}
+
+def parse_panne_ids(args):
+    """Identifiants demandés (ids=1,2,3 ou paramètre ids répété), sans doublons"""
+    ids = []
+    for value in args.getlist('ids'):
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise ValueError(f"Identifiant de panne invalide : {part}")
+            ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+def select_bulk_pannes(conn, args):
+    """Pannes d'un lot : identifiants (ids) et/ou filtres de l'export (état, priorité, équipement, période)"""
+    ids = parse_panne_ids(args)
+    where, params = build_pannes_filters(args, conn)
+    if ids:
+        clause = f"p.id IN ({', '.join('?' * len(ids))})"
+        where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+        params = params + ids
+    elif not where:
+        raise ValueError("Indiquez des identifiants (ids) ou au moins un filtre")
+    
+    pannes = conn.execute(
+        f'''SELECT p.*, u.username FROM pannes p 
+            JOIN users u ON p.user_id = u.id{where} 
+            ORDER BY p.date_creation DESC, p.id DESC 
+            LIMIT ?''',
+        params + [BULK_MAX_PANNES + 1]
+    ).fetchall()
+    if len(pannes) > BULK_MAX_PANNES:
+        raise ValueError(f"Lot limité à {BULK_MAX_PANNES} pannes : affinez la sélection")
+    return pannes
+
+def render_panne_report(task):
+    """Exécuté dans le pool de processus : rapport d'une panne, produit ou resservi depuis le cache"""
+    content, panne, key, cache_dir, max_bytes = task
+    return cached_export(
+        cache_dir, key, BULK_CONTENTS[content][0],
+        lambda tmp_path: write_panne_report(content, panne, tmp_path),
+        max_bytes
+    )
+
+def write_pdf_bundle(pannes, path):
+    """Exécuté dans le pool de processus : PDF unique des rapports de plusieurs pannes"""
+    with open(path, 'wb') as output:
+        create_pdf_bundle(pannes, output)
+
+class _ChunkWriter:
+    """Flux en écriture seule pour zipfile : les octets écrits sont rendus par blocs"""
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def zip_chunks(entries):
+    """Produire une archive ZIP au fil de l'eau à partir de couples (nom dans l'archive, chemin)"""
+    writer = _ChunkWriter()
+    # Les PDF et XLSX sont déjà compressés : stockage sans recompression
+    with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, path in entries:
+            archive.write(path, name)
+            yield writer.pop()
+    yield writer.pop()
+
+# Pagination de l'historique par curseur (date_creation, id)
+
+HISTORIQUE_PAGE_SIZE = 50
+
+def encode_cursor(panne):
+    """Curseur opaque pointant après une panne (date_creation, id)"""
+    raw = f"{panne['date_creation']}|{panne['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Décoder un curseur, None s'il est absent ou invalide"""
+    if not cursor:
+        return None
+    try:
+        date_creation, panne_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return date_creation, int(panne_id)
+    except (ValueError, UnicodeError):
+        return None
+
+def encode_history_cursor(panne, tri):
+    """Curseur opaque de l'historique trié : (valeur de tri, date_creation, id) de la dernière panne"""
+    value = panne[tri] if HISTORIQUE_TRIS[tri][0] else None
+    raw = json.dumps([value, panne['date_creation'], panne['id']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """Décoder un curseur de l'historique, None s'il est absent ou invalide"""
+    if not cursor:
+        return None
+    try:
+        value, date_creation, panne_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    # Valeurs transmises telles quelles à SQLite : un curseur forgé ne doit pas y apporter de liste
+    if not isinstance(value, (str, type(None))) or not isinstance(date_creation, str) \
+            or not isinstance(panne_id, int) or isinstance(panne_id, bool):
+        return None
+    return value, date_creation, panne_id
+
+def fetch_pannes_page(conn, clauses=(), params=(), tri='date', descending=True, cursor=None,
+                      limit=HISTORIQUE_PAGE_SIZE):
+    """Lire une page de l'historique filtré et trié sans OFFSET : chaque requête reprend au curseur par index"""
+    pannes = []
+    position = decode_history_cursor(cursor)
+    for sql, sql_params in history_queries('p.*, u.username', clauses, params, tri, descending, position):
+        pannes.extend(conn.execute(f'{sql} LIMIT ?', sql_params + [limit + 1 - len(pannes)]).fetchall())
+        if len(pannes) > limit:
+            break
+    
+    # Une ligne de plus que demandé indique qu'une page suivante existe
+    next_cursor = encode_history_cursor(pannes[limit - 1], tri) if len(pannes) > limit else None
+    return pannes[:limit], next_cursor
+
+# Fiche équipement (registre equipements, voir init_db.py)
+
+def fetch_equipement_pannes(conn, equipement_id, cursor=None, limit=HISTORIQUE_PAGE_SIZE):
+    """Page de l'historique d'un équipement, reprise au curseur via l'index (equipement_id, date_creation)"""
+    position = decode_cursor(cursor)
+    if position:
+        pannes = conn.execute(
+            '''SELECT p.*, u.username FROM pannes p 
+               JOIN users u ON p.user_id = u.id 
+               WHERE p.equipement_id = ? AND (p.date_creation, p.id) < (?, ?) 
+               ORDER BY p.date_creation DESC, p.id DESC LIMIT ?''',
+            (equipement_id, position[0], position[1], limit + 1)
+        ).fetchall()
+    else:
+        pannes = conn.execute(
+            '''SELECT p.*, u.username FROM pannes p 
+               JOIN users u ON p.user_id = u.id 
+               WHERE p.equipement_id = ? 
+               ORDER BY p.date_creation DESC, p.id DESC LIMIT ?''',
+            (equipement_id, limit + 1)
+        ).fetchall()
+    
+    next_cursor = encode_cursor(pannes[limit - 1]) if len(pannes) > limit else None
+    return pannes[:limit], next_cursor
+
+def get_equipement_stats(conn, equipement_id):
+    """Statistiques d'un équipement lues dans ses compteurs (table equipements_stats)"""
+    par_etat = Counter()
+    par_priorite = Counter()
+    for row in conn.execute(
+        'SELECT etat, priorite, total FROM equipements_stats WHERE equipement_id = ?', (equipement_id,)
+    ):
+        par_etat[row['etat']] += row['total']
+        par_priorite[row['priorite']] += row['total']
+    
+    return stats_from_counts(par_etat, par_priorite)
+
+def get_equipement_delays(conn, equipement_id):
+    """MTTA et MTTR moyens (secondes) d'un équipement du registre"""
+    delays = {'mtta': None, 'mttr': None, 'nb_mtta': 0, 'nb_mttr': 0}
+    for row in conn.execute(
+        '''SELECT mesure, nombre, total_secondes FROM pannes_delais
+           WHERE dimension = 'equipement' AND cle = ?''', (str(equipement_id),)
+    ):
+        delays['nb_' + row['mesure']] = row['nombre']
+        if row['nombre']:
+            delays[row['mesure']] = row['total_secondes'] / row['nombre']
+    return delays
+
+def get_equipement_availability(conn, equipement_id, nom):
+    """Disponibilité d'un équipement sur la fenêtre par défaut (cache par version de l'équipement)"""
+    row = conn.execute('SELECT version FROM pannes_equipement_version WHERE equipement_id = ?',
+                       (equipement_id,)).fetchone()
+    start, end = availability.default_window()
+    result = availability.equipment_availability(conn, nom, start, end, row['version'] if row else None)
+    return dict(result, debut=start, fin=end, appreciation=get_performance_text(result['disponibilite']))
+
+# Recherche plein texte (FTS5)
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_TERMS = 10
+
+# Marqueurs de surlignage renvoyés par SQLite, remplacés après échappement HTML
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+def build_fts_query(text):
+    """Transformer la saisie utilisateur en requête FTS5 : chaque mot devient un préfixe, combinés en ET"""
+    terms = re.findall(r'\w+', text or '')[:SEARCH_MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def format_highlight(text):
+    """Échapper un extrait FTS5 puis convertir les marqueurs en balises <mark>"""
+    html = str(escape(text or ''))
+    return Markup(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+def search_pannes(conn, text, page=1, limit=SEARCH_PAGE_SIZE):
+    """Rechercher les pannes par pertinence (bm25), avec extraits surlignés"""
+    query = build_fts_query(text)
+    if not query:
+        return [], False
+    
+    rows = conn.execute(
+        '''SELECT p.id, p.priorite, p.etat, p.date_creation, u.username,
+                  highlight(pannes_fts, 0, ?, ?) AS equipement,
+                  snippet(pannes_fts, -1, ?, ?, '…', 16) AS extrait
+           FROM pannes_fts 
+           JOIN pannes p ON p.id = pannes_fts.rowid 
+           JOIN users u ON p.user_id = u.id 
+           WHERE pannes_fts MATCH ? 
+           ORDER BY rank LIMIT ? OFFSET ?''',
+        (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END,
+         query, limit + 1, (page - 1) * limit)
+    ).fetchall()
+    
+    resultats = [
+        dict(row, equipement=format_highlight(row['equipement']), extrait=format_highlight(row['extrait']))
+        for row in rows[:limit]
+    ]
+    return resultats, len(rows) > limit
+
+# Requêtes conditionnelles (ETag / If-None-Match, Last-Modified / If-Modified-Since)
+# Les validateurs sont calculés à partir du jeton data_version, avant toute
+# requête sur les pannes et tout rendu de template : un client à jour reçoit 304.
+
+# À incrémenter quand les templates des pages conditionnelles changent
+PAGE_FORMAT_VERSION = 5
+
+def make_etag(*parts):
+    """ETag fort dérivé des éléments qui déterminent le contenu de la réponse"""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+def set_validators(response, etag=None, last_modified=None):
+    """Ajouter ETag et Last-Modified ; le client garde la réponse mais doit la revalider"""
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag, last_modified=None):
+    """Réponse 304 si le client a déjà cette version (If-None-Match, à défaut If-Modified-Since)"""
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return set_validators(Response(status=304), etag, last_modified)
+
+def conditional_page(f):
+    """Page HTML servie en 304 tant que les données et l'utilisateur connecté n'ont pas changé"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Un message flash en attente doit être affiché : pas de 304
+        if request.method != 'GET' or session.get('_flashes'):
+            return f(*args, **kwargs)
+        
+        version, last_modified = get_data_stamp(get_db_connection(readonly=True))
+        # La page dépend du rôle et du nom affichés dans l'en-tête (base.html),
+        # des noms empreintés des fichiers statiques qu'elle référence et de la
+        # fenêtre de disponibilité des équipements (qui avance chaque jour)
+        etag = make_etag('page', PAGE_FORMAT_VERSION, static_assets.version(), request.full_path, version,
+                         availability.default_window()[1].date(),
+                         session.get('user_id'), session.get('username'), session.get('role'))
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
+    return decorated_function
+
+# API JSON v1 (/api/v1/...) : pagination par curseur, champs à la demande,
+# requêtes conditionnelles (ETag / If-None-Match, Last-Modified)
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Champs modifiables par l'API (les autres sont fixés par le serveur)
+API_TEXT_FIELDS = ('equipement', 'description', 'cause', 'solution', 'observation')
+API_REQUIRED_FIELDS = ('equipement', 'description', 'priorite', 'etat')
+
+def api_error(message, status=400):
+    """Réponse d'erreur JSON de l'API"""
+    return jsonify({'erreur': message}), status
+
+def api_login_required(f):
+    """Comme login_required, mais accepte aussi l'authentification HTTP Basic et répond 401 en JSON"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' in session:
+            g.api_user_id = session['user_id']
+            return f(*args, **kwargs)
+        
+        auth = request.authorization
+        if auth and auth.type == 'basic':
+            user = get_db_connection().execute(
+                'SELECT * FROM users WHERE username = ? AND password = ?',
+                (auth.username, auth.password)
+            ).fetchone()
+            if user:
+                g.api_user_id = user['id']
+                return f(*args, **kwargs)
+        
+        response = jsonify({'erreur': 'Authentification requise'})
+        response.status_code = 401
+        response.headers['WWW-Authenticate'] = 'Basic realm="GMAO ONEE-BO"'
+        return response
+    return decorated_function
+
+def api_page_size(value):
+    """Taille de page demandée (limite=), bornée à API_MAX_PAGE_SIZE"""
+    if not value:
+        return API_PAGE_SIZE
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"Limite invalide : {value}")
+    return min(int(value), API_MAX_PAGE_SIZE)
+
+def api_response(payload, etag=None, last_modified=None, status=200):
+    """Réponse JSON de l'API avec ses validateurs de cache"""
+    response = jsonify(payload)
+    response.status_code = status
+    return set_validators(response, etag, last_modified)
+
+def api_panne_payload(panne, columns):
+    """Représentation JSON d'une panne limitée aux champs demandés"""
+    return {column: panne[column] for column in columns}
+
+def api_panne_response(panne, columns, last_modified=None, status=200):
+    """Réponse JSON d'une panne, avec son empreinte comme ETag fort.
+    
+    Jamais compressée : l'ETag doit rester fort pour la comparaison stricte d'If-Match.
+    """
+    response = api_response(api_panne_payload(panne, columns), panne_fingerprint(panne)[:32], last_modified, status)
+    return compression.skip(response)
+
+def fetch_api_pannes_page(conn, columns, clauses, params, cursor=None, limit=API_PAGE_SIZE):
+    """Page de pannes filtrées, reprise au curseur (date_creation, id) comme l'historique"""
+    selected = list(dict.fromkeys(['id', 'date_creation'] + columns))
+    clauses = list(clauses)
+    params = list(params)
+    
+    position = decode_cursor(cursor)
+    if cursor and not position:
+        raise ValueError("Curseur invalide")
+    if position:
+        clauses.append('(p.date_creation, p.id) < (?, ?)')
+        params.extend(position)
+    
+    where_sql = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    pannes = conn.execute(
+        f'''SELECT {', '.join(f'{EXPORT_COLUMNS[c]} AS {c}' for c in selected)} FROM pannes p 
+            JOIN users u ON p.user_id = u.id{where_sql} 
+            ORDER BY p.date_creation DESC, p.id DESC LIMIT ?''',
+        params + [limit + 1]
+    ).fetchall()
+    
+    next_cursor = encode_cursor(pannes[limit - 1]) if len(pannes) > limit else None
+    return pannes[:limit], next_cursor
+
+def fetch_panne(conn, panne_id):
+    """Une panne avec le nom de son auteur, None si elle n'existe pas"""
+    return conn.execute(
+        '''SELECT p.*, u.username FROM pannes p 
+           JOIN users u ON p.user_id = u.id 
+           WHERE p.id = ?''',
+        (panne_id,)
+    ).fetchone()
+
+def validate_panne_payload(data, partial=False):
+    """Valider le corps JSON d'une création (ou d'une modification partielle) de panne"""
+    if not isinstance(data, dict):
+        raise ValueError("Le corps de la requête doit être un objet JSON")
+    
+    unknown = [key for key in data if key not in API_TEXT_FIELDS + ('priorite', 'etat')]
+    if unknown:
+        raise ValueError(f"Champs non modifiables ou inconnus : {', '.join(unknown)}")
+    if not partial:
+        missing = [key for key in API_REQUIRED_FIELDS if not data.get(key)]
+        if missing:
+            raise ValueError(f"Champs obligatoires manquants : {', '.join(missing)}")
+    
+    values = {}
+    for key, value in data.items():
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{key} doit être une chaîne de caractères")
+        if key in API_REQUIRED_FIELDS and not (value or '').strip():
+            raise ValueError(f"{key} ne peut pas être vide")
+        values[key] = value.strip() if isinstance(value, str) else value
+    
+    if 'priorite' in values and values['priorite'] not in init_db.PRIORITES:
+        raise ValueError(f"Priorité invalide (attendu : {', '.join(init_db.PRIORITES)})")
+    if 'etat' in values and values['etat'] not in init_db.ETATS:
+        raise ValueError(f"État invalide (attendu : {', '.join(init_db.ETATS)})")
+    return values
+
+# Tendances : nombre de pannes par période, lu dans les agrégats pannes_rollup
+# (tenus à jour par triggers, voir init_db.py)
+
+# Période couverte par défaut quand debut n'est pas fourni
+TRENDS_DEFAULT_SPAN = {'jour': 30, 'semaine': 12, 'mois': 12}
+TRENDS_MAX_PERIODS = 1000
+TRENDS_DIMENSIONS = ('priorite', 'etat', 'equipement')
+
+JOURS_SEMAINE = ['Dimanche', 'Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
+
+def period_start(day, granularite):
+    """Début de la période (jour, lundi de la semaine, 1er du mois) contenant une date"""
+    if granularite == 'semaine':
+        return day - timedelta(days=day.weekday())
+    if granularite == 'mois':
+        return day.replace(day=1)
+    return day
+
+def next_period(day, granularite):
+    """Début de la période suivante"""
+    if granularite == 'semaine':
+        return day + timedelta(days=7)
+    if granularite == 'mois':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def period_key(day, granularite):
+    """Clé de période telle que stockée dans pannes_rollup"""
+    return day.strftime('%Y-%m') if granularite == 'mois' else day.strftime('%Y-%m-%d')
+
+def trends_range(args, granularite):
+    """Clés des périodes couvertes par debut/fin (par défaut : les dernières périodes jusqu'à aujourd'hui)"""
+    fin = parse_date_filter(args['fin'], 'fin').date() if args.get('fin') else datetime.now().date()
+    fin = period_start(fin, granularite)
+    if args.get('debut'):
+        debut = period_start(parse_date_filter(args['debut'], 'debut').date(), granularite)
+    else:
+        debut = fin
+        for _ in range(TRENDS_DEFAULT_SPAN[granularite] - 1):
+            debut = period_start(debut - timedelta(days=1), granularite)
+    if debut > fin:
+        raise ValueError("La date de début est postérieure à la date de fin")
+    
+    periodes = []
+    day = debut
+    while day <= fin:
+        if len(periodes) >= TRENDS_MAX_PERIODS:
+            raise ValueError(f"Intervalle trop long (au plus {TRENDS_MAX_PERIODS} périodes)")
+        periodes.append(period_key(day, granularite))
+        day = next_period(day, granularite)
+    return periodes
+
+def fetch_rollup(conn, granularite, dimension, premiere, derniere):
+    """Cases non vides de pannes_rollup entre deux clés de période incluses"""
+    return conn.execute(
+        '''SELECT periode, cle, total FROM pannes_rollup
+           WHERE granularite = ? AND dimension = ? AND periode BETWEEN ? AND ? AND total > 0''',
+        (granularite, dimension, premiere, derniere)
+    ).fetchall()
+
 # Routes Flask
 
 @app.route('/')
@@ -948,7 +2214,6 @@ def login():
             'SELECT * FROM users WHERE username = ? AND password = ?',
             (username, password)
         ).fetchone()
-        conn.close()
         
         if user:
             session['user_id'] = user['id']
@@ -974,28 +2239,21 @@ def logout():
 @app.route('/dashboard')
 @login_required
 @admin_required
+@conditional_page
 def dashboard():
     conn = get_db_connection()
     
-    total_pannes = conn.execute('SELECT COUNT(*) as count FROM pannes').fetchone()['count']
-    pannes_en_attente = conn.execute('SELECT COUNT(*) as count FROM pannes WHERE etat = "En attente"').fetchone()['count']
-    pannes_resolues = conn.execute('SELECT COUNT(*) as count FROM pannes WHERE etat = "Résolue"').fetchone()['count']
-    pannes_en_cours = conn.execute('SELECT COUNT(*) as count FROM pannes WHERE etat = "En cours"').fetchone()['count']
+    stats = get_pannes_stats(conn)
     
     pannes_recentes = conn.execute(
         'SELECT * FROM pannes ORDER BY date_creation DESC LIMIT 5'
     ).fetchall()
     
-    conn.close()
+    delais = get_pannes_delays(conn)
+    disponibilite = get_availability(conn)
     
-    stats = {
-        'total': total_pannes,
-        'en_attente': pannes_en_attente,
-        'resolues': pannes_resolues,
-        'en_cours': pannes_en_cours
-    }
-    
-    return render_template('dashboard.html', stats=stats, pannes_recentes=pannes_recentes)
+    return render_template('dashboard.html', stats=stats, pannes_recentes=pannes_recentes, delais=delais,
+                           disponibilite=disponibilite)
 
 @app.route('/ajouter_panne', methods=['GET', 'POST'])
 @login_required
@@ -1011,15 +2269,17 @@ def ajouter_panne():
         date_creation = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         conn = get_db_connection()
-        conn.execute(
+        equipement_id, equipement = init_db.get_equipement(conn.cursor(), equipement)
+        cursor = conn.execute(
             '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, 
-               cause, solution, observation, user_id) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+               cause, solution, observation, user_id, equipement_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
             (equipement, description, priorite, etat, date_creation, cause, solution, 
-             observation, session['user_id'])
+             observation, session['user_id'], equipement_id)
         )
         conn.commit()
-        conn.close()
+        autocomplete.record(cursor.lastrowid, equipement_id, equipement)
+        duplicates.record(cursor.lastrowid, equipement, description, etat, date_creation)
         
         flash('Panne ajoutée avec succès !', 'success')
         return redirect(url_for('historique'))
@@ -1028,16 +2288,105 @@ def ajouter_panne():
 
 @app.route('/historique')
 @login_required
+@conditional_page
 def historique():
+    """Historique filtré (état, priorité, équipement, auteur, période, texte) et trié par SQLite"""
     conn = get_db_connection()
-    pannes = conn.execute(
-        '''SELECT p.*, u.username FROM pannes p 
-           JOIN users u ON p.user_id = u.id 
-           ORDER BY p.date_creation DESC'''
-    ).fetchall()
-    conn.close()
+    try:
+        clauses, params = build_pannes_clauses(request.args, conn)
+        tri, descending = parse_history_sort(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('historique'))
     
-    return render_template('historique.html', pannes=pannes)
+    pannes, next_cursor = fetch_pannes_page(conn, clauses, params, tri, descending)
+    
+    filtres = history_filter_args(request.args, sort=False)
+    # Lien de chaque colonne triable : même filtres, ordre inversé si la colonne est déjà triée
+    liens_tri = {
+        name: url_for('historique', **filtres, tri=name,
+                      ordre=('asc' if descending else 'desc') if name == tri else default)
+        for name, (_, _, default) in HISTORIQUE_TRIS.items()
+    }
+    # Lecture complète voulue : la liste de filtre propose tous les utilisateurs
+    utilisateurs = conn.execute('SELECT id, username FROM users ORDER BY username').fetchall()
+    
+    return render_template(
+        'historique.html',
+        pannes=pannes,
+        next_cursor=next_cursor,
+        filtres=filtres,
+        filtres_tri=history_filter_args(request.args),
+        export_params=urlencode(history_filter_args(request.args), doseq=True),
+        tri=tri,
+        descending=descending,
+        liens_tri=liens_tri,
+        utilisateurs=utilisateurs,
+        etats=init_db.ETATS,
+        priorites=tuple(reversed(init_db.PRIORITES))
+    )
+
+@app.route('/equipement/<int:equipement_id>')
+@login_required
+@conditional_page
+def fiche_equipement(equipement_id):
+    """Fiche d'un équipement : compteurs, disponibilité, délais et historique paginé"""
+    conn = get_db_connection()
+    equipement = conn.execute('SELECT * FROM equipements WHERE id = ?', (equipement_id,)).fetchone()
+    if not equipement:
+        flash('Équipement non trouvé', 'error')
+        return redirect(url_for('historique'))
+    
+    pannes, next_cursor = fetch_equipement_pannes(conn, equipement_id, request.args.get('curseur'))
+    
+    return render_template(
+        'equipement.html',
+        equipement=equipement,
+        stats=get_equipement_stats(conn, equipement_id),
+        delais=get_equipement_delays(conn, equipement['id']),
+        disponibilite=get_equipement_availability(conn, equipement['id'], equipement['nom']),
+        pannes=pannes,
+        next_cursor=next_cursor
+    )
+
+@app.route('/historique/page')
+@login_required
+def historique_page():
+    """Page suivante de l'historique, mêmes filtres et tri (fragment HTML dans du JSON) pour le défilement infini"""
+    conn = get_db_connection()
+    try:
+        clauses, params = build_pannes_clauses(request.args, conn)
+        tri, descending = parse_history_sort(request.args)
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+    
+    pannes, next_cursor = fetch_pannes_page(conn, clauses, params, tri, descending, request.args.get('curseur'))
+    
+    return jsonify({
+        'html': render_template('historique_lignes.html', pannes=pannes),
+        'curseur': next_cursor,
+        'count': len(pannes)
+    })
+
+@app.route('/historique/recherche')
+@login_required
+def historique_recherche():
+    """Recherche plein texte paginée (fragment HTML dans du JSON) pour la recherche instantanée"""
+    text = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    conn = get_db_connection()
+    try:
+        resultats, has_more = search_pannes(conn, text, page)
+    except sqlite3.OperationalError:
+        # Base sans FTS5
+        return jsonify({'html': '', 'page_suivante': None, 'count': 0}), 503
+    
+    return jsonify({
+        'html': render_template('recherche_resultats.html', resultats=resultats, page=page),
+        'page_suivante': page + 1 if has_more else None,
+        'count': len(resultats)
+    })
 
 @app.route('/modifier_panne/<int:panne_id>', methods=['GET', 'POST'])
 @login_required
@@ -1053,19 +2402,24 @@ def modifier_panne(panne_id):
         solution = request.form['solution']
         observation = request.form['observation']
         
-        conn.execute(
-            '''UPDATE pannes SET equipement=?, description=?, priorite=?, etat=?, 
-               cause=?, solution=?, observation=? WHERE id=?''',
-            (equipement, description, priorite, etat, cause, solution, observation, panne_id)
-        )
-        conn.commit()
-        conn.close()
+        # Panne vérifiée avant toute écriture : une panne inconnue ne crée pas d'équipement orphelin
+        with write_transaction(conn):
+            panne = conn.execute('SELECT date_creation FROM pannes WHERE id = ?', (panne_id,)).fetchone()
+            if not panne:
+                abort(404)
+            equipement_id, equipement = init_db.get_equipement(conn.cursor(), equipement)
+            with panne_actor(conn, session['user_id']):
+                conn.execute(
+                    '''UPDATE pannes SET equipement=?, equipement_id=?, description=?, priorite=?, etat=?, 
+                       cause=?, solution=?, observation=? WHERE id=?''',
+                    (equipement, equipement_id, description, priorite, etat, cause, solution, observation, panne_id)
+                )
+        duplicates.record(panne_id, equipement, description, etat, panne['date_creation'])
         
         flash('Panne modifiée avec succès !', 'success')
         return redirect(url_for('historique'))
     
     panne = conn.execute('SELECT * FROM pannes WHERE id = ?', (panne_id,)).fetchone()
-    conn.close()
     
     if not panne:
         flash('Panne non trouvée', 'error')
@@ -1077,50 +2431,134 @@ def modifier_panne(panne_id):
 @login_required
 @admin_required
 def export_excel():
-    """Exporter toutes les pannes en Excel avec design amélioré"""
+    """Exporter les pannes (filtres de l'historique) en Excel, depuis le cache si les données n'ont pas changé"""
     conn = get_db_connection()
-    pannes = conn.execute(
-        '''SELECT p.*, u.username FROM pannes p 
-           JOIN users u ON p.user_id = u.id 
-           ORDER BY p.date_creation DESC'''
-    ).fetchall()
-    conn.close()
-    
-    wb = create_excel_export(pannes)
+    try:
+        filtres = history_export_filters(request.args, conn)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('historique'))
     
-    excel_buffer = io.BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
+    with read_transaction(conn):
+        key = history_export_key('excel', get_data_version(conn), filtres=filtres)
+        path = cached_export(
+            app.config['EXPORT_CACHE_DIR'], key, '.xlsx',
+            lambda tmp_path: write_excel_history(conn, tmp_path, filtres),
+            app.config['EXPORT_CACHE_MAX_BYTES']
+        )
     
-    response = make_response(excel_buffer.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=Gestion_Pannes_ONEE-BO_Historique_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    response = send_export_file(
+        path, EXCEL_MIMETYPE,
+        f'Gestion_Pannes_ONEE-BO_Historique_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+        etag=key
+    )
     
-    flash('Export Excel généré avec succès !', 'success')
+    # Pas de message pour une reprise (206) ou une revalidation (304)
+    if response.status_code == 200:
+        flash('Export Excel généré avec succès !', 'success')
     return response
 
 @app.route('/export_pdf')
 @login_required
 @admin_required
 def export_pdf():
-    """Exporter toutes les pannes en PDF"""
+    """Exporter les pannes (filtres de l'historique) en PDF, depuis le cache si les données n'ont pas changé"""
     conn = get_db_connection()
-    pannes = conn.execute(
-        '''SELECT p.*, u.username FROM pannes p 
-           JOIN users u ON p.user_id = u.id 
-           ORDER BY p.date_creation DESC'''
-    ).fetchall()
-    conn.close()
+    try:
+        filtres = history_export_filters(request.args, conn)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('historique'))
     
-    pdf_buffer = create_pdf_export(pannes)
+    options = pdf_history_options()
+    with read_transaction(conn):
+        key = history_export_key('pdf', get_data_version(conn), options, filtres)
+        path = cached_export(
+            app.config['EXPORT_CACHE_DIR'], key, '.pdf',
+            lambda tmp_path: write_pdf_history(conn, tmp_path, options, filtres),
+            app.config['EXPORT_CACHE_MAX_BYTES']
+        )
     
-    response = make_response(pdf_buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=historique_pannes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    response = send_export_file(
+        path, 'application/pdf',
+        f'historique_pannes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+        etag=key
+    )
     
-    flash('Export PDF généré avec succès !', 'success')
+    # Pas de message pour une reprise (206) ou une revalidation (304)
+    if response.status_code == 200:
+        flash('Export PDF généré avec succès !', 'success')
     return response
 
+@app.route('/exports', methods=['POST'])
+@login_required
+@admin_required
+def lancer_export():
+    """Lancer un export de l'historique en arrière-plan et retourner immédiatement l'identifiant de la tâche"""
+    kind = request.values.get('type', '')
+    if kind not in EXPORT_JOB_TYPES:
+        return jsonify({'erreur': f"Type d'export inconnu : {kind}"}), 400
+    
+    try:
+        filtres = history_export_filters(request.values, get_db_connection(readonly=True))
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+    
+    builder, mimetype, extension, prefix = EXPORT_JOB_TYPES[kind]
+    options = pdf_history_options() if kind == 'pdf' else {}
+    job = export_jobs.submit_job(
+        app.config['EXPORT_RESULTS_DIR'], kind, builder,
+        args=(os.path.abspath(app.config['DATABASE']), os.path.abspath(app.config['EXPORT_CACHE_DIR']),
+              app.config['EXPORT_CACHE_MAX_BYTES'], options, filtres),
+        download_name=f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}{extension}',
+        mimetype=mimetype,
+        extension=extension
+    )
+    return jsonify(export_job_payload(job)), 202
+
+@app.route('/exports/<job_id>')
+@login_required
+@admin_required
+def statut_export(job_id):
+    """Avancement d'une tâche d'export (lignes traitées)"""
+    results_dir = app.config['EXPORT_RESULTS_DIR']
+    export_jobs.cleanup_expired(results_dir)
+    job = export_jobs.get_job(results_dir, job_id)
+    if not job:
+        return jsonify({'erreur': 'Export inconnu ou expiré'}), 404
+    return jsonify(export_job_payload(job))
+
+@app.route('/exports/<job_id>/telechargement')
+@login_required
+@admin_required
+def telecharger_export(job_id):
+    """Télécharger le fichier produit par une tâche terminée"""
+    results_dir = app.config['EXPORT_RESULTS_DIR']
+    job = export_jobs.get_job(results_dir, job_id)
+    if not job or job['status'] != 'termine':
+        flash('Export introuvable, expiré ou pas encore terminé', 'error')
+        return redirect(url_for('dashboard'))
+    
+    return send_export_file(
+        export_jobs.artifact_path(results_dir, job), job['mimetype'],
+        job['download_name'],
+        etag=job['id']
+    )
+
+@app.route('/export.csv')
+@login_required
+@admin_required
+def export_csv():
+    """Exporter les pannes (filtrées) en CSV, en flux"""
+    return streaming_export_response('csv')
+
+@app.route('/export.ndjson')
+@login_required
+@admin_required
+def export_ndjson():
+    """Exporter les pannes (filtrées) en NDJSON, en flux"""
+    return streaming_export_response('ndjson')
+
 @app.route('/export_panne_excel/<int:panne_id>')
 @login_required
 @admin_required
@@ -1132,23 +2570,27 @@ def export_panne_excel(panne_id):
            JOIN users u ON p.user_id = u.id 
            WHERE p.id = ?''', (panne_id,)
     ).fetchone()
-    conn.close()
     
     if not panne:
         flash('Panne non trouvée', 'error')
         return redirect(url_for('historique'))
     
-    wb = create_excel_export(None, panne)
-    
-    excel_buffer = io.BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
+    key = panne_report_key('excel', panne)
+    path = cached_export(
+        app.config['EXPORT_CACHE_DIR'], key, '.xlsx',
+        lambda tmp_path: write_panne_report('excel', panne, tmp_path),
+        app.config['EXPORT_CACHE_MAX_BYTES']
+    )
     
-    response = make_response(excel_buffer.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=Gestion_Pannes_ONEE-BO_{panne_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    response = send_export_file(
+        path, EXCEL_MIMETYPE,
+        f'Gestion_Pannes_ONEE-BO_{panne_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+        etag=key
+    )
     
-    flash(f'Export Excel de la panne #{panne_id} généré !', 'success')
+    # Pas de message pour une reprise (206) ou une revalidation (304)
+    if response.status_code == 200:
+        flash(f'Export Excel de la panne #{panne_id} généré !', 'success')
     return response
 
 @app.route('/export_panne_pdf/<int:panne_id>')
@@ -1162,21 +2604,422 @@ def export_panne_pdf(panne_id):
            JOIN users u ON p.user_id = u.id 
            WHERE p.id = ?''', (panne_id,)
     ).fetchone()
-    conn.close()
     
     if not panne:
         flash('Panne non trouvée', 'error')
         return redirect(url_for('historique'))
     
-    pdf_buffer = create_pdf_export(None, panne)
+    key = panne_report_key('pdf', panne)
+    path = cached_export(
+        app.config['EXPORT_CACHE_DIR'], key, '.pdf',
+        lambda tmp_path: write_panne_report('pdf', panne, tmp_path),
+        app.config['EXPORT_CACHE_MAX_BYTES']
+    )
+    
+    response = send_export_file(
+        path, 'application/pdf',
+        f'panne_{panne_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+        etag=key
+    )
+    
+    # Pas de message pour une reprise (206) ou une revalidation (304)
+    if response.status_code == 200:
+        flash(f'Export PDF de la panne #{panne_id} généré !', 'success')
+    return response
+
+@app.route('/export_pannes_lot')
+@login_required
+@admin_required
+def export_pannes_lot():
+    """Exporter les rapports détaillés de plusieurs pannes en une archive ZIP ou un PDF unique.
+    
+    Sélection par ids=1,2,3 et/ou par les filtres de l'export CSV (ex. toutes
+    les pannes critiques ouvertes : etat=En attente&etat=En cours&priorite=Critique).
+    Les rapports sont produits en parallèle dans le pool de processus des exports.
+    """
+    output_format = request.args.get('format', 'zip')
+    content = request.args.get('contenu', 'pdf')
+    if output_format not in ('zip', 'pdf'):
+        return jsonify({'erreur': f"Format inconnu : {output_format}"}), 400
+    if content not in BULK_CONTENTS:
+        return jsonify({'erreur': f"Contenu inconnu : {content}"}), 400
+    
+    conn = get_db_connection()
+    try:
+        pannes = select_bulk_pannes(conn, request.args)
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+    if not pannes:
+        return jsonify({'erreur': 'Aucune panne ne correspond à la sélection'}), 404
+    
+    cache_dir = os.path.abspath(app.config['EXPORT_CACHE_DIR'])
+    max_bytes = app.config['EXPORT_CACHE_MAX_BYTES']
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    if output_format == 'pdf':
+        # Un seul document : mis en page dans un processus du pool
+        key = export_cache.make_key(EXPORT_FORMAT_VERSION, 'pdf', 'lot',
+                                    *((panne['id'], panne_fingerprint(panne)) for panne in pannes))
+        panne_dicts = [dict(panne) for panne in pannes]
+        path = cached_export(
+            cache_dir, key, '.pdf',
+            lambda tmp_path: export_jobs.run_in_pool(write_pdf_bundle, panne_dicts, tmp_path),
+            max_bytes
+        )
+        return send_export_file(path, 'application/pdf', f'bons_de_travail_{timestamp}.pdf', etag=key)
+    
+    # Archive ZIP : un rapport par panne, produits en parallèle et envoyés dans l'ordre
+    extension = BULK_CONTENTS[content][0]
+    tasks = [
+        (content, dict(panne), panne_report_key(content, panne), cache_dir, max_bytes)
+        for panne in pannes
+    ]
+    paths = export_jobs.map_in_pool(render_panne_report, tasks, chunksize=4)
+    entries = ((f"panne_{panne['id']}{extension}", path) for panne, path in zip(pannes, paths))
+    
+    response = Response(stream_with_context(zip_chunks(entries)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=bons_de_travail_{timestamp}.zip'
+    return response
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def importer_pannes():
+    """Importer des pannes en masse depuis un fichier Excel ou CSV, avec rapport des lignes rejetées"""
+    rapport = None
+    if request.method == 'POST':
+        fichier = request.files.get('fichier')
+        if not fichier or not fichier.filename:
+            flash('Choisissez un fichier .xlsx ou .csv à importer', 'error')
+            return redirect(url_for('importer_pannes'))
+        
+        conn = get_db_connection()
+        try:
+            rapport = import_pannes.import_pannes(
+                conn, fichier.stream, fichier.filename,
+                default_user_id=session['user_id'],
+                dry_run=bool(request.form.get('verification'))
+            )
+        except import_pannes.ImportFileError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('importer_pannes'))
+        
+        if rapport['verification']:
+            flash(f"Vérification terminée : {rapport['importees']} lignes valides, {rapport['rejetees']} rejetées", 'info')
+        elif rapport['importees']:
+            autocomplete.invalidate()
+            duplicates.invalidate()
+            flash(f"{rapport['importees']} pannes importées ({rapport['rejetees']} lignes rejetées)", 'success')
+        else:
+            flash(f"Aucune panne importée ({rapport['rejetees']} lignes rejetées)", 'error')
+    
+    return render_template('importer_pannes.html', rapport=rapport)
+
+@app.route('/api/v1/pannes')
+@api_login_required
+def api_liste_pannes():
+    """Liste paginée des pannes (curseur=, limite=, champs=, filtres de l'export CSV)"""
+    conn = get_db_connection()
+    try:
+        columns = parse_export_columns(request.args.get('champs'))
+        limit = api_page_size(request.args.get('limite'))
+        clauses, params = build_pannes_clauses(request.args, conn)
+        # Curseur validé avant la réponse conditionnelle : un curseur forgé reçoit 400, jamais 304
+        if request.args.get('curseur') and not decode_cursor(request.args['curseur']):
+            raise ValueError("Curseur invalide")
+    except ValueError as e:
+        return api_error(str(e))
+    
+    version, last_modified = get_data_stamp(conn)
+    # Même version des données et mêmes paramètres : même contenu
+    etag = make_etag('liste', version, sorted(request.args.items(multi=True)))
+    unchanged = not_modified(etag, last_modified)
+    if unchanged is not None:
+        return unchanged
     
-    response = make_response(pdf_buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=panne_{panne_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    try:
+        pannes, next_cursor = fetch_api_pannes_page(conn, columns, clauses, params, request.args.get('curseur'), limit)
+    except ValueError as e:
+        return api_error(str(e))
+    
+    next_url = None
+    if next_cursor:
+        next_args = request.args.to_dict(flat=False)
+        next_args['curseur'] = next_cursor
+        next_url = url_for('api_liste_pannes', **next_args)
+    
+    payload = {
+        'pannes': [api_panne_payload(panne, columns) for panne in pannes],
+        'count': len(pannes),
+        'curseur': next_cursor,
+        'suivant': next_url,
+    }
+    return api_response(payload, etag, last_modified)
+
+@app.route('/api/v1/pannes/<int:panne_id>')
+@api_login_required
+def api_panne(panne_id):
+    """Détail d'une panne (champs=)"""
+    try:
+        columns = parse_export_columns(request.args.get('champs'))
+    except ValueError as e:
+        return api_error(str(e))
     
-    flash(f'Export PDF de la panne #{panne_id} généré !', 'success')
+    conn = get_db_connection()
+    panne = fetch_panne(conn, panne_id)
+    if not panne:
+        return api_error('Panne non trouvée', 404)
+    
+    etag = panne_fingerprint(panne)[:32]
+    last_modified = get_data_stamp(conn)[1]
+    unchanged = not_modified(etag, last_modified)
+    if unchanged is not None:
+        return unchanged
+    return api_panne_response(panne, columns, last_modified)
+
+@app.route('/api/v1/pannes', methods=['POST'])
+@api_login_required
+def api_creer_panne():
+    """Créer une panne à partir d'un objet JSON"""
+    try:
+        values = validate_panne_payload(request.get_json(silent=True))
+    except ValueError as e:
+        return api_error(str(e))
+    
+    conn = get_db_connection()
+    equipement_id, equipement = init_db.get_equipement(conn.cursor(), values['equipement'])
+    cursor = conn.execute(
+        '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, 
+           cause, solution, observation, user_id, equipement_id) 
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (equipement, values['description'], values['priorite'], values['etat'],
+         datetime.now().strftime('%Y-%m-%d %H:%M:%S'), values.get('cause'), values.get('solution'),
+         values.get('observation'), g.api_user_id, equipement_id)
+    )
+    conn.commit()
+    autocomplete.record(cursor.lastrowid, equipement_id, equipement)
+    
+    panne = fetch_panne(conn, cursor.lastrowid)
+    duplicates.record(panne['id'], panne['equipement'], panne['description'], panne['etat'], panne['date_creation'])
+    response = api_panne_response(panne, list(EXPORT_COLUMNS), status=201)
+    response.headers['Location'] = url_for('api_panne', panne_id=panne['id'])
     return response
 
+@app.route('/api/v1/pannes/<int:panne_id>', methods=['PATCH'])
+@api_login_required
+def api_modifier_panne(panne_id):
+    """Modifier une panne (champs fournis seulement) ; If-Match protège des modifications concurrentes"""
+    try:
+        values = validate_panne_payload(request.get_json(silent=True), partial=True)
+    except ValueError as e:
+        return api_error(str(e))
+    
+    conn = get_db_connection()
+    # Vérification d'If-Match et écriture sous le même verrou : deux PATCH portant le même
+    # ETag ne peuvent pas réussir tous les deux
+    with write_transaction(conn):
+        panne = fetch_panne(conn, panne_id)
+        if not panne:
+            return api_error('Panne non trouvée', 404)
+        if request.if_match and not request.if_match.contains(panne_fingerprint(panne)[:32]):
+            return api_error('La panne a été modifiée entre-temps (If-Match)', 412)
+        if values:
+            if 'equipement' in values:
+                values['equipement_id'], values['equipement'] = init_db.get_equipement(conn.cursor(), values['equipement'])
+            # Noms de colonnes issus de la liste blanche de validate_panne_payload (et equipement_id)
+            assignments = ', '.join(f'{column}=?' for column in values)
+            with panne_actor(conn, g.api_user_id):
+                conn.execute(f'UPDATE pannes SET {assignments} WHERE id=?', list(values.values()) + [panne_id])
+            panne = fetch_panne(conn, panne_id)
+    
+    if values:
+        duplicates.record(panne['id'], panne['equipement'], panne['description'], panne['etat'],
+                          panne['date_creation'])
+    
+    return api_panne_response(panne, list(EXPORT_COLUMNS))
+
+@app.route('/api/v1/equipements/suggestions')
+@api_login_required
+def api_suggestions_equipements():
+    """Autocomplétion du nom d'équipement (index en mémoire, voir autocomplete.py)"""
+    try:
+        limit = min(api_page_size(request.args.get('limite')), autocomplete.LIMIT)
+    except ValueError as e:
+        return api_error(str(e))
+    
+    suggestions = autocomplete.suggest(get_db_connection(), request.args.get('q', ''), limit)
+    response = api_response({'suggestions': suggestions})
+    # Réponse propre à la frappe en cours : réutilisable brièvement par le navigateur
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response
+
+@app.route('/api/v1/pannes/similaires')
+@api_login_required
+def api_pannes_similaires():
+    """Pannes ouvertes ressemblant à une saisie en cours (équipement, description) : doublons possibles"""
+    exclure = request.args.get('exclure', '')
+    if exclure and not exclure.isdigit():
+        return api_error(f"Identifiant à exclure invalide : {exclure}")
+    
+    similaires = duplicates.find(
+        get_db_connection(),
+        request.args.get('equipement', ''),
+        request.args.get('description', ''),
+        int(exclure) if exclure else None
+    )
+    for panne in similaires:
+        panne['url'] = url_for('modifier_panne', panne_id=panne['id'])
+    return api_response({'similaires': similaires})
+
+@app.route('/api/v1/tendances')
+@api_login_required
+def api_tendances():
+    """Séries du nombre de pannes par période (jour, semaine, mois) et par priorité, état ou équipement"""
+    granularite = request.args.get('granularite', 'jour')
+    dimension = request.args.get('dimension', 'priorite')
+    if granularite not in TRENDS_DEFAULT_SPAN:
+        return api_error(f"Granularité invalide (attendu : {', '.join(TRENDS_DEFAULT_SPAN)})")
+    if dimension not in TRENDS_DIMENSIONS:
+        return api_error(f"Dimension invalide (attendu : {', '.join(TRENDS_DIMENSIONS)})")
+    try:
+        periodes = trends_range(request.args, granularite)
+    except ValueError as e:
+        return api_error(str(e))
+    cles = request.args.getlist('cle')
+    
+    conn = get_db_connection()
+    version, last_modified = get_data_stamp(conn)
+    etag = make_etag('tendances', version, periodes[0], sorted(request.args.items(multi=True)))
+    unchanged = not_modified(etag, last_modified)
+    if unchanged is not None:
+        return unchanged
+    
+    index = {periode: i for i, periode in enumerate(periodes)}
+    series = {}
+    for row in fetch_rollup(conn, granularite, dimension, periodes[0], periodes[-1]):
+        if cles and row['cle'] not in cles:
+            continue
+        series.setdefault(row['cle'], [0] * len(periodes))[index[row['periode']]] = row['total']
+    
+    payload = {
+        'granularite': granularite,
+        'dimension': dimension,
+        'periodes': periodes,
+        'series': series,
+        'totaux': [sum(values) for values in zip(*series.values())] if series else [0] * len(periodes),
+    }
+    return api_response(payload, etag, last_modified)
+
+@app.route('/api/v1/tendances/creneaux')
+@api_login_required
+def api_tendances_creneaux():
+    """Carte horaire : pannes déclarées par jour de semaine et heure, sur une plage de mois"""
+    try:
+        periodes = trends_range(request.args, 'mois')
+    except ValueError as e:
+        return api_error(str(e))
+    
+    conn = get_db_connection()
+    version, last_modified = get_data_stamp(conn)
+    etag = make_etag('creneaux', version, periodes[0], sorted(request.args.items(multi=True)))
+    unchanged = not_modified(etag, last_modified)
+    if unchanged is not None:
+        return unchanged
+    
+    # valeurs[jour de semaine (0 = dimanche)][heure]
+    valeurs = [[0] * 24 for _ in JOURS_SEMAINE]
+    for row in fetch_rollup(conn, 'mois', 'creneau', periodes[0], periodes[-1]):
+        jour, heure = row['cle'].split('-')
+        valeurs[int(jour)][int(heure)] += row['total']
+    
+    payload = {
+        'debut': periodes[0],
+        'fin': periodes[-1],
+        'jours': JOURS_SEMAINE,
+        'valeurs': valeurs,
+    }
+    return api_response(payload, etag, last_modified)
+
+@app.route('/admin/db_stats')
+@login_required
+@admin_required
+def db_stats():
+    """Compteurs du pool de connexions SQLite, des caches et des index en mémoire (JSON)"""
+    return jsonify(dict(database.pool_stats(), cache_exports=export_cache.stats,
+                        cache_disponibilite=availability.stats, autocompletion=autocomplete.stats,
+                        doublons=duplicates.stats))
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recalculer entièrement les compteurs pannes_stats et les délais pannes_delais"""
+    conn = get_db_connection(readonly=False)
+    init_db.rebuild_stats(conn.cursor())
+    init_db.rebuild_delays(conn.cursor())
+    conn.commit()
+    stats = get_pannes_stats(conn)
+    print(f"✅ Compteurs et délais recalculés : {stats['total']} pannes")
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Reconstruire l'index plein texte pannes_fts"""
+    conn = get_db_connection(readonly=False)
+    init_db.rebuild_search_index(conn.cursor())
+    conn.commit()
+    print("✅ Index de recherche reconstruit")
+
+@app.cli.command('build-static')
+def build_static_command():
+    """Construire les fichiers statiques empreintés et précompressés (static/dist/)"""
+    manifest = static_assets.build(app.static_folder)
+    static_assets.reload(app)
+    for name, hashed in sorted(manifest.items()):
+        print(f"   {name} -> {static_assets.DIST_DIR}/{hashed}")
+    print(f"✅ {len(manifest)} fichiers statiques construits")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recalculer les agrégats par période pannes_rollup"""
+    conn = get_db_connection(readonly=False)
+    init_db.rebuild_rollups(conn.cursor())
+    conn.commit()
+    print("✅ Agrégats par période recalculés")
+
+@app.cli.command('import-pannes')
+@click.argument('fichier', type=click.Path(exists=True, dir_okay=False))
+@click.option('--utilisateur', default=None, help="Utilisateur attribué aux lignes sans colonne « Créé par »")
+@click.option('--verification', is_flag=True, help="Valider les lignes sans rien enregistrer")
+@click.option('--rapport', type=click.Path(dir_okay=False), default=None,
+              help="Écrire les lignes rejetées (ligne, motif) dans ce fichier CSV")
+def import_pannes_command(fichier, utilisateur, verification, rapport):
+    """Importer des pannes depuis un fichier .xlsx ou .csv"""
+    conn = get_db_connection(readonly=False)
+    default_user_id = None
+    if utilisateur:
+        user = conn.execute('SELECT id FROM users WHERE username = ?', (utilisateur,)).fetchone()
+        if not user:
+            raise click.ClickException(f"Utilisateur inconnu : {utilisateur}")
+        default_user_id = user['id']
+    
+    try:
+        result = import_pannes.import_pannes(conn, fichier, fichier, default_user_id=default_user_id,
+                                             dry_run=verification)
+    except import_pannes.ImportFileError as e:
+        raise click.ClickException(str(e))
+    
+    action = 'valides' if verification else 'importées'
+    print(f"✅ {result['importees']} lignes {action} sur {result['lignes']} en {result['duree']} s")
+    if result['rejetees']:
+        print(f"⚠️ {result['rejetees']} lignes rejetées")
+        for erreur in result['erreurs'][:20]:
+            print(f"   - ligne {erreur['ligne']} : {erreur['motif']}")
+        if rapport:
+            with open(rapport, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['ligne', 'motif'])
+                writer.writerows((e['ligne'], e['motif']) for e in result['erreurs'])
+            print(f"📄 Rapport des rejets : {rapport}")
+
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,217 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+import database
+from init_db import equipment_key
+
+# Autocomplétion du champ équipement : index en mémoire des noms du registre
+# (table equipements), sous forme de tableau trié de clés normalisées interrogé
+# par bisect. Chaque mot du nom est aussi une entrée, pour que « c3 » propose
+# « Pompe C3 ». Pour les préfixes d'un ou deux caractères, qui couvrent une
+# grande partie du registre, les LIMIT premiers sont tenus à jour d'avance ;
+# les résultats des autres préfixes très partagés sont mémorisés jusqu'au
+# prochain ajout.
+# Les suggestions sont classées par nombre de pannes récentes
+# (table pannes_rollup, granularité jour). L'index est construit au premier
+# appel, complété à chaque panne ajoutée par ce processus, et reconstruit
+# périodiquement en arrière-plan pour suivre les autres processus et les
+# imports : pendant la reconstruction, les requêtes utilisent l'index en place.
+
+RECENT_DAYS = 90        # Fenêtre du classement : pannes des 90 derniers jours
+REFRESH_SECONDS = 60    # Âge maximal de l'index avant reconstruction
+LIMIT = 10              # Nombre maximal de suggestions
+SHORT_PREFIX = 2        # Préfixes courts (nombreux candidats) : classement précalculé
+WIDE_RANGE = 1000       # Au-delà de ce nombre d'entrées, le résultat d'un préfixe est mémorisé
+
+stats = {'constructions': 0, 'recherches': 0}
+
+_index = None
+_pending = None         # Pannes enregistrées pendant une construction (None : aucune en cours)
+_generation = 0         # Incrémenté par invalidate() : une construction commencée avant est écartée
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+class PrefixIndex:
+    """Clés normalisées triées (clé, id) ; les lecteurs ne prennent jamais de verrou"""
+
+    def __init__(self, equipements, scores, last_panne_id=0):
+        self.noms = dict(equipements)
+        self.scores = scores
+        self.last_panne_id = last_panne_id
+        self.keys = sorted(entry for equipement_id, nom in self.noms.items()
+                           for entry in _entries(equipement_id, nom))
+        candidates = {}
+        for key, equipement_id in self.keys:
+            for prefix in _short_prefixes(key):
+                candidates.setdefault(prefix, set()).add(equipement_id)
+        self.top = {prefix: heapq.nsmallest(LIMIT, ids, key=self._rank) for prefix, ids in candidates.items()}
+        self.wide = {}
+        self.built_at = time.monotonic()
+
+    def _rank(self, equipement_id):
+        return -self.scores.get(equipement_id, 0), self.noms[equipement_id]
+
+    def search(self, prefix, limit=LIMIT):
+        """Équipements dont un mot commence par le préfixe, les plus en panne d'abord"""
+        cle = equipment_key(prefix) if prefix.strip() else ''
+        if not cle:
+            return []
+        if len(cle) <= SHORT_PREFIX:
+            return self.top.get(cle, [])[:limit]
+        keys = self.keys
+        start = bisect_left(keys, (cle,))
+        end = bisect_left(keys, (cle + '\uffff',), start)
+        if end - start > WIDE_RANGE:
+            wide = self.wide
+            if cle not in wide:
+                wide[cle] = heapq.nsmallest(LIMIT, {keys[i][1] for i in range(start, end)}, key=self._rank)
+            return wide[cle][:limit]
+        return heapq.nsmallest(limit, {keys[i][1] for i in range(start, end)}, key=self._rank)
+
+    def add(self, equipement_id, nom):
+        """Compter une nouvelle panne (et enregistrer l'équipement s'il est nouveau)"""
+        if equipement_id not in self.noms:
+            # Copie puis remplacement : une recherche en cours garde l'ancienne liste
+            keys = list(self.keys)
+            for entry in _entries(equipement_id, nom):
+                insort(keys, entry)
+            self.noms[equipement_id] = nom
+            self.keys = keys
+        self.scores[equipement_id] = self.scores.get(equipement_id, 0) + 1
+        # Les scores ne font que croître : l'équipement ne peut que monter dans les classements
+        for prefix in {prefix for key, _ in _entries(equipement_id, nom) for prefix in _short_prefixes(key)}:
+            ids = [i for i in self.top.get(prefix, []) if i != equipement_id] + [equipement_id]
+            self.top[prefix] = sorted(ids, key=self._rank)[:LIMIT]
+        self.wide = {}
+
+
+def _entries(equipement_id, nom):
+    """Entrées de l'index : la clé complète puis la clé à partir de chaque mot suivant"""
+    words = equipment_key(nom).split()
+    return [(' '.join(words[i:]), equipement_id) for i in range(len(words))]
+
+
+def _short_prefixes(key):
+    """Préfixes d'une clé jusqu'à SHORT_PREFIX caractères"""
+    return [key[:n] for n in range(1, min(SHORT_PREFIX, len(key)) + 1)]
+
+
+def recent_counts(conn, noms, now=None):
+    """Nombre de pannes de chaque équipement sur les RECENT_DAYS derniers jours"""
+    debut = ((now or datetime.now()) - timedelta(days=RECENT_DAYS)).strftime('%Y-%m-%d')
+    ids = {nom: equipement_id for equipement_id, nom in noms}
+    scores = {}
+    for row in conn.execute(
+        '''SELECT cle, total FROM pannes_rollup
+           WHERE granularite = 'jour' AND dimension = 'equipement' AND periode >= ?''',
+        (debut,)
+    ):
+        equipement_id = ids.get(row[0])
+        if equipement_id is not None:
+            scores[equipement_id] = scores.get(equipement_id, 0) + row[1]
+    return scores
+
+
+def build(conn):
+    """Construire l'index à partir du registre et des agrégats par jour (dans une même transaction de lecture)"""
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute('BEGIN')
+    try:
+        # Dernière panne prise en compte : les enregistrements reçus pendant la construction en partent
+        last_panne_id = conn.execute('SELECT MAX(id) FROM pannes').fetchone()[0] or 0
+        # Lecture complète voulue : tout le registre entre dans l'index
+        noms = [tuple(row) for row in conn.execute('SELECT id, nom FROM equipements')]
+        scores = recent_counts(conn, noms)
+    finally:
+        if not in_transaction:
+            conn.rollback()
+    stats['constructions'] += 1
+    return PrefixIndex(noms, scores, last_panne_id)
+
+
+def _rebuild(conn):
+    """Construire un nouvel index et le substituer à l'ancien avec les pannes enregistrées entre-temps.
+
+    Une construction commencée avant un invalidate() est retournée mais pas installée.
+    """
+    global _index, _pending
+    with _lock:
+        _pending = []
+        generation = _generation
+    try:
+        fresh = build(conn)
+    except Exception:
+        with _lock:
+            _pending = None
+        raise
+    with _lock:
+        for panne_id, equipement_id, nom in _pending:
+            # Une panne antérieure à la lecture est déjà comptée dans les agrégats
+            if panne_id > fresh.last_panne_id:
+                fresh.add(equipement_id, nom)
+        _pending = None
+        if generation == _generation:
+            _index = fresh
+    return fresh
+
+
+def _rebuild_in_background(database_path):
+    try:
+        conn = database.open_connection(database_path, readonly=True)
+        try:
+            _rebuild(conn)
+        finally:
+            conn.close()
+    finally:
+        _build_lock.release()
+
+
+def _current(conn):
+    """Index courant : construit au premier appel, puis reconstruit en arrière-plan s'il est trop ancien"""
+    index = _index
+    if index is None:
+        with _build_lock:
+            index = _index
+            if index is None:
+                index = _rebuild(conn)
+        return index
+    # Une seule reconstruction à la fois ; la requête qui la déclenche n'attend pas
+    if time.monotonic() - index.built_at > REFRESH_SECONDS and _build_lock.acquire(blocking=False):
+        try:
+            database_path = conn.execute('PRAGMA database_list').fetchone()[2]
+            threading.Thread(target=_rebuild_in_background, args=(database_path,), daemon=True).start()
+        except Exception:
+            _build_lock.release()
+            raise
+    return index
+
+
+def suggest(conn, prefix, limit=LIMIT):
+    """Suggestions [{id, nom, pannes_recentes}] pour un début de nom d'équipement"""
+    index = _current(conn)
+    stats['recherches'] += 1
+    return [{'id': equipement_id, 'nom': index.noms[equipement_id],
+             'pannes_recentes': index.scores.get(equipement_id, 0)}
+            for equipement_id in index.search(prefix, limit)]
+
+
+def record(panne_id, equipement_id, nom):
+    """Prendre en compte une panne ajoutée par ce processus"""
+    with _lock:
+        if _index is not None:
+            _index.add(equipement_id, nom)
+        if _pending is not None:
+            _pending.append((panne_id, equipement_id, nom))
+
+
+def invalidate():
+    """Forcer la reconstruction au prochain appel (après un import en masse)"""
+    global _index, _generation
+    with _lock:
+        _index = None
+        _generation += 1
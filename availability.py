@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Disponibilité des équipements : chaque panne rend son équipement indisponible
+# tant qu'elle est dans un état ouvert ("En attente", "En cours"), d'après le
+# journal panne_events. Les intervalles d'arrêt d'un équipement sont fusionnés
+# (tri puis balayage) avant d'être mesurés sur la fenêtre demandée.
+# Les résultats sont mis en cache par (équipement, fenêtre) et invalidés par le
+# numéro de version de l'équipement (table pannes_equipement_version, par
+# equipement_id, incrémenté par triggers à chaque écriture sur l'une de ses pannes). Pour tout le parc,
+# les événements des équipements absents du cache sont lus en une seule requête.
+
+OPEN_STATES = ('En attente', 'En cours')
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+WINDOW_DAYS = 30        # Fenêtre par défaut : les 30 derniers jours complets
+CACHE_SIZE = 4096       # Résultats (équipement, fenêtre) conservés par processus
+
+stats = {'hits': 0, 'misses': 0}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def default_window(now=None):
+    """Fenêtre [minuit il y a WINDOW_DAYS jours, minuit aujourd'hui[ (heure locale)"""
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=WINDOW_DAYS), today
+
+
+def merge_intervals(intervals):
+    """Fusionner des intervalles (début, fin) qui se chevauchent ou se touchent"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def downtime_seconds(intervals, start, end):
+    """Durée d'arrêt (secondes) dans [start, end[ d'intervalles déjà fusionnés"""
+    total = 0.0
+    for down_start, down_end in intervals:
+        if down_end <= start or down_start >= end:
+            continue
+        total += (min(down_end, end) - max(down_start, start)).total_seconds()
+    return total
+
+
+def panne_intervals(events, until):
+    """Intervalles d'arrêt d'après les événements (panne_id, id, etat, date) d'un équipement.
+
+    Une panne encore ouverte à son dernier événement compte jusqu'à ``until``.
+    """
+    intervals = []
+    down_since = {}
+    for panne_id, event_id, etat, date in sorted(events):
+        when = datetime.strptime(date, DATE_FORMAT)
+        if etat in OPEN_STATES:
+            down_since.setdefault(panne_id, when)
+        elif panne_id in down_since:
+            intervals.append((down_since.pop(panne_id), when))
+    for since in down_since.values():
+        intervals.append((since, max(since, until)))
+    return intervals
+
+
+def load_events(conn, equipement, end):
+    """Événements des pannes d'un équipement déclarées avant la fin de la fenêtre"""
+    return [tuple(row) for row in conn.execute(
+        '''SELECT e.panne_id, e.id, e.etat_apres, e.date_evenement
+           FROM pannes p JOIN panne_events e ON e.panne_id = p.id
+           WHERE p.equipement = ? AND p.date_creation < ?''',
+        (equipement, end.strftime(DATE_FORMAT))
+    )]
+
+
+def load_window_events(conn, start, end):
+    """Événements des pannes pouvant peser sur la fenêtre, groupés par équipement.
+
+    Une panne fermée avant le début de la fenêtre (aucun événement depuis) n'y
+    compte pas : seules les pannes encore ouvertes ou modifiées depuis ``start`` sont lues.
+    """
+    events = {}
+    for row in conn.execute(
+        f'''SELECT p.equipement, e.panne_id, e.id, e.etat_apres, e.date_evenement
+           FROM pannes p JOIN panne_events e ON e.panne_id = p.id
+           WHERE p.date_creation < ? AND p.id IN (
+               SELECT id FROM pannes WHERE etat IN ({', '.join('?' * len(OPEN_STATES))})
+               UNION ALL SELECT panne_id FROM panne_events WHERE date_evenement >= ?)''',
+        (end.strftime(DATE_FORMAT), *OPEN_STATES, start.strftime(DATE_FORMAT))
+    ):
+        events.setdefault(row[0], []).append(tuple(row[1:]))
+    return events
+
+
+def equipment_versions(conn, noms=None):
+    """Version courante de chaque équipement du registre (ou des seuls ``noms``) ayant au moins une panne"""
+    if noms is not None:
+        return {row[0]: row[1] for row in conn.execute(
+            f'''SELECT e.nom, v.version FROM equipements e
+               JOIN pannes_equipement_version v ON v.equipement_id = e.id
+               WHERE e.nom IN ({', '.join('?' * len(noms))})''',
+            list(noms)
+        )}
+    # Lecture complète voulue : tout le parc
+    return {row[0]: row[1] for row in conn.execute(
+        '''SELECT e.nom, v.version FROM pannes_equipement_version v
+           JOIN equipements e ON e.id = v.equipement_id'''
+    )}
+
+
+def _cached(key, version):
+    """Résultat en cache pour cette version de l'équipement, ou None"""
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == version:
+            _cache.move_to_end(key)
+            stats['hits'] += 1
+            return entry[1]
+        stats['misses'] += 1
+    return None
+
+
+def _store(key, version, result):
+    with _lock:
+        _cache[key] = (version, result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _measure(equipement, events, start, end):
+    """Disponibilité d'un équipement sur [start, end[ d'après ses événements"""
+    intervals = merge_intervals(panne_intervals(events, end))
+    arret = downtime_seconds(intervals, start, end)
+    window = (end - start).total_seconds()
+    return {
+        'equipement': equipement,
+        'disponibilite': 100.0 * (1 - arret / window) if window > 0 else 100.0,
+        'arret': arret,
+        'arrets': sum(1 for down_start, down_end in intervals if down_end > start and down_start < end),
+    }
+
+
+def equipment_availability(conn, equipement, start, end, version=None):
+    """Disponibilité d'un équipement sur [start, end[ : pourcentage et secondes d'arrêt"""
+    cacheable = version is not None and end <= datetime.now()
+    key = (equipement, start, end)
+    if cacheable:
+        result = _cached(key, version)
+        if result is not None:
+            return result
+
+    result = _measure(equipement, load_events(conn, equipement, end), start, end)
+    if cacheable:
+        _store(key, version, result)
+    return result
+
+
+def fleet_availability(conn, start=None, end=None, noms=None):
+    """Disponibilité de tous les équipements (ou des seuls ``noms``) sur une fenêtre, du moins disponible au plus disponible"""
+    if start is None or end is None:
+        start, end = default_window()
+    cacheable = end <= datetime.now()
+    versions = equipment_versions(conn, noms)
+    results = []
+    missing = {}
+    for equipement, version in versions.items():
+        result = _cached((equipement, start, end), version) if cacheable else None
+        if result is None:
+            missing[equipement] = version
+        else:
+            results.append(result)
+
+    if missing:
+        # Un seul équipement : ses événements suffisent
+        if len(missing) == 1:
+            equipement = next(iter(missing))
+            events = {equipement: load_events(conn, equipement, end)}
+        else:
+            events = load_window_events(conn, start, end)
+        for equipement, version in missing.items():
+            result = _measure(equipement, events.get(equipement, []), start, end)
+            if cacheable:
+                _store((equipement, start, end), version, result)
+            results.append(result)
+
+    results.sort(key=lambda r: (r['disponibilite'], r['equipement']))
+    return results
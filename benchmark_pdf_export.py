@@ -0,0 +1,68 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from app1 import create_pdf_export, calculate_stats
+from init_db import ETATS, PRIORITES
+
+# Mesure du temps de génération de l'historique PDF selon le nombre de pannes :
+# tableau découpé en blocs (par défaut) contre un tableau unique (ancien rendu)
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Le découpage d'un tableau unique recopie les lignes restantes à chaque page
+# (coût quadratique) : il n'est mesuré que jusqu'à cette taille
+SINGLE_TABLE_MAX_ROWS = 10000
+
+
+def generate_pannes(count):
+    """Pannes fictives triées par date décroissante, comme la requête de l'export"""
+    start = datetime(2024, 12, 31, 18, 0, 0)
+    pannes = []
+    for i in range(count):
+        pannes.append({
+            'id': count - i,
+            'equipement': f"Équipement {i % 250:03d} - Station {i % 17}",
+            'priorite': PRIORITES[i % len(PRIORITES)],
+            'etat': ETATS[i % len(ETATS)],
+            'date_creation': (start - timedelta(hours=i * 3)).strftime('%Y-%m-%d %H:%M:%S'),
+            'username': 'admin' if i % 3 else 'technicien',
+        })
+    return pannes
+
+
+def measure(pannes, stats, **options):
+    """Générer le PDF et retourner (durée en secondes, taille en octets)"""
+    start = time.perf_counter()
+    buffer = create_pdf_export(pannes, stats=stats, **options)
+    return time.perf_counter() - start, buffer.getbuffer().nbytes
+
+
+def benchmark(sizes, by_month=False):
+    """Comparer les deux rendus pour chaque taille"""
+    print("⏱️ Génération de l'historique PDF\n")
+
+    for count in sizes:
+        pannes = generate_pannes(count)
+        stats = calculate_stats(pannes)
+
+        duration, size = measure(pannes, stats, by_month=by_month)
+        print(f"   📄 {count:>7} pannes, blocs        : {duration:7.2f} s  "
+              f"({duration / count * 1000:.3f} ms/ligne, {size / 1024:.0f} Ko)")
+
+        if count <= SINGLE_TABLE_MAX_ROWS:
+            duration, size = measure(pannes, stats, by_month=by_month, chunk_rows=count)
+            print(f"   📄 {count:>7} pannes, tableau unique: {duration:7.2f} s  "
+                  f"({duration / count * 1000:.3f} ms/ligne, {size / 1024:.0f} Ko)")
+        else:
+            print(f"   ⏭️ {count:>7} pannes, tableau unique: ignoré (> {SINGLE_TABLE_MAX_ROWS} lignes)")
+        print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesurer la génération de l'historique PDF")
+    parser.add_argument('tailles', nargs='*', type=int, default=DEFAULT_SIZES,
+                        help="nombres de pannes à générer (défaut : 1000 10000 100000)")
+    parser.add_argument('--par-mois', action='store_true', help="intertitre par mois")
+    args = parser.parse_args()
+    benchmark(args.tailles, by_month=args.par_mois)
@@ -0,0 +1,252 @@
+import ast
+import os
+import re
+import sqlite3
+import sys
+
+from init_db import create_tables, create_schema_objects
+
+# Fichiers dont les requêtes SQL sont vérifiées
+SOURCES = ['app1.py', 'autocomplete.py', 'availability.py', 'duplicates.py']
+
+# Un "SCAN <table>", avec ou sans index, parcourt toute la table (ou tout l'index) ;
+# "USE TEMP B-TREE" signale un tri ou un regroupement fait en mémoire
+FULL_SCAN = re.compile(r'^SCAN (\w+)\b')
+TEMP_BTREE = 'USE TEMP B-TREE'
+
+# Table virtuelle FTS5 interrogée par MATCH (« M » dans idxStr) : recherche dans l'index plein texte
+FTS_MATCH = re.compile(r'VIRTUAL TABLE INDEX \d+:\S*M')
+
+# Tables d'au plus quelques lignes (une par état et priorité) : un parcours complet y est attendu
+SMALL_TABLES = {'pannes_stats'}
+
+# Page sans filtre (pas de WHERE, LIMIT final) : l'index du tri est lu dans l'ordre
+# et la lecture s'arrête après la page
+FIRST_PAGE = re.compile(r'\bLIMIT\s+(\?|\d+)\s*$')
+
+# Commentaire placé juste au-dessus d'un execute() dont la lecture complète est voulue
+# (tout le registre, tous les utilisateurs...) : le parcours est alors accepté
+FULL_READ_MARKER = 'Lecture complète voulue'
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+
+class _NullParams(dict):
+    """Paramètres nommés : toute clé vaut NULL"""
+    def __missing__(self, key):
+        return None
+
+
+def extract_queries(path):
+    """Extraire les chaînes SQL passées à execute()/executemany() dans un fichier.
+
+    Retourne des couples (ligne, SQL, lecture complète voulue ?).
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        source = f.read()
+    tree = ast.parse(source, filename=path)
+    lines = source.splitlines()
+
+    queries = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr not in ('execute', 'executemany') or not node.args:
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and SQL_START.match(arg.value):
+            full_read = node.lineno > 1 and FULL_READ_MARKER in lines[node.lineno - 2]
+            queries.append((node.lineno, arg.value, full_read))
+    return sorted(queries)
+
+
+def explain(conn, sql, params=None):
+    """Retourner les lignes du plan d'exécution d'une requête"""
+    statement = 'EXPLAIN QUERY PLAN ' + sql
+    if params is not None:
+        rows = conn.execute(statement, params).fetchall()
+    elif re.search(r'[:@$]\w', sql):
+        rows = conn.execute(statement, _NullParams()).fetchall()
+    else:
+        rows = conn.execute(statement, [None] * sql.count('?')).fetchall()
+    return [row[3] for row in rows]
+
+
+# Requêtes construites à l'exécution (filtres, tris, curseurs) : combinaisons représentatives
+DYNAMIC_FILTERS = [
+    ('sans filtre', {}),
+    ('etat', {'etat': ['En cours']}),
+    ('etat multiple', {'etat': ['En attente', 'En cours']}),
+    ('priorite', {'priorite': ['Critique']}),
+    ('equipement', {'equipement': ['Pompe C3']}),
+    ('utilisateur', {'utilisateur': ['1']}),
+    ('periode', {'date_debut': ['2025-01-01'], 'date_fin': ['2025-01-31']}),
+    ('texte', {'q': ['fuite']}),
+    ('etat+equipement', {'etat': ['En cours'], 'equipement': ['Pompe C3']}),
+    ('priorite+periode', {'priorite': ['Critique'], 'date_debut': ['2025-01-01']}),
+]
+
+# Dernière panne fictive d'une page, pour les requêtes de reprise au curseur
+CURSOR_PANNE = {'id': 1, 'date_creation': '2025-01-15 08:00:00', 'equipement': 'Pompe C3',
+                'priorite': 'Élevée', 'etat': 'En cours'}
+
+
+class _RecordingConnection:
+    """Connexion qui note chaque requête exécutée (SQL, paramètres) avant de la transmettre"""
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+        return self._conn.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def schema_connection():
+    """Base vide en mémoire avec le schéma complet (tables, index, triggers)"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    create_tables(conn.cursor())
+    create_schema_objects(conn.cursor())
+    return conn
+
+
+def static_queries(base_dir):
+    """Requêtes écrites en toutes lettres : (libellé, SQL, paramètres, lecture complète voulue ?)"""
+    return [(f"{source}:{line_num}", sql, None, full_read)
+            for source in SOURCES
+            for line_num, sql, full_read in extract_queries(os.path.join(base_dir, source))]
+
+
+def dynamic_queries(conn, known=()):
+    """Requêtes de l'historique, des exports, de l'API et des lots pour chaque combinaison de filtres et de tri.
+
+    Retourne des quadruplets (libellé, SQL, paramètres, lecture complète voulue ?), sans
+    doublon de SQL ni requête déjà présente dans ``known`` (SQL sur une ligne).
+    """
+    # Import tardif : l'application (Flask) n'est nécessaire qu'ici
+    from werkzeug.datastructures import MultiDict
+    import app1
+    import availability
+
+    recorder = _RecordingConnection(conn)
+    queries = {}
+
+    def collect(label, full_read=False):
+        for sql, params in recorder.statements:
+            one_line = ' '.join(sql.split())
+            if one_line not in known:
+                queries.setdefault(one_line, (label, sql, params, full_read))
+        recorder.statements = []
+
+    for name, filtres in DYNAMIC_FILTERS:
+        args = MultiDict([(key, value) for key, values in filtres.items() for value in values])
+        clauses, params = app1.build_pannes_clauses(args, recorder)
+        app1.get_history_stats(recorder, clauses, params, args.get('equipement', ''))
+        collect(f'statistiques [{name}]')
+        for tri in app1.HISTORIQUE_TRIS:
+            for descending in (True, False):
+                label = f"[{name}, tri={tri} {'desc' if descending else 'asc'}]"
+                app1.fetch_pannes_page(recorder, clauses, params, tri, descending)
+                cursor = app1.encode_history_cursor(CURSOR_PANNE, tri)
+                app1.fetch_pannes_page(recorder, clauses, params, tri, descending, cursor)
+                collect(f'historique {label}')
+                list(app1.query_export_rows(recorder, list(app1.EXPORT_COLUMNS), clauses, params, tri, descending))
+                # Export sans filtre : tout l'historique, lu par l'index du tri
+                collect(f'export {label}', full_read=not clauses)
+        app1.fetch_api_pannes_page(recorder, list(app1.EXPORT_COLUMNS), clauses, params)
+        app1.fetch_api_pannes_page(recorder, list(app1.EXPORT_COLUMNS), clauses, params,
+                                   app1.encode_cursor(CURSOR_PANNE))
+        collect(f'API [{name}]')
+        try:
+            app1.select_bulk_pannes(recorder, args)
+        except ValueError:
+            pass  # Lot sans filtre refusé
+        app1.select_bulk_pannes(recorder, MultiDict(list(args.items(multi=True)) + [('ids', '1,2,3')]))
+        collect(f'lot [{name}]')
+
+    start, end = availability.default_window()
+    availability.load_window_events(recorder, start, end)
+    availability.equipment_versions(recorder, ['Pompe C3'])
+    collect('disponibilité du parc')
+    return list(queries.values())
+
+
+def collect_queries(conn, base_dir=None):
+    """Toutes les requêtes vérifiées : écrites en toutes lettres, puis construites à l'exécution"""
+    queries = static_queries(base_dir or os.path.dirname(os.path.abspath(__file__)))
+    known = {' '.join(sql.split()) for _, sql, _, _ in queries}
+    return queries + dynamic_queries(conn, known)
+
+
+def plan_problems(sql, plan, full_read=False):
+    """Parcours complets et tris temporaires d'un plan d'exécution.
+
+    Un tri en mémoire n'est accepté que sur des lignes déjà restreintes par un index (SEARCH).
+    """
+    first_page = FIRST_PAGE.search(sql) and not re.search(r'\bWHERE\b', sql, re.IGNORECASE)
+    problems = []
+    scanned = False
+    for detail in plan:
+        scan = FULL_SCAN.match(detail)
+        if scan and scan.group(1) not in SMALL_TABLES and not FTS_MATCH.search(detail):
+            scanned = True
+            if not (full_read or first_page):
+                problems.append(f"parcours complet ({detail})")
+    if scanned:
+        problems.extend(f"tri temporaire ({detail})" for detail in plan if TEMP_BTREE in detail)
+    return problems
+
+
+def check_query(conn, label, sql, params=None, full_read=False):
+    """Vérifier et afficher le plan d'une requête ; True s'il est correct"""
+    one_line = ' '.join(sql.split())
+    try:
+        plan = explain(conn, sql, params)
+    except sqlite3.Error as e:
+        print(f"   ❌ {label}: requête invalide ({e})")
+        print(f"      SQL: {one_line}")
+        return False
+
+    problems = plan_problems(sql, plan, full_read)
+    if problems:
+        print(f"   ❌ {label}: {', '.join(problems)}")
+        print(f"      SQL: {one_line}")
+        return False
+    print(f"   ✅ {label}: {' | '.join(plan) or 'aucun parcours'}{' (lecture complète voulue)' if full_read else ''}")
+    return True
+
+
+def check_query_plans():
+    """Vérifier qu'aucune requête ne fait de parcours complet ni de tri temporaire (voir aussi tests/test_query_plans.py)"""
+    conn = schema_connection()
+
+    print("🔍 Vérification des plans de requêtes...\n")
+
+    queries_checked = 0
+    errors_found = 0
+
+    for label, sql, params, full_read in collect_queries(conn):
+        queries_checked += 1
+        if not check_query(conn, label, sql, params, full_read):
+            errors_found += 1
+
+    conn.close()
+
+    print(f"\n📊 Résumé:")
+    print(f"   - {queries_checked} requêtes vérifiées")
+    print(f"   - {errors_found} plans incorrects")
+
+    if errors_found == 0:
+        print("\n✅ Toutes les requêtes utilisent un index !")
+    else:
+        print(f"\n⚠️ {errors_found} requête(s) à corriger")
+
+    return errors_found == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_query_plans() else 1)
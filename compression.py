@@ -0,0 +1,91 @@
+import zlib
+
+from flask import current_app, request
+
+# Compression gzip négociée des réponses texte (HTML, JSON, CSV, NDJSON...).
+# Appliquée après la vue : les réponses en mémoire sont compressées d'un bloc
+# au-delà d'un seuil de taille, les réponses en flux bloc par bloc sans les
+# mettre en mémoire. Les fichiers déjà compressés (xlsx, png, pdf, gzip) et
+# ceux servis par send_file (requêtes Range) ne sont pas touchés.
+
+MIN_SIZE = 500          # En dessous (octets), le gain ne couvre pas l'en-tête gzip
+LEVEL = 6               # Niveau de compression zlib (1 rapide - 9 compact)
+
+COMPRESSIBLE_TYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+    'image/svg+xml',
+}
+
+
+def gzip_chunks(chunks, level=LEVEL):
+    """Compresser un flux de blocs au format gzip au fil de l'eau"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def skip(response):
+    """Exclure une réponse de la compression (contenu déjà compressé)"""
+    response.compress = False
+    return response
+
+
+def _compressible(response):
+    """La réponse est-elle un contenu texte que l'on peut compresser ?"""
+    if not getattr(response, 'compress', True):
+        return False
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return False
+    # send_file (fichier sur disque, requêtes Range) ou réponse déjà encodée
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    return response.status_code == 200 and request.method != 'HEAD'
+
+
+def compress_response(response):
+    """Compresser la réponse en gzip si le client l'accepte (hook after_request)"""
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+
+    level = current_app.config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        # Flux (exports CSV/NDJSON) : compressé au fil de l'eau, longueur inconnue
+        response.response = gzip_chunks(response.response, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        compressed = b''.join(gzip_chunks([data], level))
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = 'gzip'
+    # Le contenu envoyé diffère octet par octet de la version non compressée
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Brancher la compression sur l'application Flask"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', MIN_SIZE)
+    app.config.setdefault('COMPRESS_LEVEL', LEVEL)
+    app.after_request(compress_response)
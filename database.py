@@ -0,0 +1,198 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+
+from init_db import upgrade_database
+
+# Réglages SQLite appliqués à chaque nouvelle connexion
+PRAGMAS = {
+    'busy_timeout': 5000,          # Attendre 5 s un verrou au lieu d'échouer
+    'cache_size': -16000,          # ~16 Mo de cache de pages par connexion
+    'mmap_size': 128 * 1024 * 1024,  # Lecture du fichier via mmap (128 Mo)
+    'temp_store': 'MEMORY',
+}
+
+# Taille du cache de requêtes préparées par connexion (128 par défaut en Python)
+CACHED_STATEMENTS = 256
+
+POOL_SIZE = 8           # Connexions inactives conservées par pool
+POOL_TIMEOUT = 10.0     # Attente maximale (s) quand toutes les connexions sont prises
+
+
+def _configure_connection(conn, readonly):
+    """Appliquer les pragmas de performance sur une connexion neuve"""
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    else:
+        # WAL : les lecteurs ne sont plus bloqués par l'écrivain
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def open_connection(database, readonly=False):
+    """Ouvrir une connexion configurée, hors pool (scripts, tâches de fond)"""
+    if readonly:
+        uri = 'file:' + os.path.abspath(database) + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS)
+    else:
+        conn = sqlite3.connect(database, check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS)
+    return _configure_connection(conn, readonly)
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite partagé par les threads d'un processus"""
+
+    def __init__(self, database, readonly=False, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.readonly = readonly
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._pid = os.getpid()
+        self.stats = {'hits': 0, 'created': 0, 'waits': 0, 'wait_time': 0.0, 'discarded': 0}
+
+    def _check_fork(self):
+        # Un processus fils (gunicorn, multiprocessing) ne doit pas réutiliser
+        # les connexions héritées du parent
+        if self._pid != os.getpid():
+            with self._lock:
+                self._idle = queue.LifoQueue()
+                self._opened = 0
+                self._pid = os.getpid()
+
+    def acquire(self):
+        """Prendre une connexion inactive, en créer une ou attendre qu'une se libère"""
+        self._check_fork()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.stats['hits'] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            try:
+                conn = open_connection(self.database, self.readonly)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+            with self._lock:
+                self.stats['created'] += 1
+            return conn
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError('Pool de connexions épuisé')
+        with self._lock:
+            self.stats['waits'] += 1
+            self.stats['wait_time'] += time.perf_counter() - start
+        return conn
+
+    def release(self, conn):
+        """Remettre une connexion dans le pool après avoir annulé toute transaction ouverte"""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+                self.stats['discarded'] += 1
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Fermer toutes les connexions inactives"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_upgraded = set()
+
+
+def get_pool(database, readonly=False):
+    """Retourner le pool (lecture ou écriture) associé à une base"""
+    key = (os.path.abspath(database), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # Première connexion à cette base : appliquer les migrations
+                if key[0] not in _upgraded:
+                    upgrade_database(database)
+                    _upgraded.add(key[0])
+                pool = ConnectionPool(database, readonly=readonly)
+                _pools[key] = pool
+    return pool
+
+
+def get_db(readonly=None):
+    """Connexion de la requête courante, rendue au pool à la fin du contexte applicatif.
+
+    Par défaut les requêtes GET/HEAD reçoivent une connexion en lecture seule.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+
+    attr = '_db_ro' if readonly else '_db_rw'
+    conn = getattr(g, attr, None)
+    if conn is None:
+        conn = get_pool(current_app.config['DATABASE'], readonly).acquire()
+        setattr(g, attr, conn)
+    return conn
+
+
+def close_db(exception=None):
+    """Rendre au pool les connexions empruntées pendant le contexte"""
+    database = current_app.config['DATABASE']
+    for attr, readonly in (('_db_ro', True), ('_db_rw', False)):
+        conn = g.pop(attr, None)
+        if conn is not None:
+            get_pool(database, readonly).release(conn)
+
+
+def pool_stats():
+    """Compteurs des pools (réutilisations, créations, attentes)"""
+    result = {}
+    for (path, readonly), pool in _pools.items():
+        name = f"{os.path.basename(path)}:{'lecture' if readonly else 'ecriture'}"
+        result[name] = dict(pool.stats, ouvertes=pool._opened, inactives=pool._idle.qsize())
+    return result
+
+
+def init_app(app):
+    """Brancher la gestion des connexions sur l'application Flask"""
+    app.config.setdefault('DATABASE', 'gmao.db')
+    app.teardown_appcontext(close_db)
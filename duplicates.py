@@ -0,0 +1,234 @@
+import heapq
+import threading
+import time
+
+import database
+from init_db import equipment_key
+
+# Détection des doublons à la saisie : index en mémoire des pannes ouvertes
+# ("En attente", "En cours"), chacune réduite à l'ensemble des trigrammes de
+# sa description normalisée (sans accents, minuscules, ponctuation retirée).
+# Une saisie est comparée (indice de Jaccard) aux pannes ouvertes du même
+# équipement ou d'un équipement au nom proche ; sans équipement, les candidats
+# sont trouvés par l'index inversé trigramme -> pannes. L'index est construit
+# au premier appel, tenu à jour par les écritures de ce processus et
+# reconstruit périodiquement en arrière-plan pour suivre les autres processus
+# et les imports : pendant la reconstruction, les recherches utilisent l'index
+# en place. Une écriture modifie l'index en place sous verrou (seulement les
+# ensembles de ses trigrammes) ; les recherches ne prennent aucun verrou : elles
+# ne lisent les ensembles que par des opérations C atomiques sous le GIL
+# (union, copie) et ignorent une panne retirée entre-temps.
+
+OPEN_STATES = ('En attente', 'En cours')
+
+DESCRIPTION_THRESHOLD = 0.3   # Similarité minimale des descriptions pour signaler un doublon
+EQUIPMENT_THRESHOLD = 0.5     # Similarité minimale de deux noms d'équipements « proches »
+REFRESH_SECONDS = 60          # Âge maximal de l'index avant reconstruction
+LIMIT = 5                     # Nombre maximal de pannes proposées
+EXCERPT_LENGTH = 120          # Longueur de l'extrait de description renvoyé
+
+stats = {'constructions': 0, 'recherches': 0}
+
+_index = None
+_pending = None         # Écritures reçues pendant une construction (None : aucune en cours)
+_generation = 0         # Incrémenté par invalidate() : une construction commencée avant est écartée
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def trigrams(text):
+    """Trigrammes des mots d'un texte normalisé (mots bordés d'espaces, comme pg_trgm)"""
+    key = equipment_key(text) if str(text).strip() else ''
+    result = set()
+    for word in key.split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(result)
+
+
+def similarity(a, b):
+    """Indice de Jaccard de deux ensembles de trigrammes"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class OpenPannesIndex:
+    """Pannes ouvertes indexées par équipement et par trigramme de description"""
+
+    def __init__(self, pannes):
+        self.pannes = {}            # id -> (clé équipement, trigrammes, résumé)
+        self.by_equipement = {}     # clé équipement -> ids des pannes ouvertes
+        self.equipements = {}       # clé équipement -> trigrammes du nom
+        self.postings = {}          # trigramme -> ids des pannes ouvertes
+        for panne in pannes:
+            entry = _entry(panne['id'], panne['equipement'], panne['description'], panne['etat'],
+                           panne['date_creation'])
+            cle, grams, _ = entry
+            self.pannes[panne['id']] = entry
+            self.by_equipement.setdefault(cle, set()).add(panne['id'])
+            self.equipements.setdefault(cle, trigrams(cle))
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(panne['id'])
+        self.built_at = time.monotonic()
+
+    def add(self, panne_id, equipement, description, etat, date_creation=None):
+        """Ajouter ou mettre à jour une panne (retirée si elle n'est plus ouverte)"""
+        previous = self.remove(panne_id)
+        if etat not in OPEN_STATES:
+            return
+        if date_creation is None and previous:
+            date_creation = previous[2]['date_creation']
+        entry = _entry(panne_id, equipement, description, etat, date_creation)
+        cle, grams, _ = entry
+        self.pannes[panne_id] = entry
+        self.by_equipement.setdefault(cle, set()).add(panne_id)
+        self.equipements.setdefault(cle, trigrams(cle))
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(panne_id)
+
+    def remove(self, panne_id):
+        """Retirer une panne de l'index ; retourne son entrée précédente"""
+        entry = self.pannes.pop(panne_id, None)
+        if entry:
+            cle, grams, _ = entry
+            self.by_equipement[cle].discard(panne_id)
+            if not self.by_equipement[cle]:
+                del self.by_equipement[cle], self.equipements[cle]
+            for gram in grams:
+                self.postings[gram].discard(panne_id)
+                if not self.postings[gram]:
+                    del self.postings[gram]
+        return entry
+
+    def similar_equipements(self, equipement):
+        """Clés des équipements ayant des pannes ouvertes : le même ou un nom proche"""
+        cle = equipment_key(equipement)
+        grams = trigrams(cle)
+        # list() : une écriture concurrente peut ajouter ou retirer un équipement
+        return [other for other, other_grams in list(self.equipements.items())
+                if other == cle or similarity(grams, other_grams) >= EQUIPMENT_THRESHOLD]
+
+    def search(self, equipement, description, exclude=None, limit=LIMIT):
+        """Pannes ouvertes dont la description ressemble à la saisie, les plus proches d'abord"""
+        grams = trigrams(description)
+        if not grams:
+            return []
+        if equipement.strip():
+            candidates = set().union(*[self.by_equipement.get(cle, ()) for cle in self.similar_equipements(equipement)])
+        else:
+            candidates = set().union(*[self.postings.get(gram, ()) for gram in grams])
+        candidates.discard(exclude)
+
+        scored = []
+        for panne_id in candidates:
+            # Une panne fermée entre-temps par une écriture concurrente est ignorée
+            entry = self.pannes.get(panne_id)
+            if entry:
+                score = similarity(grams, entry[1])
+                if score >= DESCRIPTION_THRESHOLD:
+                    scored.append((score, panne_id, entry[2]))
+        return [dict(summary, score=round(score, 2))
+                for score, panne_id, summary in heapq.nlargest(limit, scored, key=lambda item: item[:2])]
+
+
+def _entry(panne_id, equipement, description, etat, date_creation):
+    """Entrée de l'index d'une panne : clé de l'équipement, trigrammes et résumé renvoyé"""
+    return (equipment_key(equipement), trigrams(description), {
+        'id': panne_id,
+        'equipement': equipement,
+        'description': description[:EXCERPT_LENGTH],
+        'etat': etat,
+        'date_creation': date_creation,
+    })
+
+
+def build(conn):
+    """Construire l'index à partir des pannes ouvertes"""
+    pannes = conn.execute(
+        'SELECT id, equipement, description, etat, date_creation FROM pannes WHERE etat IN (?, ?)',
+        OPEN_STATES
+    ).fetchall()
+    stats['constructions'] += 1
+    return OpenPannesIndex(pannes)
+
+
+def _rebuild(conn):
+    """Construire un nouvel index et le publier avec les écritures reçues entre-temps.
+
+    Une construction commencée avant un invalidate() est retournée mais pas publiée.
+    """
+    global _index, _pending
+    with _lock:
+        _pending = []
+        generation = _generation
+    try:
+        fresh = build(conn)
+    except Exception:
+        with _lock:
+            _pending = None
+        raise
+    with _lock:
+        # Rejouer une écriture déjà lue par build() ne change rien
+        for args in _pending:
+            fresh.add(*args)
+        _pending = None
+        if generation == _generation:
+            _index = fresh
+    return fresh
+
+
+def _rebuild_in_background(database_path):
+    try:
+        conn = database.open_connection(database_path, readonly=True)
+        try:
+            _rebuild(conn)
+        finally:
+            conn.close()
+    finally:
+        _build_lock.release()
+
+
+def _current(conn):
+    """Index courant : construit au premier appel, puis reconstruit en arrière-plan s'il est trop ancien"""
+    index = _index
+    if index is None:
+        with _build_lock:
+            index = _index
+            if index is None:
+                index = _rebuild(conn)
+        return index
+    # Une seule reconstruction à la fois ; la requête qui la déclenche n'attend pas
+    if time.monotonic() - index.built_at > REFRESH_SECONDS and _build_lock.acquire(blocking=False):
+        try:
+            database_path = conn.execute('PRAGMA database_list').fetchone()[2]
+            threading.Thread(target=_rebuild_in_background, args=(database_path,), daemon=True).start()
+        except Exception:
+            _build_lock.release()
+            raise
+    return index
+
+
+def find(conn, equipement, description, exclude=None, limit=LIMIT):
+    """Doublons possibles d'une panne en cours de saisie"""
+    index = _current(conn)
+    stats['recherches'] += 1
+    return index.search(equipement, description, exclude, limit)
+
+
+def record(panne_id, equipement, description, etat, date_creation=None):
+    """Prendre en compte une panne créée ou modifiée par ce processus"""
+    with _lock:
+        if _index is not None:
+            _index.add(panne_id, equipement, description, etat, date_creation)
+        if _pending is not None:
+            _pending.append((panne_id, equipement, description, etat, date_creation))
+
+
+def invalidate():
+    """Forcer la reconstruction au prochain appel (après un import en masse)"""
+    global _index, _generation
+    with _lock:
+        _index = None
+        _generation += 1
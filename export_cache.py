@@ -0,0 +1,115 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Cache disque des fichiers d'export (Excel / PDF). La clé combine le jeton de
+# version des données et les paramètres de l'export : tant que rien ne change,
+# le même fichier est resservi. Éviction LRU dès que la taille totale dépasse
+# la limite : la date de dernier accès (atime) est positionnée explicitement à
+# chaque lecture, la date de modification reste celle de la génération (elle
+# sert de Last-Modified pour les reprises de téléchargement).
+
+MAX_BYTES = 200 * 1024 * 1024
+
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def make_key(*parts):
+    """Clé de cache à partir des paramètres de l'export"""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _entry_path(cache_dir, key, extension):
+    return os.path.join(cache_dir, f"{key}{extension}")
+
+
+def _count(name):
+    with _lock:
+        stats[name] += 1
+
+
+def lookup(cache_dir, key, extension):
+    """Chemin du fichier en cache, ou None. Un accès le marque comme récemment utilisé"""
+    path = _entry_path(cache_dir, key, extension)
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        _count('misses')
+        return None
+    _count('hits')
+    return path
+
+
+def temporary_path(cache_dir, extension):
+    """Chemin temporaire dans le dossier du cache, à remplir puis valider avec commit()"""
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{uuid.uuid4().hex}{extension}.tmp")
+
+
+def commit(cache_dir, tmp_path, key, extension, max_bytes=MAX_BYTES):
+    """Publier un fichier temporaire sous sa clé (remplacement atomique) puis appliquer la limite de taille"""
+    path = _entry_path(cache_dir, key, extension)
+    os.replace(tmp_path, path)
+    _count('stores')
+    evict(cache_dir, max_bytes, keep=path)
+    return path
+
+
+def store(cache_dir, key, extension, source_path, max_bytes=MAX_BYTES):
+    """Ajouter au cache une copie d'un fichier existant (lien dur si possible)"""
+    tmp_path = temporary_path(cache_dir, extension)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        shutil.copyfile(source_path, tmp_path)
+    return commit(cache_dir, tmp_path, key, extension, max_bytes)
+
+
+def copy_to(path, destination):
+    """Copier un fichier du cache vers un autre emplacement (lien dur si possible)"""
+    try:
+        os.link(path, destination)
+    except OSError:
+        shutil.copyfile(path, destination)
+
+
+def evict(cache_dir, max_bytes=MAX_BYTES, keep=None):
+    """Supprimer les fichiers les moins récemment utilisés jusqu'à repasser sous max_bytes"""
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        entries.append((info.st_atime, info.st_size, path))
+        total += info.st_size
+
+    removed = 0
+    for atime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            # Fichier en cours d'envoi (Windows) : il sera retiré au prochain passage
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        with _lock:
+            stats['evictions'] += removed
+    return removed
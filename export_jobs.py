@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# Exports lancés en arrière-plan dans un pool de processus : la génération
+# (ReportLab / openpyxl, liée au CPU) ne bloque plus les threads web.
+# L'état de chaque tâche est un fichier JSON dans le dossier des résultats,
+# lisible par n'importe quel processus web.
+
+MAX_WORKERS = 2
+JOB_TTL = 3600              # Durée de conservation (s) d'un export terminé
+CLEANUP_INTERVAL = 60       # Nettoyage au plus une fois par minute
+PROGRESS_INTERVAL = 0.5     # Écriture de la progression au plus toutes les 0,5 s
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _executor
+
+
+def _job_path(results_dir, job_id):
+    return os.path.join(results_dir, f"{job_id}.json")
+
+
+def _write_job(results_dir, job):
+    """Écrire l'état d'une tâche de façon atomique"""
+    path = _job_path(results_dir, job['id'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_job(results_dir, job_id):
+    """Lire l'état d'une tâche, None si elle est inconnue ou expirée"""
+    try:
+        uuid.UUID(hex=job_id)
+    except ValueError:
+        return None
+    try:
+        with open(_job_path(results_dir, job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Progress:
+    """Suivi de l'avancement d'une tâche, en nombre de lignes traitées"""
+
+    def __init__(self, results_dir, job):
+        self.results_dir = results_dir
+        self.job = job
+        self._last_write = 0.0
+
+    def update(self, rows=None, total=None, phase=None, force=False):
+        if rows is not None:
+            self.job['rows'] = rows
+        if total is not None:
+            self.job['total'] = total
+        if phase is not None:
+            self.job['phase'] = phase
+        now = time.monotonic()
+        if force or now - self._last_write >= PROGRESS_INTERVAL:
+            _write_job(self.results_dir, self.job)
+            self._last_write = now
+
+    def track(self, rows):
+        """Itérer sur les lignes en mettant à jour le compteur"""
+        count = self.job.get('rows', 0)
+        for row in rows:
+            count += 1
+            if count % 500 == 0:
+                self.update(rows=count)
+            yield row
+        self.update(rows=count, force=True)
+
+
+def _run_job(results_dir, job, builder, args):
+    """Exécuté dans un processus du pool : produire le fichier et mettre à jour l'état"""
+    job['status'] = 'en_cours'
+    job['started'] = time.time()
+    progress = Progress(results_dir, job)
+    progress.update(force=True)
+
+    output_path = os.path.join(results_dir, job['filename'])
+    try:
+        builder(progress, output_path, *args)
+    except Exception as e:
+        traceback.print_exc()
+        job['status'] = 'erreur'
+        job['error'] = str(e)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    else:
+        job['status'] = 'termine'
+        job['size'] = os.path.getsize(output_path)
+    job['finished'] = time.time()
+    progress.update(force=True)
+
+
+def submit_job(results_dir, kind, builder, args=(), download_name=None, mimetype=None, extension=''):
+    """Créer une tâche d'export et la confier au pool de processus.
+
+    ``builder(progress, output_path, *args)`` doit être une fonction de niveau
+    module (sérialisable) qui écrit le fichier dans ``output_path``.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    cleanup_expired(results_dir)
+
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'kind': kind,
+        'status': 'en_attente',
+        'phase': None,
+        'rows': 0,
+        'total': None,
+        'filename': f"{job_id}{extension}",
+        'download_name': download_name or f"{kind}{extension}",
+        'mimetype': mimetype,
+        'created': time.time(),
+        'started': None,
+        'finished': None,
+        'error': None,
+    }
+    _write_job(results_dir, job)
+    _get_executor().submit(_run_job, results_dir, job, builder, args)
+    return job
+
+
+def map_in_pool(func, items, chunksize=1):
+    """Appliquer func à chaque élément dans le pool de processus.
+
+    Les résultats sont rendus dans l'ordre des éléments, au fur et à mesure
+    qu'ils sont prêts ; func doit être une fonction de niveau module.
+    """
+    return _get_executor().map(func, items, chunksize=chunksize)
+
+
+def run_in_pool(func, *args):
+    """Exécuter func(*args) dans le pool de processus et attendre son résultat"""
+    return _get_executor().submit(func, *args).result()
+
+
+def artifact_path(results_dir, job):
+    """Chemin du fichier produit par une tâche terminée"""
+    return os.path.join(results_dir, job['filename'])
+
+
+def cleanup_expired(results_dir, ttl=JOB_TTL, force=False):
+    """Supprimer les tâches (état et fichier) terminées depuis plus de ttl secondes"""
+    global _last_cleanup
+    now = time.time()
+    if not force and now - _last_cleanup < CLEANUP_INTERVAL:
+        return 0
+    _last_cleanup = now
+
+    removed = 0
+    try:
+        names = os.listdir(results_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        job = get_job(results_dir, name[:-5])
+        if job is None:
+            continue
+        reference = job['finished'] or job['created']
+        if now - reference < ttl:
+            continue
+        # Une tâche jamais terminée après le TTL est considérée perdue (processus tué)
+        for path in (artifact_path(results_dir, job), _job_path(results_dir, job['id'])):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        removed += 1
+    return removed
+
+
+def shutdown():
+    """Arrêter le pool de processus"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,280 @@
+import csv
+import io
+import os
+import time
+import unicodedata
+from datetime import date, datetime
+
+import openpyxl
+
+from init_db import ETATS, PRIORITES, get_equipement, restore_insert_triggers, suspend_insert_triggers
+
+# Import en masse de pannes depuis un classeur Excel (.xlsx) ou un fichier CSV.
+# Le fichier est lu au fil de l'eau (openpyxl en lecture seule, lecteur CSV),
+# chaque ligne est validée comme les contraintes CHECK de la table pannes, et
+# les lignes valides sont insérées par executemany dans de grandes transactions.
+# Pendant chaque lot, les triggers d'insertion (compteurs, index plein texte,
+# version) sont remplacés par une mise à jour ensembliste en fin de lot.
+# Chaque équipement est rattaché au registre (table equipements) et prend son nom enregistré.
+# Les lignes rejetées sont listées avec leur numéro et le motif.
+
+BATCH_SIZE = 10000      # Lignes insérées par transaction
+MAX_ERRORS = 1000       # Motifs de rejet conservés dans le rapport (le total reste compté)
+
+EXTENSIONS = ('.xlsx', '.csv')
+SAMPLE_BYTES = 64 * 1024  # Début du CSV lu pour détecter séparateur et encodage
+
+# Colonnes de la table pannes et intitulés acceptés dans la ligne d'en-tête
+# (comparés sans accents, casse ni ponctuation). Les en-têtes de l'export CSV
+# (/export.csv) sont reconnus tels quels.
+COLUMN_ALIASES = {
+    'equipement': ('equipement', 'equipment', 'machine'),
+    'description': ('description', 'probleme', 'description du probleme'),
+    'priorite': ('priorite', 'priority'),
+    'etat': ('etat', 'statut', 'status'),
+    'date_creation': ('date creation', 'date de creation', 'date', 'cree le'),
+    'cause': ('cause', 'cause identifiee'),
+    'solution': ('solution', 'solution appliquee'),
+    'observation': ('observation', 'observations'),
+    'username': ('username', 'utilisateur', 'cree par', 'auteur', 'technicien'),
+}
+
+REQUIRED_COLUMNS = ('equipement', 'description', 'priorite', 'etat', 'date_creation')
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+INSERT_SQL = '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation,
+                cause, solution, observation, user_id, equipement_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+
+def normalize(value):
+    """Texte sans accents, en minuscules, ponctuation remplacée par des espaces"""
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    text = ''.join(c if c.isalnum() else ' ' for c in text.lower())
+    return ' '.join(text.split())
+
+
+_HEADERS = {normalize(alias): column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+_PRIORITES = {normalize(value): value for value in PRIORITES}
+_ETATS = {normalize(value): value for value in ETATS}
+
+
+class ImportFileError(ValueError):
+    """Fichier inexploitable (format, en-tête)"""
+
+
+def map_header(header):
+    """Position de chaque colonne connue dans la ligne d'en-tête"""
+    positions = {}
+    for index, title in enumerate(header):
+        if title is None:
+            continue
+        column = _HEADERS.get(normalize(title))
+        if column and column not in positions:
+            positions[column] = index
+    missing = [c for c in REQUIRED_COLUMNS if c not in positions]
+    if missing:
+        raise ImportFileError(f"Colonnes obligatoires absentes de l'en-tête : {', '.join(missing)}")
+    return positions
+
+
+def parse_date(value):
+    """Date de création au format de la base ('AAAA-MM-JJ HH:MM:SS')"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d 00:00:00')
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(f"date invalide : {text}")
+
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def validate_row(row, positions, users, default_user_id):
+    """Valeurs à insérer pour une ligne, ou ValueError avec le motif du rejet"""
+    def get(column):
+        index = positions.get(column)
+        if index is None or index >= len(row):
+            return None
+        return row[index]
+
+    equipement = _text(get('equipement'))
+    description = _text(get('description'))
+    if not equipement:
+        raise ValueError("équipement manquant")
+    if not description:
+        raise ValueError("description manquante")
+
+    priorite = _PRIORITES.get(normalize(get('priorite') or ''))
+    if priorite is None:
+        raise ValueError(f"priorité invalide : {get('priorite')!r} (attendu : {', '.join(PRIORITES)})")
+    etat = _ETATS.get(normalize(get('etat') or ''))
+    if etat is None:
+        raise ValueError(f"état invalide : {get('etat')!r} (attendu : {', '.join(ETATS)})")
+
+    date_value = get('date_creation')
+    if date_value is None or _text(date_value) is None:
+        raise ValueError("date de création manquante")
+    date_creation = parse_date(date_value)
+
+    username = _text(get('username'))
+    if username:
+        user_id = users.get(username)
+        if user_id is None:
+            raise ValueError(f"utilisateur inconnu : {username}")
+    elif default_user_id is not None:
+        user_id = default_user_id
+    else:
+        raise ValueError("utilisateur manquant")
+
+    return (equipement, description, priorite, etat, date_creation,
+            _text(get('cause')), _text(get('solution')), _text(get('observation')), user_id)
+
+
+def iter_xlsx_rows(source):
+    """Lignes d'un classeur .xlsx (première feuille), lues en mode lecture seule"""
+    try:
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Classeur Excel illisible : {e}")
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def iter_csv_rows(source):
+    """Lignes d'un fichier CSV lues au fil de l'eau.
+
+    Le séparateur (, ; ou tabulation) et l'encodage (UTF-8, sinon Windows-1252
+    comme les CSV enregistrés par Excel) sont détectés sur le début du fichier.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as stream:
+            yield from iter_csv_rows(stream)
+        return
+
+    sample = source.read(SAMPLE_BYTES)
+    source.seek(0)
+    try:
+        sample_text = sample.decode('utf-8-sig')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        if e.start >= len(sample) - 3:
+            # Caractère multi-octets coupé en fin d'échantillon
+            sample_text = sample[:e.start].decode('utf-8-sig')
+            encoding = 'utf-8-sig'
+        else:
+            sample_text = sample.decode('cp1252', errors='replace')
+            encoding = 'cp1252'
+    try:
+        dialect = csv.Sniffer().sniff(sample_text, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    text = io.TextIOWrapper(source, encoding=encoding, errors='replace', newline='')
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        # Ne pas fermer le flux de l'appelant avec l'enveloppe texte
+        text.detach()
+
+
+def iter_rows(source, filename):
+    """Lignes brutes du fichier selon son extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        return iter_xlsx_rows(source)
+    if extension == '.csv':
+        return iter_csv_rows(source)
+    raise ImportFileError(f"Format non pris en charge : {extension or filename} (attendu : {', '.join(EXTENSIONS)})")
+
+
+def import_pannes(conn, source, filename, default_user_id=None, dry_run=False, batch_size=BATCH_SIZE):
+    """Importer les pannes d'un fichier et retourner le rapport.
+
+    ``source`` est un chemin ou un flux binaire ; ``filename`` en donne le
+    format. Les lignes sans utilisateur sont attribuées à ``default_user_id``.
+    Avec ``dry_run``, les lignes sont seulement validées.
+    """
+    start = time.perf_counter()
+    users = {row['username']: row['id'] for row in conn.execute('SELECT id, username FROM users')}
+
+    report = {'fichier': os.path.basename(filename), 'lignes': 0, 'importees': 0,
+              'rejetees': 0, 'erreurs': [], 'verification': dry_run, 'duree': 0.0}
+
+    rows = iter_rows(source, filename)
+    positions = None
+    line_num = 0
+    for header in rows:
+        line_num += 1
+        if any(_text(cell) for cell in header):
+            positions = map_header(header)
+            break
+    if positions is None:
+        raise ImportFileError("Fichier vide : aucune ligne d'en-tête")
+
+    equipements = {}
+    batch = []
+    for row in rows:
+        line_num += 1
+        if not any(_text(cell) for cell in row):
+            continue
+        report['lignes'] += 1
+        try:
+            batch.append(validate_row(row, positions, users, default_user_id))
+        except ValueError as e:
+            report['rejetees'] += 1
+            if len(report['erreurs']) < MAX_ERRORS:
+                report['erreurs'].append({'ligne': line_num, 'motif': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            _insert_batch(conn, batch, dry_run, equipements)
+            report['importees'] += len(batch)
+            batch = []
+
+    if batch:
+        _insert_batch(conn, batch, dry_run, equipements)
+        report['importees'] += len(batch)
+
+    report['duree'] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def _insert_batch(conn, batch, dry_run, equipements):
+    """Insérer un lot de lignes validées dans une transaction.
+
+    ``equipements`` mémorise (id, nom enregistré) par nom lu pendant tout l'import.
+    """
+    if dry_run:
+        return
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        rows = []
+        for row in batch:
+            if row[0] not in equipements:
+                equipements[row[0]] = get_equipement(cursor, row[0])
+            equipement_id, nom = equipements[row[0]]
+            rows.append((nom,) + row[1:] + (equipement_id,))
+        last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM pannes').fetchone()[0]
+        saved = suspend_insert_triggers(cursor)
+        cursor.executemany(INSERT_SQL, rows)
+        restore_insert_triggers(cursor, saved, last_id)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
@@ -1,18 +1,716 @@
 ﻿import sqlite3
 import os
+import re
+import unicodedata
 
-def reset_database():
-    # Supprimer l'ancienne base si elle existe
-    if os.path.exists('gmao.db'):
-        os.remove('gmao.db')
-        print("🗑️ Ancienne base de données supprimée")
+# Index secondaires utilisés par les requêtes de app1.py
+# (vérifiés par check_query_plans.py) ; les index (colonne, date_creation)
+# servent à la fois le filtre sur la colonne et le tri par date de l'historique
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_pannes_etat_date ON pannes (etat, date_creation)',
+    'CREATE INDEX IF NOT EXISTS idx_pannes_priorite_date ON pannes (priorite, date_creation)',
+    'CREATE INDEX IF NOT EXISTS idx_pannes_date_creation ON pannes (date_creation)',
+    'CREATE INDEX IF NOT EXISTS idx_pannes_user_date ON pannes (user_id, date_creation)',
+    'CREATE INDEX IF NOT EXISTS idx_pannes_equipement_date ON pannes (equipement, date_creation)',
+]
+
+# Index remplacés par un index composite de INDEXES
+OBSOLETE_INDEXES = ['idx_pannes_etat']
+
+ETATS = ('En attente', 'En cours', 'Résolue', 'Fermée')
+PRIORITES = ('Faible', 'Moyenne', 'Élevée', 'Critique')
+
+# Compteurs de pannes par (etat, priorite), tenus à jour par triggers
+STATS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS pannes_stats (
+        etat TEXT NOT NULL,
+        priorite TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (etat, priorite)
+    ) WITHOUT ROWID
+'''
+
+STATS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS pannes_stats_insert AFTER INSERT ON pannes
+       BEGIN
+           INSERT INTO pannes_stats (etat, priorite, total) VALUES (NEW.etat, NEW.priorite, 1)
+           ON CONFLICT (etat, priorite) DO UPDATE SET total = total + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS pannes_stats_delete AFTER DELETE ON pannes
+       BEGIN
+           UPDATE pannes_stats SET total = total - 1
+           WHERE etat = OLD.etat AND priorite = OLD.priorite;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS pannes_stats_update AFTER UPDATE OF etat, priorite ON pannes
+       WHEN OLD.etat IS NOT NEW.etat OR OLD.priorite IS NOT NEW.priorite
+       BEGIN
+           UPDATE pannes_stats SET total = total - 1
+           WHERE etat = OLD.etat AND priorite = OLD.priorite;
+           INSERT INTO pannes_stats (etat, priorite, total) VALUES (NEW.etat, NEW.priorite, 1)
+           ON CONFLICT (etat, priorite) DO UPDATE SET total = total + 1;
+       END''',
+]
+
+# Index plein texte (FTS5) sur les champs texte des pannes, priorité et état
+# compris, synchronisé par triggers.
+# remove_diacritics 2 : "Élevée" et "elevee" produisent le même terme
+FTS_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS pannes_fts USING fts5(
+        equipement, description, cause, solution, observation, priorite, etat,
+        content='pannes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+'''
+
+# Pondération bm25 par colonne (l'équipement compte le plus, priorité et état le moins)
+FTS_RANK = 'bm25(5.0, 2.0, 1.0, 1.0, 1.0, 0.5, 0.5)'
+
+FTS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS pannes_fts_insert AFTER INSERT ON pannes
+       BEGIN
+           INSERT INTO pannes_fts (rowid, equipement, description, cause, solution, observation, priorite, etat)
+           VALUES (NEW.id, NEW.equipement, NEW.description, NEW.cause, NEW.solution, NEW.observation,
+                   NEW.priorite, NEW.etat);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS pannes_fts_delete AFTER DELETE ON pannes
+       BEGIN
+           INSERT INTO pannes_fts (pannes_fts, rowid, equipement, description, cause, solution, observation, priorite, etat)
+           VALUES ('delete', OLD.id, OLD.equipement, OLD.description, OLD.cause, OLD.solution, OLD.observation,
+                   OLD.priorite, OLD.etat);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS pannes_fts_update
+       AFTER UPDATE OF equipement, description, cause, solution, observation, priorite, etat ON pannes
+       BEGIN
+           INSERT INTO pannes_fts (pannes_fts, rowid, equipement, description, cause, solution, observation, priorite, etat)
+           VALUES ('delete', OLD.id, OLD.equipement, OLD.description, OLD.cause, OLD.solution, OLD.observation,
+                   OLD.priorite, OLD.etat);
+           INSERT INTO pannes_fts (rowid, equipement, description, cause, solution, observation, priorite, etat)
+           VALUES (NEW.id, NEW.equipement, NEW.description, NEW.cause, NEW.solution, NEW.observation,
+                   NEW.priorite, NEW.etat);
+       END''',
+]
+
+# Compteur de modifications : incrémenté à chaque écriture sur pannes (ou renommage
+# d'utilisateur). Sert de jeton de version peu coûteux pour les caches ;
+# modifie_le (UTC) donne la date de la dernière écriture (Last-Modified).
+# epoque est tirée au hasard à la création de la base : le compteur repart de 0
+# après reset_database(), l'époque évite de resservir un export ou un ETag
+# calculé pour l'ancienne base
+VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        modifie_le TIMESTAMP,
+        epoque TEXT
+    )
+'''
+
+VERSION_BUMP = 'UPDATE data_version SET version = version + 1, modifie_le = CURRENT_TIMESTAMP WHERE id = 1'
+
+VERSION_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS data_version_pannes_insert AFTER INSERT ON pannes
+       BEGIN
+           UPDATE data_version SET version = version + 1, modifie_le = CURRENT_TIMESTAMP WHERE id = 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS data_version_pannes_update AFTER UPDATE ON pannes
+       BEGIN
+           UPDATE data_version SET version = version + 1, modifie_le = CURRENT_TIMESTAMP WHERE id = 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS data_version_pannes_delete AFTER DELETE ON pannes
+       BEGIN
+           UPDATE data_version SET version = version + 1, modifie_le = CURRENT_TIMESTAMP WHERE id = 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS data_version_users_update AFTER UPDATE OF username ON users
+       BEGIN
+           UPDATE data_version SET version = version + 1, modifie_le = CURRENT_TIMESTAMP WHERE id = 1;
+       END''',
+]
+
+# Journal des changements d'état des pannes (ajout seulement), alimenté par
+# triggers dans la transaction de l'écriture. Dates en heure locale, comme
+# pannes.date_creation ; la création est datée de date_creation
+EVENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS panne_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        panne_id INTEGER NOT NULL,
+        etat_avant TEXT,
+        etat_apres TEXT NOT NULL,
+        date_evenement TIMESTAMP NOT NULL,
+        user_id INTEGER,
+        FOREIGN KEY (panne_id) REFERENCES pannes (id)
+    )
+'''
+
+EVENTS_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_panne_events_panne ON panne_events (panne_id, id)',
+    # Pannes modifiées depuis une date (disponibilité du parc, availability.py)
+    'CREATE INDEX IF NOT EXISTS idx_panne_events_date ON panne_events (date_evenement, panne_id)',
+]
+
+# Auteur des changements d'état de la transaction d'écriture en cours : renseigné
+# par l'application avant un UPDATE de pannes et effacé avant le COMMIT (voir
+# app1.panne_actor). SQLite n'a qu'un écrivain à la fois, la ligne ne peut donc
+# pas être vue par une autre écriture. À défaut (scripts, outils externes),
+# l'événement est attribué au créateur de la panne
+ACTOR_TABLE = '''
+    CREATE TABLE IF NOT EXISTS panne_acteur (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        user_id INTEGER NOT NULL
+    )
+'''
+
+EVENTS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS panne_events_insert AFTER INSERT ON pannes
+       BEGIN
+           INSERT INTO panne_events (panne_id, etat_avant, etat_apres, date_evenement, user_id)
+           VALUES (NEW.id, NULL, NEW.etat, NEW.date_creation, NEW.user_id);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS panne_events_update AFTER UPDATE OF etat ON pannes
+       WHEN OLD.etat IS NOT NEW.etat
+       BEGIN
+           INSERT INTO panne_events (panne_id, etat_avant, etat_apres, date_evenement, user_id)
+           VALUES (NEW.id, OLD.etat, NEW.etat, datetime('now', 'localtime'),
+                   COALESCE((SELECT user_id FROM panne_acteur WHERE id = 1), NEW.user_id));
+       END''',
+]
+
+# Délais cumulés (nombre de pannes, somme des durées en secondes) par priorité,
+# équipement et technicien (auteur de l'événement qui termine le délai) : MTTA = délai de prise en
+# charge (première sortie de "En attente"), MTTR = délai de résolution
+# (premier passage d'un état ouvert à "Résolue" ou "Fermée"), depuis la création.
+# Mis à jour par triggers à chaque événement ; moyenne = total_secondes / nombre
+DELAYS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS pannes_delais (
+        mesure TEXT NOT NULL CHECK (mesure IN ('mtta', 'mttr')),
+        dimension TEXT NOT NULL CHECK (dimension IN ('priorite', 'equipement', 'technicien')),
+        cle TEXT NOT NULL,
+        nombre INTEGER NOT NULL DEFAULT 0,
+        total_secondes REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, cle, mesure)
+    ) WITHOUT ROWID
+'''
+
+# {e} désigne l'événement (NEW dans le trigger, la table dans le recalcul).
+# Les équipements sont cumulés par identifiant du registre : un renommage ne les sépare pas
+DELAY_DIMENSIONS = (('priorite', 'p.priorite'), ('equipement', 'CAST(p.equipement_id AS TEXT)'),
+                    ('technicien', 'CAST({e}.user_id AS TEXT)'))
+
+# Événements qui terminent chaque délai (le premier seulement compte)
+DELAY_EVENTS = {
+    'mtta': "etat_avant = 'En attente'",
+    'mttr': "etat_avant IN ('En attente', 'En cours') AND etat_apres IN ('Résolue', 'Fermée')",
+}
+
+def _delay_trigger(mesure):
+    """Trigger qui ajoute le délai d'une panne aux cumuls lors de son premier événement terminal"""
+    condition = DELAY_EVENTS[mesure]
+    upserts = '\n'.join(f'''
+           INSERT INTO pannes_delais (mesure, dimension, cle, nombre, total_secondes)
+           SELECT '{mesure}', '{dimension}', {expression.format(e='NEW')}, 1,
+                  MAX(0, (julianday(NEW.date_evenement) - julianday(p.date_creation)) * 86400)
+           FROM pannes p WHERE p.id = NEW.panne_id AND {expression.format(e='NEW')} IS NOT NULL
+           ON CONFLICT (dimension, cle, mesure) DO UPDATE
+           SET nombre = nombre + 1, total_secondes = total_secondes + excluded.total_secondes;'''
+        for dimension, expression in DELAY_DIMENSIONS)
+    new_condition = condition.replace('etat_', 'NEW.etat_')
+    return f'''CREATE TRIGGER IF NOT EXISTS pannes_delais_{mesure} AFTER INSERT ON panne_events
+       WHEN {new_condition}
+            AND NOT EXISTS (SELECT 1 FROM panne_events
+                            WHERE panne_id = NEW.panne_id AND id < NEW.id AND {condition})
+       BEGIN{upserts}
+       END'''
+
+DELAYS_TRIGGERS = [_delay_trigger(mesure) for mesure in DELAY_EVENTS]
+
+# Nombre de pannes par période de création (jour, semaine commençant le lundi,
+# mois) et par priorité, état ou équipement, plus une carte horaire par mois
+# (dimension "creneau", clé "<jour de semaine 0=dimanche>-<heure>").
+# Tenu à jour par triggers : chaque écriture déplace la panne d'une case à l'autre
+ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS pannes_rollup (
+        granularite TEXT NOT NULL CHECK (granularite IN ('jour', 'semaine', 'mois')),
+        dimension TEXT NOT NULL CHECK (dimension IN ('priorite', 'etat', 'equipement', 'creneau')),
+        periode TEXT NOT NULL,
+        cle TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularite, dimension, periode, cle)
+    ) WITHOUT ROWID
+'''
+
+# Clé de période (format triable) de chaque granularité pour une date de création
+ROLLUP_PERIODS = {
+    'jour': "date({d})",
+    'semaine': "date({d}, '-6 days', 'weekday 1')",
+    'mois': "strftime('%Y-%m', {d})",
+}
+
+# (granularité, dimension, expression de la clé) ; {r} désigne la ligne (NEW, OLD ou la table)
+ROLLUP_BUCKETS = [
+    (granularite, dimension, expression)
+    for granularite in ROLLUP_PERIODS
+    for dimension, expression in (('priorite', '{r}.priorite'), ('etat', '{r}.etat'),
+                                  ('equipement', '{r}.equipement'))
+] + [('mois', 'creneau', "strftime('%w-%H', {r}.date_creation)")]
+
+def _rollup_upserts(row, delta):
+    """Instructions qui ajoutent ``delta`` aux cases d'une ligne de pannes"""
+    statements = []
+    for granularite, dimension, expression in ROLLUP_BUCKETS:
+        periode = ROLLUP_PERIODS[granularite].format(d=f'{row}.date_creation')
+        statements.append(f'''
+           INSERT INTO pannes_rollup (granularite, dimension, periode, cle, total)
+           VALUES ('{granularite}', '{dimension}', {periode}, {expression.format(r=row)}, {delta})
+           ON CONFLICT (granularite, dimension, periode, cle) DO UPDATE SET total = total + ({delta});''')
+    return ''.join(statements)
+
+ROLLUP_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_rollup_insert AFTER INSERT ON pannes
+       BEGIN{_rollup_upserts('NEW', 1)}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_rollup_delete AFTER DELETE ON pannes
+       BEGIN{_rollup_upserts('OLD', -1)}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_rollup_update
+       AFTER UPDATE OF etat, priorite, equipement, date_creation ON pannes
+       WHEN OLD.etat IS NOT NEW.etat OR OLD.priorite IS NOT NEW.priorite
+            OR OLD.equipement IS NOT NEW.equipement OR OLD.date_creation IS NOT NEW.date_creation
+       BEGIN{_rollup_upserts('OLD', -1)}{_rollup_upserts('NEW', 1)}
+       END''',
+]
+
+def _rollup_select(granularite, dimension, expression, where=''):
+    """Agrégat ensembliste d'une case de pannes_rollup (reconstruction, import en masse)"""
+    periode = ROLLUP_PERIODS[granularite].format(d='date_creation')
+    cle = expression.format(r='pannes')
+    return f'''
+        INSERT INTO pannes_rollup (granularite, dimension, periode, cle, total)
+        SELECT '{granularite}', '{dimension}', {periode}, {cle}, COUNT(*)
+        FROM pannes WHERE {where or '1'} GROUP BY {periode}, {cle}
+        ON CONFLICT (granularite, dimension, periode, cle) DO UPDATE SET total = total + excluded.total
+    '''
+
+# Version de chaque équipement du registre : incrémentée à chaque écriture sur
+# l'une de ses pannes. Invalide le cache de disponibilité (availability.py)
+# équipement par équipement
+EQUIPMENT_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS pannes_equipement_version (
+        equipement_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+'''
+
+_EQUIPMENT_BUMP = '''
+           INSERT INTO pannes_equipement_version (equipement_id, version)
+           SELECT {row}.equipement_id, 1 WHERE {row}.equipement_id IS NOT NULL
+           ON CONFLICT (equipement_id) DO UPDATE SET version = version + 1;'''
+
+EQUIPMENT_VERSION_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_equipement_version_insert AFTER INSERT ON pannes
+       BEGIN{_EQUIPMENT_BUMP.format(row='NEW')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_equipement_version_delete AFTER DELETE ON pannes
+       BEGIN{_EQUIPMENT_BUMP.format(row='OLD')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS pannes_equipement_version_update
+       AFTER UPDATE OF equipement_id, etat, date_creation ON pannes
+       BEGIN{_EQUIPMENT_BUMP.format(row='OLD')}{_EQUIPMENT_BUMP.format(row='NEW')}
+       END''',
+]
+
+# Registre des équipements : une ligne par machine, identifiée par une clé
+# canonique (sans accents, casse ni ponctuation : "Pompe C3", "pompe c3 " et
+# "POMPE-C3" désignent le même équipement). pannes.equipement_id y renvoie et
+# pannes.equipement reprend le nom enregistré
+EQUIPEMENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS equipements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nom TEXT NOT NULL,
+        cle TEXT NOT NULL UNIQUE,
+        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+EQUIPEMENTS_INDEX = '''CREATE INDEX IF NOT EXISTS idx_pannes_equipement_id_date
+                       ON pannes (equipement_id, date_creation)'''
+
+# Recherche d'un équipement du registre par son nom enregistré (disponibilité)
+EQUIPEMENTS_NOM_INDEX = 'CREATE INDEX IF NOT EXISTS idx_equipements_nom ON equipements (nom)'
+
+# Compteurs par équipement, état et priorité (fiche équipement), tenus à jour par triggers
+EQUIPMENT_STATS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS equipements_stats (
+        equipement_id INTEGER NOT NULL,
+        etat TEXT NOT NULL,
+        priorite TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (equipement_id, etat, priorite)
+    ) WITHOUT ROWID
+'''
+
+EQUIPMENT_STATS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS equipements_stats_insert AFTER INSERT ON pannes
+       WHEN NEW.equipement_id IS NOT NULL
+       BEGIN
+           INSERT INTO equipements_stats (equipement_id, etat, priorite, total)
+           VALUES (NEW.equipement_id, NEW.etat, NEW.priorite, 1)
+           ON CONFLICT (equipement_id, etat, priorite) DO UPDATE SET total = total + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS equipements_stats_delete AFTER DELETE ON pannes
+       WHEN OLD.equipement_id IS NOT NULL
+       BEGIN
+           UPDATE equipements_stats SET total = total - 1
+           WHERE equipement_id = OLD.equipement_id AND etat = OLD.etat AND priorite = OLD.priorite;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS equipements_stats_update AFTER UPDATE OF equipement_id, etat, priorite ON pannes
+       WHEN OLD.equipement_id IS NOT NEW.equipement_id OR OLD.etat IS NOT NEW.etat
+            OR OLD.priorite IS NOT NEW.priorite
+       BEGIN
+           UPDATE equipements_stats SET total = total - 1
+           WHERE equipement_id = OLD.equipement_id AND etat = OLD.etat AND priorite = OLD.priorite;
+           INSERT INTO equipements_stats (equipement_id, etat, priorite, total)
+           SELECT NEW.equipement_id, NEW.etat, NEW.priorite, 1 WHERE NEW.equipement_id IS NOT NULL
+           ON CONFLICT (equipement_id, etat, priorite) DO UPDATE SET total = total + 1;
+       END''',
+]
+
+BACKFILL_BATCH_SIZE = 10000   # Pannes rattachées au registre par transaction
+
+def equipment_key(nom):
+    """Clé canonique d'un équipement : sans accents, en minuscules, ponctuation et espaces réduits"""
+    # Seuls les signes diacritiques (Mn) sont retirés : « Ø », « Ω » restent distincts
+    text = ''.join(c for c in unicodedata.normalize('NFKD', str(nom)) if unicodedata.category(c) != 'Mn')
+    text = ''.join(c if c.isalnum() else ' ' for c in text.casefold())
+    return ' '.join(text.split()) or str(nom).strip()
+
+def get_equipement(cursor, nom):
+    """Identifiant et nom enregistré de l'équipement, créé s'il est nouveau"""
+    cle = equipment_key(nom)
+    cursor.execute(
+        'INSERT INTO equipements (nom, cle) VALUES (?, ?) ON CONFLICT (cle) DO NOTHING',
+        (' '.join(str(nom).split()), cle)
+    )
+    cursor.execute('SELECT id, nom FROM equipements WHERE cle = ?', (cle,))
+    return tuple(cursor.fetchone())
+
+def table_exists(cursor, name):
+    """Vérifier l'existence d'une table (ou table virtuelle)"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def column_exists(cursor, table, column):
+    """Vérifier l'existence d'une colonne dans une table"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return any(row[1] == column for row in cursor.fetchall())
+
+def trigger_name(statement):
+    """Nom du trigger créé par une instruction CREATE TRIGGER"""
+    return re.search(r'CREATE TRIGGER IF NOT EXISTS (\w+)', statement).group(1)
+
+def rebuild_stats(cursor):
+    """Recalculer entièrement la table pannes_stats à partir de pannes"""
+    cursor.execute('DELETE FROM pannes_stats')
+    cursor.executemany(
+        'INSERT INTO pannes_stats (etat, priorite, total) VALUES (?, ?, 0)',
+        [(etat, priorite) for etat in ETATS for priorite in PRIORITES]
+    )
+    cursor.execute('''
+        INSERT INTO pannes_stats (etat, priorite, total)
+        SELECT etat, priorite, COUNT(*) FROM pannes WHERE 1 GROUP BY etat, priorite
+        ON CONFLICT (etat, priorite) DO UPDATE SET total = excluded.total
+    ''')
+
+def rebuild_delays(cursor):
+    """Recalculer entièrement pannes_delais à partir du journal panne_events"""
+    cursor.execute('DELETE FROM pannes_delais')
+    for mesure, condition in DELAY_EVENTS.items():
+        for dimension, expression in DELAY_DIMENSIONS:
+            expression = expression.format(e='e')
+            cursor.execute(f'''
+                INSERT INTO pannes_delais (mesure, dimension, cle, nombre, total_secondes)
+                SELECT '{mesure}', '{dimension}', {expression}, COUNT(*),
+                       SUM(MAX(0, (julianday(e.date_evenement) - julianday(p.date_creation)) * 86400))
+                FROM panne_events e JOIN pannes p ON p.id = e.panne_id
+                WHERE e.id IN (SELECT MIN(id) FROM panne_events WHERE {condition} GROUP BY panne_id)
+                  AND {expression} IS NOT NULL
+                GROUP BY {expression}
+            ''')
+
+def create_event_log(cursor):
+    """Créer le journal des événements, les cumuls de délais et leurs triggers"""
+    events_missing = not table_exists(cursor, 'panne_events')
+    cursor.execute(EVENTS_TABLE)
+    for statement in EVENTS_INDEXES:
+        cursor.execute(statement)
+    if events_missing:
+        # Base existante : l'état actuel de chaque panne est le seul connu
+        cursor.execute('''
+            INSERT INTO panne_events (panne_id, etat_avant, etat_apres, date_evenement, user_id)
+            SELECT id, NULL, etat, date_creation, user_id FROM pannes ORDER BY id
+        ''')
+    cursor.execute(ACTOR_TABLE)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'panne_events_update'")
+    row = cursor.fetchone()
+    actor_missing = row is not None and 'panne_acteur' not in row[0]
+    if actor_missing:
+        # Base antérieure : les changements d'état étaient attribués au créateur de la panne
+        for statement in EVENTS_TRIGGERS + DELAYS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name(statement)}')
+    for statement in EVENTS_TRIGGERS:
+        cursor.execute(statement)
     
-    # Créer une nouvelle base de données
-    conn = sqlite3.connect('gmao.db')
+    delays_missing = not table_exists(cursor, 'pannes_delais')
+    cursor.execute(DELAYS_TABLE)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'pannes_delais_mtta'")
+    row = cursor.fetchone()
+    by_name = row is not None and 'equipement_id' not in row[0]
+    if by_name:
+        # Base antérieure : les délais étaient cumulés par nom d'équipement
+        for statement in DELAYS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name(statement)}')
+    for statement in DELAYS_TRIGGERS:
+        cursor.execute(statement)
+    if delays_missing or actor_missing or by_name:
+        rebuild_delays(cursor)
+
+def rebuild_rollups(cursor):
+    """Recalculer entièrement pannes_rollup à partir de pannes"""
+    cursor.execute('DELETE FROM pannes_rollup')
+    for granularite, dimension, expression in ROLLUP_BUCKETS:
+        cursor.execute(_rollup_select(granularite, dimension, expression))
+
+def create_rollups(cursor):
+    """Créer la table des agrégats par période et ses triggers"""
+    rollup_missing = not table_exists(cursor, 'pannes_rollup')
+    cursor.execute(ROLLUP_TABLE)
+    for statement in ROLLUP_TRIGGERS:
+        cursor.execute(statement)
+    if rollup_missing:
+        rebuild_rollups(cursor)
+
+def create_equipment_versions(cursor):
+    """Créer la table des versions d'équipement et ses triggers"""
+    versions_missing = not table_exists(cursor, 'pannes_equipement_version')
+    if not versions_missing and not column_exists(cursor, 'pannes_equipement_version', 'equipement_id'):
+        # Base antérieure : versions par nom d'équipement, repartir du registre
+        for statement in EQUIPMENT_VERSION_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name(statement)}')
+        cursor.execute('DROP TABLE pannes_equipement_version')
+        versions_missing = True
+    cursor.execute(EQUIPMENT_VERSION_TABLE)
+    for statement in EQUIPMENT_VERSION_TRIGGERS:
+        cursor.execute(statement)
+    if versions_missing:
+        # Les pannes pas encore rattachées au registre le seront par backfill_equipements
+        cursor.execute('''
+            INSERT INTO pannes_equipement_version (equipement_id, version)
+            SELECT equipement_id, 1 FROM pannes WHERE equipement_id IS NOT NULL GROUP BY equipement_id
+            ON CONFLICT (equipement_id) DO NOTHING
+        ''')
+
+def create_equipment_registry(cursor):
+    """Créer le registre des équipements, la colonne pannes.equipement_id et les compteurs par équipement"""
+    cursor.execute(EQUIPEMENTS_TABLE)
+    if not column_exists(cursor, 'pannes', 'equipement_id'):
+        # Base antérieure : les pannes existantes sont rattachées par backfill_equipements
+        cursor.execute('ALTER TABLE pannes ADD COLUMN equipement_id INTEGER REFERENCES equipements (id)')
+    cursor.execute(EQUIPEMENTS_INDEX)
+    cursor.execute(EQUIPEMENTS_NOM_INDEX)
+    rekey_equipements(cursor)
+    cursor.execute(EQUIPMENT_STATS_TABLE)
+    for statement in EQUIPMENT_STATS_TRIGGERS:
+        cursor.execute(statement)
+
+def rekey_equipements(cursor):
+    """Recalculer les clés du registre quand equipment_key a changé (une ligne par équipement)"""
+    cursor.execute('SELECT id, nom, cle FROM equipements')
+    changed = [(equipment_key(nom), equipement_id) for equipement_id, nom, cle in cursor.fetchall()
+               if equipment_key(nom) != cle]
+    # Deux équipements ne peuvent pas partager une clé : le premier garde la sienne
+    cursor.executemany('UPDATE OR IGNORE equipements SET cle = ? WHERE id = ?', changed)
+
+def backfill_equipements(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Rattacher au registre les pannes sans equipement_id, par tranches d'id (une transaction chacune).
+
+    Le nom de la panne est remplacé par le nom enregistré de son équipement ;
+    les triggers mettent à jour compteurs, agrégats et index au passage.
+    Retourne le nombre de pannes rattachées.
+    """
     cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM pannes WHERE equipement_id IS NULL LIMIT 1')
+    if cursor.fetchone() is None:
+        return 0
     
-    print("🔧 Création de la nouvelle base de données...")
+    conn.create_function('equipement_cle', 1, equipment_key, deterministic=True)
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM pannes')
+    max_id = cursor.fetchone()[0]
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        end = start + batch_size
+        # Le premier nom rencontré (par id) devient le nom enregistré
+        cursor.execute('''
+            INSERT INTO equipements (nom, cle)
+            SELECT TRIM(equipement), equipement_cle(equipement) FROM pannes
+            WHERE id > ? AND id <= ? AND equipement_id IS NULL ORDER BY id
+            ON CONFLICT (cle) DO NOTHING
+        ''', (start, end))
+        cursor.execute('''
+            UPDATE pannes SET equipement_id = (SELECT id FROM equipements WHERE cle = equipement_cle(pannes.equipement))
+            WHERE id > ? AND id <= ? AND equipement_id IS NULL
+        ''', (start, end))
+        updated += cursor.rowcount
+        cursor.execute('''
+            UPDATE pannes SET equipement = (SELECT nom FROM equipements WHERE id = pannes.equipement_id)
+            WHERE id > ? AND id <= ?
+              AND equipement IS NOT (SELECT nom FROM equipements WHERE id = pannes.equipement_id)
+        ''', (start, end))
+        conn.commit()
+    
+    if updated:
+        # Les délais sont cumulés par equipement_id : ceux des pannes rattachées manquaient
+        rebuild_delays(cursor)
+        conn.commit()
+    return updated
+
+def rebuild_search_index(cursor):
+    """Reconstruire l'index plein texte à partir de la table pannes"""
+    cursor.execute("INSERT INTO pannes_fts (pannes_fts) VALUES ('rebuild')")
+
+def create_search_index(cursor):
+    """Créer l'index FTS5 et ses triggers (ignoré si SQLite est compilé sans FTS5)"""
+    fts_missing = not table_exists(cursor, 'pannes_fts')
+    if not fts_missing and not column_exists(cursor, 'pannes_fts', 'etat'):
+        # Base antérieure : priorité et état n'étaient pas indexés
+        for statement in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name(statement)}')
+        cursor.execute('DROP TABLE pannes_fts')
+        # Les recherches changent de résultats : pages et exports en cache sont périmés
+        cursor.execute(VERSION_BUMP)
+        fts_missing = True
+    try:
+        cursor.execute(FTS_TABLE)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Recherche plein texte indisponible : {e}")
+        return False
+    for statement in FTS_TRIGGERS:
+        cursor.execute(statement)
+    if fts_missing:
+        cursor.execute("INSERT INTO pannes_fts (pannes_fts, rank) VALUES ('rank', ?)", (FTS_RANK,))
+        rebuild_search_index(cursor)
+    return True
+
+# Triggers ligne par ligne déclenchés par un INSERT sur pannes. Un import en
+# masse les suspend le temps de son lot et applique leur effet en une fois
+INSERT_TRIGGERS = ('pannes_stats_insert', 'data_version_pannes_insert', 'pannes_fts_insert',
+                   'panne_events_insert', 'pannes_rollup_insert', 'pannes_equipement_version_insert',
+                   'equipements_stats_insert')
+
+def suspend_insert_triggers(cursor):
+    """Supprimer les triggers d'insertion (dans la transaction en cours) et retourner leur définition"""
+    cursor.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join('?' * len(INSERT_TRIGGERS))})",
+        INSERT_TRIGGERS
+    )
+    saved = [tuple(row) for row in cursor.fetchall()]
+    for name, sql in saved:
+        cursor.execute(f'DROP TRIGGER {name}')
+    return saved
+
+def restore_insert_triggers(cursor, saved, after_id):
+    """Appliquer aux pannes d'id > after_id l'effet des triggers suspendus, puis les recréer"""
+    names = {name for name, sql in saved}
+    if 'pannes_stats_insert' in names:
+        cursor.execute('''
+            INSERT INTO pannes_stats (etat, priorite, total)
+            SELECT etat, priorite, COUNT(*) FROM pannes WHERE id > ? GROUP BY etat, priorite
+            ON CONFLICT (etat, priorite) DO UPDATE SET total = total + excluded.total
+        ''', (after_id,))
+    if 'pannes_fts_insert' in names:
+        cursor.execute('''
+            INSERT INTO pannes_fts (rowid, equipement, description, cause, solution, observation, priorite, etat)
+            SELECT id, equipement, description, cause, solution, observation, priorite, etat FROM pannes WHERE id > ?
+        ''', (after_id,))
+    if 'panne_events_insert' in names:
+        # Événements de création : ils ne terminent aucun délai
+        cursor.execute('''
+            INSERT INTO panne_events (panne_id, etat_avant, etat_apres, date_evenement, user_id)
+            SELECT id, NULL, etat, date_creation, user_id FROM pannes WHERE id > ? ORDER BY id
+        ''', (after_id,))
+    if 'pannes_rollup_insert' in names:
+        for granularite, dimension, expression in ROLLUP_BUCKETS:
+            cursor.execute(_rollup_select(granularite, dimension, expression, 'id > ?'), (after_id,))
+    if 'pannes_equipement_version_insert' in names:
+        cursor.execute('''
+            INSERT INTO pannes_equipement_version (equipement_id, version)
+            SELECT equipement_id, 1 FROM pannes
+            WHERE id > ? AND equipement_id IS NOT NULL GROUP BY equipement_id
+            ON CONFLICT (equipement_id) DO UPDATE SET version = version + 1
+        ''', (after_id,))
+    if 'equipements_stats_insert' in names:
+        cursor.execute('''
+            INSERT INTO equipements_stats (equipement_id, etat, priorite, total)
+            SELECT equipement_id, etat, priorite, COUNT(*) FROM pannes
+            WHERE id > ? AND equipement_id IS NOT NULL GROUP BY equipement_id, etat, priorite
+            ON CONFLICT (equipement_id, etat, priorite) DO UPDATE SET total = total + excluded.total
+        ''', (after_id,))
+    if 'data_version_pannes_insert' in names:
+        cursor.execute(VERSION_BUMP)
+    for name, sql in saved:
+        cursor.execute(sql)
+
+def create_schema_objects(cursor):
+    """Créer les index, tables dérivées et triggers s'ils n'existent pas encore"""
+    for statement in INDEXES:
+        cursor.execute(statement)
+    for name in OBSOLETE_INDEXES:
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    
+    stats_missing = not table_exists(cursor, 'pannes_stats')
+    cursor.execute(STATS_TABLE)
+    for statement in STATS_TRIGGERS:
+        cursor.execute(statement)
+    if stats_missing:
+        rebuild_stats(cursor)
+    
+    cursor.execute(VERSION_TABLE)
+    if not column_exists(cursor, 'data_version', 'modifie_le'):
+        # Base antérieure : ajouter la date et recréer les triggers qui ne la renseignaient pas
+        cursor.execute('ALTER TABLE data_version ADD COLUMN modifie_le TIMESTAMP')
+        for statement in VERSION_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name(statement)}')
+    if not column_exists(cursor, 'data_version', 'epoque'):
+        cursor.execute('ALTER TABLE data_version ADD COLUMN epoque TEXT')
+    cursor.execute('INSERT OR IGNORE INTO data_version (id, version, modifie_le) VALUES (1, 0, CURRENT_TIMESTAMP)')
+    cursor.execute('UPDATE data_version SET modifie_le = CURRENT_TIMESTAMP WHERE modifie_le IS NULL')
+    cursor.execute('UPDATE data_version SET epoque = lower(hex(randomblob(16))) WHERE epoque IS NULL')
+    for statement in VERSION_TRIGGERS:
+        cursor.execute(statement)
     
+    # Le registre d'abord : délais et versions sont indexés par pannes.equipement_id
+    create_equipment_registry(cursor)
+    
+    create_event_log(cursor)
+    
+    create_rollups(cursor)
+    
+    create_equipment_versions(cursor)
+    
+    create_search_index(cursor)
+
+def upgrade_database(db_path='gmao.db'):
+    """Mettre à niveau une base existante sans toucher aux données"""
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        create_schema_objects(conn.cursor())
+        conn.commit()
+        backfill_equipements(conn)
+    finally:
+        conn.close()
+    return True
+
+def create_tables(cursor):
+    """Créer les tables principales"""
     # Création de la table users
     cursor.execute('''
         CREATE TABLE users (
@@ -23,7 +721,6 @@ def reset_database():
             date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    print("✅ Table 'users' créée")
     
     # Création de la table pannes
     cursor.execute('''
@@ -38,10 +735,29 @@ def reset_database():
             solution TEXT,
             observation TEXT,
             user_id INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
+            equipement_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (equipement_id) REFERENCES equipements (id)
         )
     ''')
-    print("✅ Table 'pannes' créée")
+
+def reset_database():
+    # Supprimer l'ancienne base si elle existe
+    if os.path.exists('gmao.db'):
+        os.remove('gmao.db')
+        print("🗑️ Ancienne base de données supprimée")
+    
+    # Créer une nouvelle base de données
+    conn = sqlite3.connect('gmao.db')
+    cursor = conn.cursor()
+    
+    print("🔧 Création de la nouvelle base de données...")
+    
+    create_tables(cursor)
+    print("✅ Tables 'users' et 'pannes' créées")
+    
+    create_schema_objects(cursor)
+    print("✅ Index, compteurs, journal des événements, recherche plein texte et triggers créés")
     
     # Insertion des utilisateurs par défaut
     cursor.execute('''
@@ -80,6 +796,10 @@ def reset_database():
     ''', pannes_exemple)
     print("✅ Pannes d'exemple ajoutées")
     
+    conn.commit()
+    backfill_equipements(conn)
+    print("✅ Registre des équipements créé")
+    
     # Vérification de la création
     cursor.execute('SELECT COUNT(*) FROM users')
     user_count = cursor.fetchone()[0]
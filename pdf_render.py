@@ -0,0 +1,153 @@
+import functools
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate
+
+# Mise en page commune des exports PDF : styles construits une seule fois au
+# chargement du module, logo décodé et réduit une seule fois par processus,
+# en-tête et pied de page dessinés une fois par document dans un formulaire
+# PDF (XObject) réutilisé sur chaque page.
+
+# Deux couleurs principales seulement
+PRIMARY_COLOR = colors.Color(0.12, 0.23, 0.54)  # Bleu foncé
+SECONDARY_COLOR = colors.black                    # Noir
+
+PAGE_SIZE = A4
+MARGIN = 1 * inch
+TOP_MARGIN = 1.4 * inch     # Place réservée à l'en-tête (logo + nom)
+BOTTOM_MARGIN = 0.9 * inch  # Place réservée au pied de page
+
+LOGO_SIZE = 0.8 * inch
+LOGO_DPI = 200              # Résolution du logo réduit (le fichier source est bien plus grand)
+
+PAGE_FORM = 'EnteteOnee'    # Nom du formulaire PDF de l'en-tête et du pied de page
+FOOTER_TEXT = "ONEE-BO - Gestion des Pannes"
+
+
+def _build_styles():
+    """Styles de paragraphe partagés par tous les exports"""
+    base = getSampleStyleSheet()
+    styles = {
+        'normal': base['Normal'],
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=base['Heading1'],
+            fontSize=18,
+            spaceAfter=20,
+            alignment=0,  # Alignement à gauche
+            textColor=PRIMARY_COLOR,
+            fontName='Helvetica-Bold'
+        ),
+        'subtitle': ParagraphStyle(
+            'SubtitleStyle',
+            parent=base['Normal'],
+            fontSize=10,
+            spaceAfter=20,
+            alignment=0,  # Alignement à gauche
+            textColor=SECONDARY_COLOR
+        ),
+        'section': ParagraphStyle(
+            'SectionStyle',
+            parent=base['Heading2'],
+            fontSize=12,
+            spaceBefore=15,
+            spaceAfter=8,
+            textColor=PRIMARY_COLOR,
+            fontName='Helvetica-Bold'
+        ),
+    }
+    styles['month'] = ParagraphStyle(
+        'MonthStyle',
+        parent=styles['section'],
+        fontSize=10,
+        spaceBefore=10,
+        spaceAfter=5
+    )
+    return styles
+
+
+STYLES = _build_styles()
+
+
+@functools.lru_cache(maxsize=4)
+def load_logo(path):
+    """Logo décodé et réduit à la taille d'affichage, None s'il est absent ou illisible"""
+    try:
+        from PIL import Image as PILImage
+
+        with PILImage.open(path) as image:
+            image = image.convert('RGBA')
+            pixels = max(1, int(LOGO_SIZE / inch * LOGO_DPI))
+            image.thumbnail((pixels, pixels), PILImage.LANCZOS)
+        return ImageReader(image)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Erreur logo PDF: {e}")
+        return None
+
+
+def _draw_page_form(canvas, doc):
+    """Enregistrer l'en-tête (logo, nom de l'entreprise, filet) et le pied de page comme formulaire"""
+    width, height = doc.pagesize
+    canvas.beginForm(PAGE_FORM)
+
+    top = height - 0.35 * inch
+    text_x = doc.leftMargin
+    if doc.logo is not None:
+        canvas.drawImage(doc.logo, doc.leftMargin, top - LOGO_SIZE, LOGO_SIZE, LOGO_SIZE,
+                         mask='auto', preserveAspectRatio=True)
+        text_x = doc.leftMargin + LOGO_SIZE + 0.2 * inch
+
+    canvas.setFillColor(PRIMARY_COLOR)
+    canvas.setFont('Helvetica-Bold', 16)
+    canvas.drawString(text_x, top - LOGO_SIZE / 2 + 4, doc.company_name)
+    canvas.setFont('Helvetica-Bold', 11)
+    canvas.drawString(text_x, top - LOGO_SIZE / 2 - 14, doc.company_subtitle)
+
+    # Ligne de séparation simple
+    canvas.rect(doc.leftMargin, top - LOGO_SIZE - 0.15 * inch, doc.width, 2, stroke=0, fill=1)
+
+    canvas.setFillColor(SECONDARY_COLOR)
+    canvas.setFont('Helvetica', 8)
+    canvas.drawCentredString(width / 2, 0.5 * inch, FOOTER_TEXT)
+
+    canvas.endForm()
+
+
+def _on_page(canvas, doc):
+    """Dessiner l'en-tête et le pied de page (formulaire partagé) puis le numéro de page"""
+    if not canvas.hasForm(PAGE_FORM):
+        _draw_page_form(canvas, doc)
+    canvas.saveState()
+    canvas.doForm(PAGE_FORM)
+    canvas.setFillColor(SECONDARY_COLOR)
+    canvas.setFont('Helvetica', 8)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 0.5 * inch, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def create_document(output, logo_path, company_name, company_subtitle, title=''):
+    """Document PDF (compressé) dont chaque page porte l'en-tête et le pied de page communs"""
+    doc = BaseDocTemplate(
+        output,
+        pagesize=PAGE_SIZE,
+        leftMargin=MARGIN,
+        rightMargin=MARGIN,
+        topMargin=TOP_MARGIN,
+        bottomMargin=BOTTOM_MARGIN,
+        pageCompression=1,
+        title=title,
+        author=company_name
+    )
+    doc.logo = load_logo(logo_path)
+    doc.company_name = company_name
+    doc.company_subtitle = company_subtitle
+
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='contenu')
+    doc.addPageTemplates([PageTemplate(id='page', frames=[frame], onPage=_on_page)])
+    return doc
@@ -0,0 +1,167 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+# Fichiers statiques empreintés (style1.<hash>.css) servis avec un cache long.
+# L'étape de construction (flask --app app1 build-static) copie chaque fichier
+# de static/ dans static/dist/ sous un nom contenant l'empreinte de son
+# contenu, écrit une copie .gz précompressée des fichiers texte, remplace le
+# logo par une version réduite, et enregistre la correspondance dans
+# static/dist/manifest.json. url_for('static', filename='style1.css') renvoie
+# alors le fichier empreinté ; sans manifeste, les fichiers d'origine sont servis.
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+
+MAX_AGE = 365 * 24 * 3600     # Un an : le nom change dès que le contenu change
+
+GZIP_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt')
+
+# Images réduites à la taille utilisée par les pages (côté en pixels) ;
+# les exports PDF et Excel continuent de lire le fichier d'origine
+DERIVATIVES = {
+    'images/logo.png': 128,
+}
+
+
+def _fingerprint(path):
+    """Empreinte SHA-256 (tronquée) du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def _source_files(static_dir):
+    """Fichiers de static/ (hors dist/) en chemins relatifs avec des /"""
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/')
+
+
+def _write_derivative(source, target, size):
+    """Image réduite (PNG) tenant dans un carré de ``size`` pixels"""
+    from PIL import Image as PILImage
+
+    with PILImage.open(source) as image:
+        image = image.convert('RGBA')
+        image.thumbnail((size, size), PILImage.LANCZOS)
+        image.save(target, 'PNG', optimize=True)
+
+
+def _write_gzip(path):
+    """Copie .gz (compression maximale, sans date pour un résultat reproductible)"""
+    with open(path, 'rb') as src, open(path + '.gz', 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst)
+
+
+def build(static_dir):
+    """Construire static/dist/ et son manifeste ; retourne le manifeste {nom logique: nom empreinté}"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+    staging = os.path.join(dist_dir, '.construction')
+    os.makedirs(staging, exist_ok=True)
+
+    manifest = {}
+    try:
+        for name in _source_files(static_dir):
+            source = os.path.join(static_dir, name)
+            tmp = os.path.join(staging, 'fichier')
+            if name in DERIVATIVES:
+                _write_derivative(source, tmp, DERIVATIVES[name])
+            else:
+                shutil.copyfile(source, tmp)
+
+            base, extension = os.path.splitext(name)
+            hashed = f'{base}.{_fingerprint(tmp)}{extension}'
+            target = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Les anciennes versions restent en place pour les pages déjà en cache
+            os.replace(tmp, target)
+            if extension.lower() in GZIP_EXTENSIONS:
+                _write_gzip(target)
+            manifest[name] = hashed
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    tmp_manifest = os.path.join(dist_dir, MANIFEST + '.tmp')
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_manifest, os.path.join(dist_dir, MANIFEST))
+    return manifest
+
+
+def load_manifest(static_dir):
+    """Manifeste de static/dist/, vide si l'étape de construction n'a pas été lancée"""
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _state(app):
+    return app.extensions['static_assets']
+
+
+def reload(app):
+    """Relire le manifeste (après une construction)"""
+    manifest = load_manifest(app.static_folder)
+    state = _state(app)
+    state['manifest'] = manifest
+    state['version'] = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+
+def version():
+    """Empreinte du manifeste : change dès qu'un fichier statique change"""
+    return _state(current_app)['version']
+
+
+def _url_defaults(endpoint, values):
+    """url_for('static', filename=...) vers le fichier empreinté s'il existe"""
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    hashed = _state(current_app)['manifest'].get(values['filename'])
+    if hashed:
+        values['filename'] = f'{DIST_DIR}/{hashed}'
+
+
+def send_static(filename):
+    """Vue /static/ : fichiers empreintés immuables, en .gz si le client l'accepte"""
+    if not filename.startswith(DIST_DIR + '/') or filename.endswith('/' + MANIFEST):
+        return current_app.send_static_file(filename)
+
+    static_dir = current_app.static_folder
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    compressed = (os.path.splitext(filename)[1].lower() in GZIP_EXTENSIONS
+                  and request.accept_encodings['gzip']
+                  and os.path.isfile(os.path.join(static_dir, filename + '.gz')))
+    if compressed:
+        response = send_from_directory(static_dir, filename + '.gz', mimetype=mimetype, max_age=MAX_AGE)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(static_dir, filename, mimetype=mimetype, max_age=MAX_AGE)
+    if os.path.splitext(filename)[1].lower() in GZIP_EXTENSIONS:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Brancher la résolution et le service des fichiers empreintés sur l'application Flask"""
+    app.extensions['static_assets'] = {}
+    reload(app)
+    app.url_defaults(_url_defaults)
+    app.view_functions['static'] = send_static
@@ -0,0 +1,31 @@
+import sqlite3
+
+import pytest
+
+from init_db import create_schema_objects, create_tables
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base temporaire avec le schéma complet et un utilisateur (id 1)"""
+    path = str(tmp_path / 'gmao.db')
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    cursor = conn.cursor()
+    create_tables(cursor)
+    create_schema_objects(cursor)
+    cursor.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def client(db_path, tmp_path, monkeypatch):
+    """Client de test de l'application sur la base temporaire"""
+    import app1
+    monkeypatch.setitem(app1.app.config, 'DATABASE', db_path)
+    monkeypatch.setitem(app1.app.config, 'TESTING', True)
+    monkeypatch.setitem(app1.app.config, 'EXPORT_RESULTS_DIR', str(tmp_path / 'exports'))
+    monkeypatch.setitem(app1.app.config, 'EXPORT_CACHE_DIR', str(tmp_path / 'exports' / 'cache'))
+    return app1.app.test_client()
@@ -0,0 +1,68 @@
+import base64
+import sqlite3
+import threading
+import time
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin123').decode('ascii')}
+
+
+def add_panne(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute(
+        '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, user_id)
+           VALUES ('Pompe C3', 'Débit insuffisant', 'Moyenne', 'En attente', '2025-01-15 09:30:00', 1)'''
+    )
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+
+def test_if_match_verifie_sous_le_verrou_d_ecriture(client, db_path):
+    panne_id = add_panne(db_path)
+    etag = client.get(f'/api/v1/pannes/{panne_id}', headers=AUTH).headers['ETag']
+
+    # Une autre écriture tient le verrou quand le PATCH arrive, puis modifie la panne
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=client.patch(
+        f'/api/v1/pannes/{panne_id}', json={'observation': 'PATCH'}, headers={**AUTH, 'If-Match': etag})))
+    thread.start()
+    time.sleep(0.3)
+    other.execute("UPDATE pannes SET observation = 'Autre écriture' WHERE id = ?", (panne_id,))
+    other.execute('COMMIT')
+    thread.join(10)
+
+    assert result['response'].status_code == 412
+    assert other.execute('SELECT observation FROM pannes WHERE id = ?', (panne_id,)).fetchone()[0] == 'Autre écriture'
+    other.close()
+
+
+def test_patch_avec_etag_courant(client, db_path):
+    panne_id = add_panne(db_path)
+    etag = client.get(f'/api/v1/pannes/{panne_id}', headers=AUTH).headers['ETag']
+    response = client.patch(f'/api/v1/pannes/{panne_id}', json={'etat': 'En cours'},
+                            headers={**AUTH, 'If-Match': etag})
+    assert response.status_code == 200
+    assert response.json['etat'] == 'En cours'
+    assert client.patch(f'/api/v1/pannes/{panne_id}', json={'etat': 'Résolue'},
+                        headers={**AUTH, 'If-Match': etag}).status_code == 412
+
+
+def test_curseur_forge_refuse_avant_la_reponse_conditionnelle(client, db_path):
+    add_panne(db_path)
+    response = client.get('/api/v1/pannes?curseur=forge',
+                          headers={**AUTH, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 400
+
+
+def test_modifier_panne_inconnue_sans_creer_d_equipement(client, db_path):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    form = {'equipement': 'Équipement fantôme', 'description': 'x', 'priorite': 'Moyenne', 'etat': 'En cours',
+            'cause': '', 'solution': '', 'observation': ''}
+
+    assert client.post('/modifier_panne/999', data=form).status_code == 404
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM equipements').fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+import database
+import duplicates
+
+DESCRIPTION = "Fuite d'huile au niveau du joint"
+
+
+def add_panne(conn, description, etat='En attente'):
+    cursor = conn.execute(
+        '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, user_id)
+           VALUES ('Pompe C3', ?, 'Moyenne', ?, '2025-01-15 09:30:00', 1)''',
+        (description, etat)
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+@pytest.fixture
+def conn(db_path):
+    duplicates.invalidate()
+    conn = database.open_connection(db_path)
+    yield conn
+    conn.close()
+    duplicates.invalidate()
+
+
+def found(conn):
+    return sorted(panne['id'] for panne in duplicates.find(conn, 'Pompe C3', DESCRIPTION))
+
+
+def test_ecriture_appliquee_a_l_index_en_place(conn):
+    first = add_panne(conn, DESCRIPTION)
+    assert found(conn) == [first]
+    index = duplicates._index
+
+    second = add_panne(conn, DESCRIPTION)
+    duplicates.record(second, 'Pompe C3', DESCRIPTION, 'En attente', '2025-01-15 09:30:00')
+    assert duplicates._index is index
+    assert found(conn) == [first, second]
+
+    duplicates.record(first, 'Pompe C3', DESCRIPTION, 'Résolue')
+    assert found(conn) == [second]
+
+
+def test_index_perime_servi_pendant_la_reconstruction(conn, monkeypatch):
+    first = add_panne(conn, DESCRIPTION)
+    assert found(conn) == [first]
+    index = duplicates._index
+    index.built_at -= duplicates.REFRESH_SECONDS + 1
+
+    started, release = threading.Event(), threading.Event()
+    build = duplicates.build
+
+    def slow_build(build_conn):
+        started.set()
+        release.wait(5)
+        return build(build_conn)
+
+    monkeypatch.setattr(duplicates, 'build', slow_build)
+    # Panne écrite par un autre processus : seule la reconstruction la voit
+    second = add_panne(conn, DESCRIPTION)
+
+    assert found(conn) == [first]
+    assert started.wait(5)
+    assert duplicates._index is index
+    assert found(conn) == [first]
+
+    release.set()
+    assert duplicates._build_lock.acquire(timeout=5)
+    duplicates._build_lock.release()
+    assert duplicates._index is not index
+    assert found(conn) == [first, second]
@@ -0,0 +1,98 @@
+import sqlite3
+
+import availability
+from init_db import (EQUIPMENT_VERSION_TRIGGERS, backfill_equipements, create_schema_objects,
+                     get_equipement, rebuild_delays, trigger_name)
+
+
+def add_panne(conn, equipement, etat='En attente', equipement_id=None):
+    return conn.execute(
+        '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, user_id, equipement_id)
+           VALUES (?, 'Fuite', 'Moyenne', ?, '2025-01-15 09:30:00', 1, ?)''',
+        (equipement, etat, equipement_id)
+    ).lastrowid
+
+
+def delais(conn):
+    return sorted(tuple(row) for row in conn.execute(
+        "SELECT cle, mesure, nombre FROM pannes_delais WHERE dimension = 'equipement'"))
+
+
+def versions(conn):
+    return dict(conn.execute('SELECT equipement_id, version FROM pannes_equipement_version').fetchall())
+
+
+def test_meme_equipement_malgre_casse_et_accents(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    equipement_id, nom = get_equipement(cursor, 'Pompe Électrique')
+    assert get_equipement(cursor, 'pompe electrique') == (equipement_id, nom)
+    assert get_equipement(cursor, ' POMPE-ÉLECTRIQUE ') == (equipement_id, nom)
+    assert conn.execute('SELECT COUNT(*) FROM equipements').fetchone()[0] == 1
+
+
+def test_backfill_des_pannes_existantes(db_path):
+    conn = sqlite3.connect(db_path)
+    ids = [add_panne(conn, nom) for nom in ('Pompe Électrique', 'pompe electrique', 'POMPE-ÉLECTRIQUE ', 'Four 2')]
+    conn.execute("UPDATE pannes SET etat = 'En cours' WHERE id = ?", (ids[1],))
+    conn.commit()
+
+    assert backfill_equipements(conn, batch_size=2) == 4
+    rows = conn.execute('SELECT id, equipement, equipement_id FROM pannes ORDER BY id').fetchall()
+    pompe_id, four_id = rows[0][2], rows[3][2]
+    assert [row[1:] for row in rows] == [('Pompe Électrique', pompe_id)] * 3 + [('Four 2', four_id)]
+    assert conn.execute('SELECT COUNT(*) FROM equipements').fetchone()[0] == 2
+    # Délais et versions rattachés au registre, pas au nom saisi
+    assert delais(conn) == [(str(pompe_id), 'mtta', 1)]
+    assert set(versions(conn)) == {pompe_id, four_id}
+
+
+def test_ancienne_base_indexee_par_nom(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # Base antérieure : versions et délais cumulés par nom d'équipement
+    for statement in EQUIPMENT_VERSION_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER {trigger_name(statement)}')
+    cursor.execute('DROP TABLE pannes_equipement_version')
+    cursor.execute('CREATE TABLE pannes_equipement_version (equipement TEXT PRIMARY KEY, version INTEGER) WITHOUT ROWID')
+    cursor.execute('DROP TRIGGER pannes_delais_mtta')
+    cursor.execute('''CREATE TRIGGER pannes_delais_mtta AFTER INSERT ON panne_events BEGIN
+                      INSERT OR IGNORE INTO pannes_delais (mesure, dimension, cle) VALUES ('mtta', 'equipement', 'Pompe C3');
+                      END''')
+    panne_id = add_panne(conn, 'Pompe C3')
+    cursor.execute("UPDATE pannes SET etat = 'En cours' WHERE id = ?", (panne_id,))
+    conn.commit()
+
+    create_schema_objects(cursor)
+    conn.commit()
+    backfill_equipements(conn)
+    equipement_id = conn.execute('SELECT equipement_id FROM pannes WHERE id = ?', (panne_id,)).fetchone()[0]
+    assert delais(conn) == [(str(equipement_id), 'mtta', 1)]
+    assert versions(conn) == {equipement_id: 1}
+    assert availability.equipment_versions(conn) == {'Pompe C3': 1}
+
+
+def test_tables_derivees_quand_la_panne_change_d_equipement(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    pompe_id, pompe = get_equipement(cursor, 'Pompe C3')
+    four_id, four = get_equipement(cursor, 'Four 2')
+    panne_id = add_panne(conn, pompe, equipement_id=pompe_id)
+    cursor.execute("UPDATE pannes SET etat = 'En cours' WHERE id = ?", (panne_id,))
+    assert delais(conn) == [(str(pompe_id), 'mtta', 1)]
+    avant = versions(conn)
+    assert list(avant) == [pompe_id]
+
+    cursor.execute('UPDATE pannes SET equipement = ?, equipement_id = ? WHERE id = ?', (four, four_id, panne_id))
+    # Les deux équipements changent de version : leurs disponibilités en cache sont périmées
+    apres = versions(conn)
+    assert apres[pompe_id] > avant[pompe_id] and four_id in apres
+    cursor.execute("UPDATE pannes SET etat = 'Résolue' WHERE id = ?", (panne_id,))
+    assert delais(conn) == [(str(pompe_id), 'mtta', 1), (str(four_id), 'mttr', 1)]
+    rebuild_delays(cursor)
+    assert delais(conn) == [(str(four_id), 'mtta', 1), (str(four_id), 'mttr', 1)]
+
+    # Renommer l'équipement dans le registre ne sépare pas ses cumuls
+    cursor.execute("UPDATE equipements SET nom = 'Four n°2' WHERE id = ?", (four_id,))
+    assert delais(conn) == [(str(four_id), 'mtta', 1), (str(four_id), 'mttr', 1)]
+    assert availability.equipment_versions(conn, ['Four n°2']) == {'Four n°2': versions(conn)[four_id]}
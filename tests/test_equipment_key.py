@@ -0,0 +1,23 @@
+import sqlite3
+
+from init_db import create_schema_objects, create_tables, equipment_key, get_equipement
+
+
+def test_accents_casse_et_ponctuation_ignores():
+    assert equipment_key('Pompe  É-3') == equipment_key('pompe e 3')
+    assert equipment_key('Compresseur A1') == equipment_key(' compresseur-a1 ')
+
+
+def test_lettres_non_ascii_conservees():
+    assert equipment_key('Compresseur Ω') != equipment_key('Compresseur')
+    assert equipment_key('Four Ø2') != equipment_key('Four 2')
+    assert equipment_key('Moteur Ø') == equipment_key('moteur ø')
+
+
+def test_equipements_distincts_dans_le_registre():
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    create_tables(cursor)
+    create_schema_objects(cursor)
+    assert get_equipement(cursor, 'Four Ø2') != get_equipement(cursor, 'Four 2')
+    assert get_equipement(cursor, 'Four ø2') == get_equipement(cursor, 'Four Ø2')
@@ -0,0 +1,55 @@
+from werkzeug.datastructures import MultiDict
+
+import app1
+import check_query_plans
+import database
+
+
+def history_plans(db_path, filtres, tri):
+    """Plans des requêtes de la première page de l'historique filtré et trié"""
+    conn = database.open_connection(db_path, readonly=True)
+    try:
+        clauses, params = app1.build_pannes_clauses(MultiDict(filtres), conn)
+        return [[row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql} LIMIT ?', sql_params + [51])]
+                for sql, sql_params in app1.history_queries('p.*, u.username', clauses, params, tri, True)]
+    finally:
+        conn.close()
+
+
+def test_tri_par_equipement_filtre_utilise_l_index_du_filtre(db_path):
+    for filtres, index in (
+        ([('etat', 'En cours')], 'idx_pannes_etat_date'),
+        ([('priorite', 'Critique')], 'idx_pannes_priorite_date'),
+        ([('utilisateur', '1')], 'idx_pannes_user_date'),
+        ([('etat', 'En cours'), ('equipement', 'Pompe C3')], 'idx_pannes_equipement_date'),
+    ):
+        [plan] = history_plans(db_path, filtres, 'equipement')
+        assert any(detail.startswith(f'SEARCH p USING INDEX {index} (') for detail in plan), (filtres, plan)
+        assert not any(detail.startswith('SCAN p') for detail in plan), (filtres, plan)
+
+
+def test_tri_par_equipement_sans_filtre_lit_l_index_dans_l_ordre(db_path):
+    [plan] = history_plans(db_path, [], 'equipement')
+    assert plan[0] == 'SCAN p USING INDEX idx_pannes_equipement_date'
+    assert not any('TEMP B-TREE' in detail for detail in plan)
+
+
+def test_aucune_requete_ne_parcourt_une_table_entiere():
+    conn = check_query_plans.schema_connection()
+    try:
+        failures = []
+        for label, sql, params, full_read in check_query_plans.collect_queries(conn):
+            problems = check_query_plans.plan_problems(sql, check_query_plans.explain(conn, sql, params), full_read)
+            if problems:
+                failures.append(f"{label}: {', '.join(problems)}\n    {' '.join(sql.split())}")
+    finally:
+        conn.close()
+    assert not failures, '\n'.join(failures)
+
+
+def test_parcours_par_index_signales():
+    sql = 'SELECT * FROM pannes p WHERE p.description LIKE ? ORDER BY p.date_creation LIMIT ?'
+    assert check_query_plans.plan_problems(sql, ['SCAN p USING INDEX idx_pannes_date_creation'])
+    assert check_query_plans.plan_problems(sql, ['SCAN p USING COVERING INDEX idx_pannes_etat_date'])
+    assert check_query_plans.plan_problems('SELECT * FROM pannes_equipement_version', ['SCAN pannes_equipement_version'])
+    assert not check_query_plans.plan_problems('SELECT * FROM pannes_stats', ['SCAN pannes_stats'])
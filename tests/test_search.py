@@ -0,0 +1,55 @@
+import sqlite3
+
+from app1 import search_pannes
+from init_db import FTS_TRIGGERS, create_schema_objects, trigger_name
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def add_panne(conn, priorite, etat):
+    return conn.execute(
+        '''INSERT INTO pannes (equipement, description, priorite, etat, date_creation, user_id)
+           VALUES ('Pompe C3', 'Fuite au joint', ?, ?, '2025-01-15 09:30:00', 1)''',
+        (priorite, etat)
+    ).lastrowid
+
+
+def found(conn, text):
+    return [row['id'] for row in search_pannes(conn, text)[0]]
+
+
+def test_priorite_et_etat_recherches_sans_accents(db_path):
+    conn = connect(db_path)
+    elevee = add_panne(conn, 'Élevée', 'En attente')
+    add_panne(conn, 'Faible', 'Résolue')
+
+    assert found(conn, 'Élevée') == [elevee]
+    assert found(conn, 'elevee') == [elevee]
+    assert found(conn, 'pompe attente') == [elevee]
+
+    conn.execute("UPDATE pannes SET priorite = 'Critique', etat = 'En cours' WHERE id = ?", (elevee,))
+    assert found(conn, 'elevee') == []
+    assert found(conn, 'critique cours') == [elevee]
+
+
+def test_index_sans_priorite_ni_etat_reconstruit(db_path):
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    # Base antérieure : seuls les champs texte étaient indexés
+    for statement in FTS_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER {trigger_name(statement)}')
+    cursor.execute('DROP TABLE pannes_fts')
+    cursor.execute('''CREATE VIRTUAL TABLE pannes_fts USING fts5(
+                          equipement, description, cause, solution, observation,
+                          content='pannes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')''')
+    panne_id = add_panne(conn, 'Élevée', 'En attente')
+    cursor.execute("INSERT INTO pannes_fts (pannes_fts) VALUES ('rebuild')")
+    version = cursor.execute('SELECT version FROM data_version').fetchone()[0]
+
+    create_schema_objects(cursor)
+    assert found(conn, 'elevee') == [panne_id]
+    assert cursor.execute('SELECT version FROM data_version').fetchone()[0] > version